@@ -0,0 +1,78 @@
+"""contactos, pendientes, tiempos de respuesta y promedios
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "contacts",
+        sa.Column("contact_id", sa.String(64), primary_key=True),
+        sa.Column("name", sa.String(255)),
+        sa.Column("phone", sa.String(64)),
+        sa.Column("response_count", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("response_total_seconds", sa.Float, nullable=False, server_default="0"),
+        sa.Column("last_seen", sa.Float, nullable=False),
+    )
+    op.create_index("ix_contacts_last_seen", "contacts", ["last_seen"])
+
+    op.create_table(
+        "pending_messages",
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("contact_id", sa.String(64), nullable=False),
+        sa.Column("received_at", sa.Float, nullable=False),
+        sa.Column("message_at", sa.Float),
+        sa.Column("message", sa.Text),
+    )
+    op.create_index("ix_pending_messages_contact_received", "pending_messages", ["contact_id", "received_at"])
+
+    op.create_table(
+        "response_times",
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("contact_id", sa.String(64), nullable=False),
+        sa.Column("client_id", sa.String(64), nullable=False),
+        sa.Column("location_id", sa.String(64)),
+        sa.Column("received_at", sa.Float, nullable=False),
+        sa.Column("response_seconds", sa.Float, nullable=False),
+    )
+    op.create_index("ix_response_times_contact_id", "response_times", ["contact_id"])
+    op.create_index("ix_response_times_client_id", "response_times", ["client_id"])
+    op.create_index("ix_response_times_received_at", "response_times", ["received_at"])
+
+    op.create_table(
+        "vendor_stats",
+        sa.Column("client_id", sa.String(64), primary_key=True),
+        sa.Column("client_name", sa.String(255)),
+        sa.Column("total_seconds", sa.Float, nullable=False, server_default="0"),
+        sa.Column("response_count", sa.Integer, nullable=False, server_default="0"),
+    )
+
+    op.create_table(
+        "global_stats",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("total_seconds", sa.Float, nullable=False, server_default="0"),
+        sa.Column("response_count", sa.Integer, nullable=False, server_default="0"),
+    )
+
+
+def downgrade():
+    op.drop_table("global_stats")
+    op.drop_table("vendor_stats")
+    op.drop_index("ix_response_times_received_at", table_name="response_times")
+    op.drop_index("ix_response_times_client_id", table_name="response_times")
+    op.drop_index("ix_response_times_contact_id", table_name="response_times")
+    op.drop_table("response_times")
+    op.drop_index("ix_pending_messages_contact_received", table_name="pending_messages")
+    op.drop_table("pending_messages")
+    op.drop_index("ix_contacts_last_seen", table_name="contacts")
+    op.drop_table("contacts")
@@ -0,0 +1,21 @@
+"""índice de pendientes por hora de llegada (vencimiento en bloque)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_pending_messages_received_at", "pending_messages", ["received_at"])
+
+
+def downgrade():
+    op.drop_index("ix_pending_messages_received_at", table_name="pending_messages")
@@ -0,0 +1,28 @@
+"""claves de deduplicación compartidas entre workers
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "dedup_keys",
+        sa.Column("key", sa.String(32), primary_key=True),
+        sa.Column("seen_at", sa.Float, nullable=False),
+    )
+    op.create_index("ix_dedup_keys_seen_at", "dedup_keys", ["seen_at"])
+
+
+def downgrade():
+    op.drop_index("ix_dedup_keys_seen_at", table_name="dedup_keys")
+    op.drop_table("dedup_keys")
@@ -2,6 +2,8 @@ from fastapi import APIRouter
 
 from app.api.endpoints.webhook import router as router_calls
 from app.api.endpoints.health_check import router as router_check    
+from app.api.endpoints.stats import router as router_stats
+from app.api.endpoints.metrics import router as router_metrics
 
 api_router = APIRouter()
 
@@ -12,6 +14,14 @@ api_router.include_router(router_calls, tags=["GHL webhook"],
 api_router.include_router(router_check, tags=["HealthCheck"],
     responses={404: {"description": "Not found"}})
 
+#route Stats
+api_router.include_router(router_stats, tags=["Stats"],
+    responses={404: {"description": "Not found"}})
+
+#route Metrics
+api_router.include_router(router_metrics, tags=["HealthCheck"],
+    responses={404: {"description": "Not found"}})
+
 """
                         No more endpoints??
                         
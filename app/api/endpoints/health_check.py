@@ -1,6 +1,50 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
+
+from app.core import config
+from app.core.codec import FastJSONResponse
+from app.services.contact_shards import contact_shards
+from app.services.delivery_queue import delivery_queue
+from app.services.persistence import write_behind
+from app.services.state import state_backend
+
 router = APIRouter()
 
 @router.get("/healthcheck")
-async def healthcheck():
-    return "alive"
\ No newline at end of file
+async def healthcheck(ready: bool = Query(False, description="true: readiness (503 si no puede recibir tráfico)")):
+    if not ready:
+        return "alive"
+    checks = readiness_checks()
+    status_code = 200 if all(checks.values()) else 503
+    return FastJSONResponse(
+        status_code=status_code,
+        content={"status": "ready" if status_code == 200 else "not_ready", "checks": checks},
+    )
+
+def readiness_checks() -> dict:
+    return {
+        "state_backend": state_backend.ready,
+        "shards_running": contact_shards.running,
+        "shards_backlog": contact_shards.depth < contact_shards.capacity * config.READY_MAX_QUEUE_FILL,
+        "delivery_running": delivery_queue.running,
+        "delivery_backlog": (
+            delivery_queue.depth < delivery_queue.maxsize * config.READY_MAX_QUEUE_FILL
+            and delivery_queue.coalescing < delivery_queue.max_coalescing * config.READY_MAX_QUEUE_FILL
+        ),
+        "persistence_backlog": write_behind.size < config.READY_MAX_BUFFERED_WRITES,
+    }
+
+@router.get("/healthcheck/delivery")
+async def delivery_status():
+    return delivery_queue.stats()
+
+@router.get("/healthcheck/shards")
+async def shards_status():
+    return contact_shards.stats()
+
+@router.get("/healthcheck/memory")
+async def memory_status():
+    return await state_backend.describe()
+
+@router.get("/healthcheck/persistence")
+async def persistence_status():
+    return write_behind.stats()
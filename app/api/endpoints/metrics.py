@@ -0,0 +1,39 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.services.contact_shards import contact_shards
+from app.services.delivery_queue import delivery_queue
+from app.services.metrics import CONTENT_TYPE, metrics
+from app.services.pending_sweeper import pending_sweeper
+from app.services.persistence import write_behind
+from app.services.state import state_backend
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    # Formato de texto de Prometheus; los valores son del proceso que atiende
+    state = await state_backend.gauges()
+    gauges = {
+        "webhook_conversations": ("Contactos con conversación en el estado", state["contacts"]),
+        "webhook_pending_inbound": ("Mensajes inbound esperando respuesta", state["pending"]),
+        "webhook_shard_queue_depth": ("Eventos esperando en las colas por contacto", contact_shards.depth),
+        "ghl_delivery_queue_depth": ("Envíos a GHL en cola", delivery_queue.depth),
+        "ghl_delivery_in_flight": ("Envíos a GHL en curso", delivery_queue.in_flight),
+        "ghl_delivery_coalescing": ("Notificaciones esperando su ventana de agrupado", delivery_queue.coalescing),
+        "ghl_delivery_queue_capacity": ("Capacidad de la cola de envíos", delivery_queue.maxsize),
+        "persistence_buffered_writes": ("Cambios pendientes de guardar en la base", write_behind.size),
+        "webhook_dedup_keys": ("Claves recordadas para descartar reintentos", state["dedup_keys"]),
+    }
+    counters = {
+        "ghl_delivery_enqueued_total": ("Envíos a GHL encolados", delivery_queue.enqueued),
+        "ghl_delivery_coalesced_total": ("Notificaciones reemplazadas por una más reciente del mismo contacto", delivery_queue.coalesced),
+        "ghl_delivery_rate_limited_total": ("Despachos demorados por el límite del destino", delivery_queue.rate_limited),
+        "ghl_delivery_dropped_total": ("Envíos a GHL descartados por cola llena", delivery_queue.dropped),
+        "ghl_delivery_sent_total": ("Envíos a GHL completados", delivery_queue.sent),
+        "ghl_delivery_failed_total": ("Envíos a GHL fallidos tras los reintentos", delivery_queue.failed),
+        "ghl_delivery_retries_total": ("Reintentos de envíos a GHL", delivery_queue.retries),
+        "webhook_pending_expired_total": ("Inbound pendientes descartados por superar el tiempo máximo", pending_sweeper.expired),
+        "persistence_errors_total": ("Errores al guardar en la base", write_behind.errors),
+    }
+    return PlainTextResponse(metrics.render(gauges, counters), media_type=CONTENT_TYPE)
@@ -0,0 +1,47 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.core import config
+from app.services.response_stats import ALL_TIME, SCOPES, WINDOWS, streaming_stats
+from app.services.state import state_backend
+
+router = APIRouter()
+
+@router.get("/stats")
+async def get_stats(
+    scope: str = Query("global", description="global, location, vendor o conversation"),
+    key: Optional[str] = Query(None, description="location_id, client_id o contact_id según el scope"),
+    window: str = Query(ALL_TIME, description="all, 1h, 24h o 7d"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    if scope not in SCOPES:
+        raise HTTPException(status_code=400, detail=f"scope inválido: {scope}")
+    if window != ALL_TIME and window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window inválida: {window}")
+    if window != ALL_TIME and scope == "conversation":
+        raise HTTPException(status_code=400, detail="las conversaciones solo tienen window=all")
+
+    # Con el backend sql se arman con response_times de todos los workers (últimos 7 días,
+    # también para window=all); con memoria son del proceso, y con varios workers no sirven
+    source = await state_backend.shared_stats()
+    if source is not None:
+        result = {"scope": scope, "window": window, "source": "shared"}
+    elif config.WEB_CONCURRENCY > 1:
+        raise HTTPException(
+            status_code=501,
+            detail="Con varios workers /stats necesita STATE_BACKEND=sql: cada worker solo ve sus propios datos",
+        )
+    else:
+        source = streaming_stats
+        result = {"scope": scope, "window": window, "source": "process", "pid": os.getpid()}
+
+    if scope == "global" or key is not None:
+        stats = source.get(scope, key, window)
+        if stats is None:
+            raise HTTPException(status_code=404, detail=f"Sin datos para {scope}={key}")
+        result.update(key=key, stats=stats)
+    else:
+        result.update(keys=source.keys(scope), items=source.top(scope, window, limit))
+    return result
@@ -1,27 +1,35 @@
 from fastapi import Request, HTTPException, APIRouter, Depends
-from fastapi.responses import JSONResponse
 from typing import Optional
 import logging
 import json
 from datetime import datetime
-from collections import defaultdict
-import httpx
-
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('webhook_messages.log', encoding='utf-8')
-    ]
-)
-logger = logging.getLogger("message_tracker")
+
+import pytz
+
+from app.core import codec, config
+from app.core.codec import FastJSONResponse, RawJson
+from app.core.logger import LOGGER_NAME, sample_body
+from app.services.contact_shards import contact_shards
+from app.services.conversation_store import MessageRecord
+from app.services.dedup import dedup_key
+from app.services.delivery_queue import delivery_queue
+from app.services.extractor import payload_extractor
+from app.services.metrics import metrics, perf_counter
+from app.services.response_stats import StreamingStats, streaming_stats
+from app.services.state import state_backend
+from app.services.state.base import StateBackend
+from app.services.timestamps import parse_timestamp
+
+# El logging (cola + hilo escritor, JSON por línea) se configura en app/core/logger.py
+logger = logging.getLogger(LOGGER_NAME)
 
 router = APIRouter()
 
 # CONFIGURACIÓN: Tiempo máximo permitido (en minutos)
-TIEMPO_MAXIMO_MINUTOS = 300
+TIEMPO_MAXIMO_MINUTOS = config.TIEMPO_MAXIMO_MINUTOS
+
+# CONFIGURACIÓN: De dónde sale el tiempo de respuesta ("received" o "message")
+RESPONSE_TIME_SOURCE = config.RESPONSE_TIME_SOURCE
 
 # Diccionario de webhooks por location_id
 LOCATION_WEBHOOKS = {
@@ -32,108 +40,37 @@ LOCATION_WEBHOOKS = {
 
 WEBHOOK_DEFAULT = "https://services.leadconnectorhq.com/hooks/f1nXHhZhhRHOiU74mtmb/webhook-trigger/d1138875-719d-4350-92d1-be289146ee88"
 
-# Variables globales para promedios
-global_total_seconds = 0.0
-global_response_count = 0
-
-client_stats = defaultdict(lambda: {
-    "total_seconds": 0.0,
-    "response_count": 0
-})
+# CONFIGURACIÓN: Descartar reintentos de GHL ya procesados
+DEDUP_ENABLED = config.DEDUP_ENABLED
 
-conversations = defaultdict(lambda: {
-    "contact_id": None,
-    "contact_info": {},
-    "messages": [],
-    "response_times": [],
-    "pending_client_message": None
-})
+# CONFIGURACIÓN: Máximo de items y de bytes por request a /webhook/batch
+BATCH_MAX_ITEMS = config.BATCH_MAX_ITEMS
+BATCH_MAX_BYTES = config.BATCH_MAX_BYTES
 
 async def get_raw_body(request: Request):
-    return await request.body()
-
-def parse_timestamp(ts_value) -> Optional[datetime]:
-    if not ts_value:
-        return None
-    if isinstance(ts_value, datetime):
-        return ts_value
-    ts_str = str(ts_value)
-    formats = [
-        "%Y-%m-%dT%H:%M:%S.%fZ",
-        "%Y-%m-%dT%H:%M:%SZ",
-        "%Y-%m-%d %H:%M:%S",
-        "%d/%m/%Y %H:%M",
-        "%Y-%m-%d",
-    ]
-    for fmt in formats:
-        try:
-            return datetime.strptime(ts_str, fmt)
-        except:
-            continue
-    return None
-
-def search_nested_value(data: dict, search_keys: list):
-    for key in search_keys:
-        if key in data and data[key]:
-            return data[key]
-    for key, value in data.items():
-        if isinstance(value, dict):
-            result = search_nested_value(value, search_keys)
-            if result:
-                return result
-    return None
+    started = perf_counter()
+    raw_body = await request.body()
+    metrics.observe("body_read", perf_counter() - started)
+    return raw_body
 
 def extract_message_info(data: dict) -> dict:
-    message_info = {
-        "contact_id": None,
-        "message": None,
-        "timestamp": None,
-        "timestamp_parsed": None,
-        "direction": None,
-        "contact_name": None,
-        "phone": None,
-        "raw_data": data
-    }
-    
-    contact_fields = ['contactId', 'contact_id', 'id', 'userId', 'user_id']
-    message_info["contact_id"] = search_nested_value(data, contact_fields)
-    
-    message_fields = ['message', 'body', 'text', 'content', 'messageBody']
-    message_info["message"] = search_nested_value(data, message_fields)
-    
-    timestamp_fields = ['timestamp', 'time', 'createdAt', 'date', 'dateAdded', 'date_created', 'dateCreated', 'created_at']
-    raw_timestamp = search_nested_value(data, timestamp_fields)
-    message_info["timestamp"] = raw_timestamp
-    message_info["timestamp_parsed"] = parse_timestamp(raw_timestamp)
-    
-    direction_fields = ['direction', 'type', 'messageType', 'messageDirection', 'messageStatus']
-    message_info["direction"] = search_nested_value(data, direction_fields)
-    
-    if not message_info["direction"]:
-        if 'Mensajes del cliente' in data:
-            message_info["direction"] = "inbound"
-        elif 'mensajes salientes' in data:
-            message_info["direction"] = "outbound"
-        if 'customData' in data and isinstance(data['customData'], dict):
-            custom = data['customData']
-            if 'direction' in custom:
-                message_info["direction"] = custom['direction']
-            elif 'type' in custom:
-                message_info["direction"] = custom['type']
-    
-    if 'full_name' in data:
-        message_info["contact_name"] = data['full_name']
-    elif 'first_name' in data:
-        message_info["contact_name"] = data['first_name']
-    
-    if 'phone' in data:
-        message_info["phone"] = data['phone']
-    
+    # Un solo recorrido del payload (con rutas cacheadas por forma de payload)
+    message_info = payload_extractor.extract(data)
+    # Solo la hora del propio mensaje; la fecha de alta del contacto no sirve para medir
+    message_info["timestamp_parsed"] = parse_timestamp(message_info["message_timestamp"], source=message_info["location_id"])
     return message_info
 
-def calculate_response_time(start: datetime, end: datetime) -> dict:
-    diff = end - start
-    total_seconds = diff.total_seconds()
+def measure_response_seconds(pending: MessageRecord, reply: MessageRecord) -> float:
+    # Con RESPONSE_TIME_SOURCE=message se usan las horas de los mensajes (correcto aunque
+    # las entregas lleguen tarde o desordenadas); si falta alguna o no avanza (misma
+    # hora en los dos: no es la del mensaje), la hora de llegada
+    if RESPONSE_TIME_SOURCE == "message" and pending.message_at is not None and reply.message_at is not None:
+        diff = reply.message_at - pending.message_at
+        if diff > 0:
+            return diff
+    return reply.received_at - pending.received_at
+
+def format_duration(total_seconds: float) -> dict:
     hours = int(total_seconds // 3600)
     minutes = int((total_seconds % 3600) // 60)
     seconds = int(total_seconds % 60)
@@ -154,168 +91,401 @@ def calculate_response_time(start: datetime, end: datetime) -> dict:
 def calculate_average(total_seconds: float, count: int) -> Optional[dict]:
     if count == 0:
         return None
-    avg_seconds = total_seconds / count
-    hours = int(avg_seconds // 3600)
-    minutes = int((avg_seconds % 3600) // 60)
-    seconds = int(avg_seconds % 60)
-    
-    if hours > 0:
-        formatted = f"{hours}h {minutes}m {seconds}s"
-    elif minutes > 0:
-        formatted = f"{minutes}m {seconds}s"
-    else:
-        formatted = f"{seconds}s"
-    
-    return {
-        "total_seconds": avg_seconds,
-        "formatted": formatted,
-        "hours": hours,
-        "minutes": minutes,
-        "seconds": seconds,
-        "count": count
-    }
+    average = format_duration(total_seconds / count)
+    average["count"] = count
+    return average
+
+async def check_duplicate(parsed_body) -> tuple:
+    # (es_duplicado, clave); la clave queda registrada en el backend de estado (con
+    # STATE_BACKEND=sql, compartida entre workers) y se olvida si el evento falla
+    if not DEDUP_ENABLED:
+        return False, None
+    key = dedup_key(parsed_body)
+    if await state_backend.seen_message(key):
+        metrics.count("duplicate")
+        logger.info("♻️ Webhook duplicado (%s) - ignorado", key[0])
+        return True, None
+    return False, key
+
+async def forget_duplicate_key(key):
+    if key is None:
+        return
+    try:
+        await state_backend.forget_message(key)
+    except Exception as e:
+        # El reintento se descartará hasta que venza la clave
+        logger.error("❌ No se pudo liberar la clave de dedup: %s", e)
 
-def calculate_conversation_average(response_times: list) -> Optional[dict]:
-    if not response_times:
-        return None
-    total = sum(rt["total_seconds"] for rt in response_times)
-    return calculate_average(total, len(response_times))
+DUPLICATE_RESULT = {"status": "ignored", "reason": "duplicate"}
+
+def decode_body(raw_body: bytes) -> tuple:
+    # (body parseado, bytes del body si son JSON válido para loguearlos sin volver a serializar)
+    if not raw_body or raw_body.isspace():
+        return {}, None
+    try:
+        # Directo desde los bytes, sin pasar por str
+        return codec.loads(raw_body), raw_body
+    except ValueError:
+        pass
+    # UTF-8 inválido o texto suelto: se conserva el comportamiento tolerante de siempre
+    raw_body_text = raw_body.decode('utf-8', errors='ignore')
+    try:
+        return json.loads(raw_body_text), None
+    except json.JSONDecodeError:
+        return {"raw_text": raw_body_text}, None
+
+async def process_event(
+    parsed_body,
+    timestamp_received: datetime,
+    backend: Optional[StateBackend] = None,
+    stats: Optional[StreamingStats] = None,
+    raw_json: Optional[bytes] = None,
+    msg_info: Optional[dict] = None,
+) -> tuple:
+    # Extracción, emparejamiento inbound/outbound y promedios de un webhook.
+    # Devuelve (resultado, notificación para GHL como (url, payload, payload serializado)
+    # o None); quien llama decide si la encola, la agrupa o la descarta.
+    # backend/stats permiten correrlo sobre otro estado (ej: el replay offline);
+    # raw_json son los bytes del body ya validados, que van al log tal cual; msg_info,
+    # la extracción si ya se hizo (para elegir el shard del contacto).
+    backend = state_backend if backend is None else backend
+    stats = streaming_stats if stats is None else stats
+
+    # Tiempos por etapa: logging y estado se acumulan y se registran una vez por evento
+    started = perf_counter()
+    # El body se serializa en el hilo del logger, no en el event loop (o ni se serializa, si llegó como JSON)
+    if sample_body() and logger.isEnabledFor(logging.INFO):
+        body = RawJson(raw_json) if raw_json is not None else parsed_body
+        logger.info("📦 Body recibido", extra={"event": "webhook_body", "received_at": timestamp_received.timestamp(), "body": body})
+    logged = perf_counter()
+    logging_seconds = logged - started
+
+    if msg_info is None:
+        msg_info = extract_message_info(parsed_body)
+        metrics.observe("extract", perf_counter() - logged)
+    contact_id = msg_info["contact_id"]
+    if not contact_id:
+        logger.warning("⚠️ Mensaje sin contact_id - ignorado")
+        metrics.observe("logging", logging_seconds)
+        metrics.count("no_contact_id")
+        return {"status": "ignored", "reason": "no_contact_id"}, None
+    # GHL a veces manda ids numéricos: se normalizan antes de tocar el estado, que
+    # al recargarse de la base los trae como texto
+    contact_id = str(contact_id)
+
+    received_at = timestamp_received.timestamp()
+
+    direction = msg_info["direction"] or "unknown"
+    direction_lower = str(direction).lower()
+
+    message_parsed = msg_info["timestamp_parsed"]
+    message_entry = MessageRecord(
+        received_at=received_at,
+        message_at=message_parsed.timestamp() if message_parsed else None,
+        direction=direction,
+        message=msg_info["message"],
+    )
+
+    started = perf_counter()
+    await backend.register_message(contact_id, msg_info["contact_name"], msg_info["phone"], message_entry)
+    state_seconds = perf_counter() - started
+    response_time_info = None
+    notification = None
+    outcome = "unknown_direction"
+
+    # INBOUND
+    if direction_lower == "inbound":
+        outcome = "inbound"
+        started = perf_counter()
+        total_pending = await backend.push_pending(contact_id, message_entry)
+        state_seconds += perf_counter() - started
+        logger.info("📥 MENSAJE INBOUND recibido (cliente → vendedor): %s | pendientes: %s", msg_info["message"], total_pending)
+
+    # OUTBOUND
+    elif direction_lower == "outbound":
+        logger.info("📤 MENSAJE OUTBOUND enviado (vendedor → cliente): %s", msg_info["message"])
+
+        # Tomamos el primer mensaje pendiente (FIFO), de forma atómica en el backend
+        started = perf_counter()
+        pending = await backend.pop_pending(contact_id)
+        state_seconds += perf_counter() - started
+        if pending is not None:
+            response_time_info = format_duration(measure_response_seconds(pending, message_entry))
+
+            tiempo_respuesta_minutos = response_time_info["total_seconds"] / 60
+            if tiempo_respuesta_minutos > TIEMPO_MAXIMO_MINUTOS:
+                logger.warning("⚠️ RESPUESTA DESCARTADA: %s excede límite", response_time_info["formatted"])
+                metrics.observe("logging", logging_seconds)
+                metrics.observe("state", state_seconds)
+                metrics.count("response_time_exceeded")
+                return {"status": "ignored", "reason": "response_time_exceeded"}, None
+
+            message_entry.response_seconds = response_time_info["total_seconds"]
+
+            # Extraer client_id y client_name
+            client_id = str(parsed_body.get("client_id") or parsed_body.get("clientId") or contact_id)
+            client_name = parsed_body.get("client_name") or parsed_body.get("clientName") or msg_info.get("contact_name") or "unknown"
+            location_id = msg_info["location_id"] or "unknown"
+
+            # Promedios
+            started = perf_counter()
+            aggregates = await backend.record_response(
+                contact_id, client_id, client_name, location_id, received_at, response_time_info["total_seconds"]
+            )
+            recorded = perf_counter()
+            state_seconds += recorded - started
+            global_stats = aggregates["global"]
+            vendor_stats = aggregates["vendor"]
+            conversation_stats = aggregates["conversation"]
+            global_response_count = global_stats["response_count"]
+            avg_global = calculate_average(global_stats["total_seconds"], global_response_count)
+            avg_client = calculate_average(vendor_stats["total_seconds"], vendor_stats["response_count"])
+            avg_conversation = calculate_average(conversation_stats["total_seconds"], conversation_stats["response_count"])
+
+            stats.record(contact_id, client_id, location_id, response_time_info["total_seconds"], now=received_at)
+            metrics.observe("stats", perf_counter() - recorded)
+
+            # DETERMINAR WEBHOOK POR LOCATION_ID
+            webhook_url = LOCATION_WEBHOOKS.get(location_id, WEBHOOK_DEFAULT)
+            if location_id not in LOCATION_WEBHOOKS:
+                logger.info("⚠️ Location_id %s no reconocido, usando webhook por defecto", location_id)
+
+            # Payload
+            payload_to_ghl = {
+                "contact_id": contact_id,
+                "client_id": client_id,
+                "client_name": str(client_name),
+                "outbound_message": str(msg_info["message"]) if msg_info["message"] else "",
+                "timestamp": timestamp_received.isoformat(),
+                "response_time_seconds": float(response_time_info["total_seconds"]),
+                "response_time_formatted": str(response_time_info["formatted"]),
+                "conversation_average_seconds": float(avg_conversation["total_seconds"]) if avg_conversation else 0.0,
+                "conversation_average_formatted": str(avg_conversation["formatted"]) if avg_conversation else "N/A",
+                "conversation_total_responses": conversation_stats["response_count"],
+                "global_average_seconds": float(avg_global["total_seconds"]) if avg_global else 0.0,
+                "global_average_formatted": str(avg_global["formatted"]) if avg_global else "N/A",
+                "global_total_responses": global_response_count,
+                "vendor_average_seconds": float(avg_client["total_seconds"]) if avg_client else 0.0,
+                "vendor_average_formatted": str(avg_client["formatted"]) if avg_client else "N/A",
+                "vendor_total_responses": vendor_stats["response_count"]
+            }
+
+            # Se serializa una sola vez: los mismos bytes van al log y al POST a GHL
+            started = perf_counter()
+            payload_body = codec.dumps(payload_to_ghl)
+            logger.info(
+                "⏱️ Tiempo de respuesta: %s | promedios global %s (%s), vendedor %s %s (%s), conversación %s (%s)",
+                response_time_info["formatted"],
+                avg_global["formatted"], global_response_count,
+                client_name, avg_client["formatted"], vendor_stats["response_count"],
+                avg_conversation["formatted"], conversation_stats["response_count"],
+                extra={"event": "ghl_payload", "webhook_url": webhook_url, "payload": RawJson(payload_body)},
+            )
+            logging_seconds += perf_counter() - started
+
+            notification = (webhook_url, payload_to_ghl, payload_body)
+            outcome = "outbound_matched"
+        else:
+            logger.info("ℹ️ Mensaje OUTBOUND sin inbound pendiente")
+            outcome = "outbound_unmatched"
+
+    metrics.observe("logging", logging_seconds)
+    metrics.observe("state", state_seconds)
+    metrics.count(outcome)
+    return {"status": "received", "timestamp": timestamp_received.isoformat()}, notification
 
 @router.post("/webhook/raw")
 async def receive_raw_webhook(request: Request, raw_body: bytes = Depends(get_raw_body)):
-    global global_total_seconds, global_response_count
-
+    started = perf_counter()
+    key = None
     try:
-        timestamp_received = datetime.now()
-        raw_body_text = raw_body.decode('utf-8', errors='ignore')
-        parsed_body = {}
-        try:
-            if raw_body_text.strip():
-                parsed_body = json.loads(raw_body_text)
-        except json.JSONDecodeError:
-            parsed_body = {"raw_text": raw_body_text}
-
-        logger.info(f"📦 Body recibido: {json.dumps(parsed_body, indent=2, ensure_ascii=False)}")
-
+        timestamp_received = datetime.now(pytz.utc)
+        parsed_body, raw_json = decode_body(raw_body)
+        decoded = perf_counter()
+        metrics.observe("decode", decoded - started)
+
+        # Antes de cualquier otro trabajo: un reintento de GHL no vuelve a contar
+        duplicate, key = await check_duplicate(parsed_body)
+        metrics.observe("dedup", perf_counter() - decoded)
+        if duplicate:
+            return FastJSONResponse(content=DUPLICATE_RESULT)
+
+        extract_started = perf_counter()
         msg_info = extract_message_info(parsed_body)
-        contact_id = msg_info["contact_id"]
-        if not contact_id:
-            logger.warning("⚠️ Mensaje sin contact_id - ignorado")
-            return JSONResponse(content={"status": "ignored", "reason": "no_contact_id"})
-
-        conv = conversations[contact_id]
-        if not conv.get("contact_id"):
-            conv["contact_id"] = contact_id
-            conv["contact_info"] = {"name": msg_info["contact_name"], "phone": msg_info["phone"]}
-            conv["pending_client_messages"] = []  # inicializamos lista de pendientes
-
-        direction = msg_info["direction"] or "unknown"
-        direction_lower = str(direction).lower()
-
-        message_entry = {
-            "timestamp_received": timestamp_received.isoformat(),
-            "timestamp_received_parsed": timestamp_received,
-            "timestamp_message": msg_info["timestamp"],
-            "timestamp_parsed": msg_info["timestamp_parsed"],
-            "direction": direction,
-            "message": msg_info["message"],
-            "response_time": None
-        }
-
-        conv["messages"].append(message_entry)
-        response_time_info = None
-
-        # INBOUND
-        if direction_lower == "inbound":
-            conv["pending_client_messages"].append(message_entry)
-            logger.info(f"📥 MENSAJE INBOUND recibido (cliente → vendedor): {msg_info['message']}")
-            logger.info(f"⏳ Mensaje agregado a pendientes... total pendientes: {len(conv['pending_client_messages'])}")
-
-        # OUTBOUND
-        elif direction_lower == "outbound":
-            logger.info(f"📤 MENSAJE OUTBOUND enviado (vendedor → cliente): {msg_info['message']}")
-
-            if conv["pending_client_messages"]:
-                # Tomamos el primer mensaje pendiente (FIFO)
-                pending = conv["pending_client_messages"].pop(0)
-                client_time = pending["timestamp_received_parsed"]
-                vendor_time = timestamp_received
-                response_time_info = calculate_response_time(client_time, vendor_time)
-
-                tiempo_respuesta_minutos = response_time_info["total_seconds"] / 60
-                if tiempo_respuesta_minutos > TIEMPO_MAXIMO_MINUTOS:
-                    logger.warning(f"⚠️ RESPUESTA DESCARTADA: {response_time_info['formatted']} excede límite")
-                    return JSONResponse(content={"status": "ignored", "reason": "response_time_exceeded"})
-
-                logger.info(f"✅ Tiempo de respuesta válido: {response_time_info['formatted']}")
-                message_entry["response_time"] = response_time_info
-                conv["response_times"].append(response_time_info)
-
-                # Extraer client_id y client_name
-                client_id = parsed_body.get("client_id") or parsed_body.get("clientId") or contact_id
-                client_name = parsed_body.get("client_name") or parsed_body.get("clientName") or msg_info.get("contact_name") or "unknown"
-
-                # Promedios
-                global_total_seconds += response_time_info["total_seconds"]
-                global_response_count += 1
-                avg_global = calculate_average(global_total_seconds, global_response_count)
-
-                client_stats[client_id]["total_seconds"] += response_time_info["total_seconds"]
-                client_stats[client_id]["response_count"] += 1
-                avg_client = calculate_average(client_stats[client_id]["total_seconds"], client_stats[client_id]["response_count"])
-
-                avg_conversation = calculate_conversation_average(conv["response_times"])
-
-                logger.info(f"⏱️ Tiempo de respuesta: {response_time_info['formatted']}")
-
-                # DETERMINAR WEBHOOK POR LOCATION_ID
-                location_id = parsed_body.get("location", {}).get("id", "unknown")
-                webhook_url = LOCATION_WEBHOOKS.get(location_id, WEBHOOK_DEFAULT)
-                if location_id in LOCATION_WEBHOOKS:
-                    logger.info(f"🎯 Location_id {location_id} reconocido, usando webhook específico")
-                else:
-                    logger.info(f"⚠️ Location_id {location_id} no reconocido, usando webhook por defecto")
-
-                # Payload
-                payload_to_ghl = {
-                    "contact_id": str(contact_id),
-                    "client_id": str(client_id),
-                    "client_name": str(client_name),
-                    "outbound_message": str(message_entry["message"]) if message_entry["message"] else "",
-                    "timestamp": timestamp_received.isoformat(),
-                    "response_time_seconds": float(response_time_info["total_seconds"]),
-                    "response_time_formatted": str(response_time_info["formatted"]),
-                    "conversation_average_seconds": float(avg_conversation["total_seconds"]) if avg_conversation else 0.0,
-                    "conversation_average_formatted": str(avg_conversation["formatted"]) if avg_conversation else "N/A",
-                    "conversation_total_responses": len(conv["response_times"]),
-                    "global_average_seconds": float(avg_global["total_seconds"]) if avg_global else 0.0,
-                    "global_average_formatted": str(avg_global["formatted"]) if avg_global else "N/A",
-                    "global_total_responses": global_response_count,
-                    "vendor_average_seconds": float(avg_client["total_seconds"]) if avg_client else 0.0,
-                    "vendor_average_formatted": str(avg_client["formatted"]) if avg_client else "N/A",
-                    "vendor_total_responses": client_stats[client_id]["response_count"]
-                }
-
-                logger.info(f"📤 Payload a enviar: {json.dumps(payload_to_ghl, indent=2, ensure_ascii=False)}")
-                logger.info(f"📊 PROMEDIOS ACUMULADOS:")
-                logger.info(f"   Global: {avg_global['formatted']} ({global_response_count} respuestas)")
-                logger.info(f"   Cliente {client_name}: {avg_client['formatted']} ({client_stats[client_id]['response_count']} respuestas)")
-                logger.info(f"   Conversación: {avg_conversation['formatted']} ({len(conv['response_times'])} respuestas)")
-
-                try:
-                    async with httpx.AsyncClient(timeout=10) as client:
-                        ghl_response = await client.post(webhook_url, json=payload_to_ghl)
-                        logger.info(f"✅ Webhook enviado - Status: {ghl_response.status_code}")
-                        logger.info(f"📥 Respuesta: {ghl_response.text}")
-                except Exception as e:
-                    logger.error(f"❌ Error enviando webhook: {str(e)}")
-            else:
-                logger.info(f"ℹ️ Mensaje OUTBOUND sin inbound pendiente")
-
-        return JSONResponse(content={"status": "received", "timestamp": timestamp_received.isoformat()})
+        metrics.observe("extract", perf_counter() - extract_started)
+        # En la cola del contacto: sus eventos se procesan de a uno y en orden de llegada
+        result, notification = await contact_shards.run(
+            msg_info["contact_id"], process_event, parsed_body, timestamp_received,
+            raw_json=raw_json, msg_info=msg_info,
+        )
+        if notification is not None:
+            # El envío a GHL se hace en segundo plano, respondemos sin esperar
+            enqueue_started = perf_counter()
+            delivery_queue.enqueue(*notification)
+            metrics.observe("enqueue", perf_counter() - enqueue_started)
+        metrics.observe("total", perf_counter() - started)
+        return FastJSONResponse(content=result)
 
     except Exception as e:
-        logger.error(f"❌ ERROR: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+        await forget_duplicate_key(key)
+        metrics.count("error")
+        logger.exception("❌ ERROR: %s", e)
+        raise HTTPException(status_code=400, detail=f"Error: {str(e)}")
+
+def unwrap_batch_item(item) -> tuple:
+    # Acepta el body tal cual o con la forma del log ({"received_at": epoch, "body": {...}})
+    if isinstance(item, dict) and "received_at" in item and isinstance(item.get("body"), dict):
+        return item["body"], datetime.fromtimestamp(float(item["received_at"]), tz=pytz.utc)
+    return item, None
+
+class BatchTooLarge(ValueError):
+    pass
+
+async def read_batch_body(request: Request, max_bytes: int):
+    # Chunks del body, cortando apenas se pasa del máximo (sin leer el resto)
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise BatchTooLarge(f"El lote supera el máximo de {max_bytes} bytes")
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise BatchTooLarge(f"El lote supera el máximo de {max_bytes} bytes")
+        yield chunk
+
+async def iter_batch_items(request: Request, max_bytes: int = BATCH_MAX_BYTES):
+    # Array JSON (se lee completo) o NDJSON (se procesa a medida que llega, línea por línea)
+    stream = read_batch_body(request, max_bytes)
+    head = []
+    async for chunk in stream:
+        head.append(chunk)
+        if chunk.strip():
+            break
+    buffer = b"".join(head)
+    if buffer.lstrip().startswith(b"["):
+        chunks = [buffer]
+        async for chunk in stream:
+            chunks.append(chunk)
+        items = codec.loads(b"".join(chunks))
+        if not isinstance(items, list):
+            raise ValueError("Se esperaba un array JSON")
+        for item in items:
+            yield item
+        return
+    # Solo se parte el chunk nuevo; la línea incompleta del final queda en `tail`
+    # (en partes, para no copiarla de nuevo con cada chunk)
+    tail = []
+    chunk = buffer
+    while True:
+        if b"\n" in chunk:
+            lines = chunk.split(b"\n")
+            if tail:
+                tail.append(lines[0])
+                lines[0] = b"".join(tail)
+            tail = [lines.pop()]
+            for line in lines:
+                if line.strip():
+                    yield decode_line(line)
+        elif chunk:
+            tail.append(chunk)
+        try:
+            chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            break
+    last = b"".join(tail)
+    if last.strip():
+        yield decode_line(last)
+
+def decode_line(line: bytes):
+    try:
+        return codec.loads(line)
+    except ValueError as e:
+        return BatchItemError(f"invalid_json: {getattr(e, 'msg', e)}")
+
+class BatchItemError:
+    __slots__ = ("reason",)
+
+    def __init__(self, reason: str):
+        self.reason = reason
+
+def coalesce_notifications(notifications: list) -> list:
+    # Por (contact_id, url) solo se envía el último payload (los promedios ya incluyen
+    # a los anteriores) junto con la cantidad de respuestas que resume
+    latest = {}
+    for webhook_url, payload, payload_body in notifications:
+        key = (payload["contact_id"], webhook_url)
+        count = latest[key][3] if key in latest else 0
+        latest[key] = (webhook_url, payload, payload_body, count + 1)
+    return list(latest.values())
+
+async def collect_batch_results(submitted: list, results: list, notifications: list):
+    # Espera los items encolados en los shards, en el orden del lote
+    for index, key, future in submitted:
+        try:
+            result, notification = await future
+        except Exception as e:
+            await forget_duplicate_key(key)
+            metrics.count("error")
+            logger.error("❌ ERROR en item %s del lote: %s", index, e, exc_info=e)
+            results[index] = {"index": index, "status": "error", "reason": str(e)}
+            continue
+        if notification is not None:
+            notifications.append(notification)
+        results[index] = {"index": index, **result}
+
+@router.post("/webhook/batch")
+async def receive_batch_webhook(request: Request):
+    results = []
+    submitted = []
+    notifications = []
+    try:
+        async for item in iter_batch_items(request):
+            index = len(results)
+            if index >= BATCH_MAX_ITEMS:
+                raise ValueError(f"El lote supera el máximo de {BATCH_MAX_ITEMS} items")
+            if isinstance(item, BatchItemError):
+                results.append({"index": index, "status": "error", "reason": item.reason})
+                continue
+            key = None
+            try:
+                parsed_body, timestamp_received = unwrap_batch_item(item)
+                duplicate, key = await check_duplicate(parsed_body)
+                if duplicate:
+                    results.append({"index": index, **DUPLICATE_RESULT})
+                    continue
+                msg_info = extract_message_info(parsed_body)
+                # Se encola sin esperar: el shard mantiene el orden por contacto y
+                # contactos distintos del lote se procesan en paralelo
+                future = await contact_shards.submit(
+                    msg_info["contact_id"], process_event, parsed_body,
+                    timestamp_received or datetime.now(pytz.utc), msg_info=msg_info,
+                )
+            except Exception as e:
+                await forget_duplicate_key(key)
+                metrics.count("error")
+                logger.exception("❌ ERROR en item %s del lote: %s", index, e)
+                results.append({"index": index, "status": "error", "reason": str(e)})
+                continue
+            submitted.append((index, key, future))
+            results.append(None)
+    except BatchTooLarge as e:
+        logger.warning("⚠️ Lote rechazado: %s", e)
+        raise HTTPException(status_code=413, detail=f"Error: {str(e)}")
+    except Exception as e:
+        logger.exception("❌ ERROR leyendo el lote: %s", e)
         raise HTTPException(status_code=400, detail=f"Error: {str(e)}")
+    finally:
+        # Lo ya encolado se termina de procesar y se notifica aunque el lote se corte a la mitad
+        await collect_batch_results(submitted, results, notifications)
+        coalesced = coalesce_notifications(notifications)
+        for notification in coalesced:
+            delivery_queue.enqueue(*notification)
+
+    logger.info("📦 Lote procesado: %s items, %s respuestas, %s webhooks a GHL", len(results), len(notifications), len(coalesced))
+    return FastJSONResponse(content={
+        "status": "received",
+        "items": len(results),
+        "responses_matched": len(notifications),
+        "notifications_sent": len(coalesced),
+        "results": results,
+    })
@@ -0,0 +1,323 @@
+"""Replay offline: reconstruye promedios y estadísticas a partir de webhooks capturados.
+
+Lee el log (JSON por línea con event=webhook_body, o el formato de texto anterior con
+"📦 Body recibido: {...}") o un NDJSON de bodies / {"received_at", "body"}, en streaming.
+Cada evento pasa por el mismo descarte de reintentos y el mismo process_event que
+/webhook/raw, sin envíos a GHL, en un pool de procesos repartido por hash de
+contact_id (el orden por contacto se mantiene).
+
+Uso:
+    python -m app.cli.replay webhook_messages.log.2 webhook_messages.log.1 webhook_messages.log
+    python -m app.cli.replay eventos.ndjson.gz --workers 8 --database-url sqlite:///./webhook_stats.db
+
+Con varios archivos rotados, pasarlos del más viejo al más reciente.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+import pytz
+
+from app.api.endpoints.webhook import process_event, unwrap_batch_item
+from app.core import codec, config
+from app.core.logger import LOGGER_NAME
+from app.db.session import get_engine, run_migrations
+from app.services.contact_shards import shard_for
+from app.services.conversation_store import ConversationStore
+from app.services.dedup import DedupIndex, dedup_key
+from app.services.extractor import PayloadExtractor
+from app.services.persistence import GLOBAL_STATS_ID, WriteBehindBuffer, replace_state
+from app.services.response_stats import ResponseStats, StreamingStats
+from app.services.state.memory import MemoryStateBackend
+from app.services.timestamps import parse_timestamp
+
+logger = logging.getLogger(LOGGER_NAME)
+
+# Formato de texto anterior: "2024-05-01 12:00:00,123 - 📦 Body recibido: {" + JSON con indent=2
+LEGACY_BODY_MARKER = " - 📦 Body recibido: "
+LEGACY_TIME_FORMAT = "%Y-%m-%d %H:%M:%S,%f"
+
+CHUNK_SIZE = 500
+QUEUE_CHUNKS = 8  # chunks en vuelo por shard: acota la memoria del lector
+
+
+class ReplayBuffer(WriteBehindBuffer):
+    # Junta lo que el write-behind mandaría a la base, sin motor ni flush periódico
+    enabled = True
+
+    def __init__(self, keep_response_times: bool = False):
+        super().__init__()
+        self.keep_response_times = keep_response_times
+
+    def record_response(self, contact_id, client_id, location_id, received_at: float, response_seconds: float):
+        if self.keep_response_times:
+            super().record_response(contact_id, client_id, location_id, received_at, response_seconds)
+
+
+def _open(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def iter_events(path: str, log_tz, counters: Counter):
+    """(received_at o None, body) de cada webhook capturado en el archivo."""
+    legacy_lines = None
+    legacy_received_at = None
+    with _open(path) as lines:
+        for line in lines:
+            counters["lines"] += 1
+            if legacy_lines is not None:
+                legacy_lines.append(line)
+                if line.rstrip() == "}":
+                    try:
+                        yield legacy_received_at, json.loads("".join(legacy_lines))
+                    except json.JSONDecodeError:
+                        counters["invalid"] += 1
+                    legacy_lines = None
+                continue
+
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if stripped[0] != "{":
+                marker = line.find(LEGACY_BODY_MARKER)
+                if marker == -1:
+                    continue
+                try:
+                    logged_at = datetime.strptime(line[:marker], LEGACY_TIME_FORMAT)
+                except ValueError:
+                    counters["invalid"] += 1
+                    continue
+                legacy_received_at = log_tz.localize(logged_at).timestamp()
+                rest = line[marker + len(LEGACY_BODY_MARKER):]
+                if rest.rstrip() == "{":
+                    legacy_lines = [rest]
+                else:
+                    # Body en una sola línea (ej: un array o un string)
+                    try:
+                        yield legacy_received_at, json.loads(rest)
+                    except json.JSONDecodeError:
+                        counters["invalid"] += 1
+                continue
+
+            try:
+                entry = codec.loads(stripped)
+            except ValueError:
+                counters["invalid"] += 1
+                continue
+            if isinstance(entry, dict) and "level" in entry and "msg" in entry:
+                # Registro del log JSON: solo interesan los bodies recibidos
+                if entry.get("event") != "webhook_body":
+                    continue
+                entry = {"received_at": entry["received_at"], "body": entry["body"]}
+            body, received = unwrap_batch_item(entry)
+            yield (received.timestamp() if received else None), body
+
+
+def run_shard(shard: int, inbox, results, keep_response_times: bool, verbose: bool):
+    if not verbose:
+        logger.setLevel(logging.ERROR)
+    try:
+        results.put(asyncio.run(_replay_shard(shard, inbox, keep_response_times)))
+    except Exception as e:
+        results.put({"shard": shard, "error": repr(e)})
+
+
+async def _replay_shard(shard: int, inbox, keep_response_times: bool) -> dict:
+    buffer = ReplayBuffer(keep_response_times)
+    backend = MemoryStateBackend(ConversationStore(), ResponseStats(), buffer, persist=False)
+    stats = StreamingStats()
+    outcomes = Counter()
+    # Igual que el PendingSweeper en vivo, pero con la hora de los eventos
+    max_age = config.TIEMPO_MAXIMO_MINUTOS * 60
+    next_sweep = None
+    # Los reintentos de un body caen en el mismo shard (mismo contact_id)
+    dedup = DedupIndex() if config.DEDUP_ENABLED else None
+    while True:
+        chunk = inbox.get()
+        if chunk is None:
+            break
+        for received_at, body in chunk:
+            if next_sweep is None or received_at >= next_sweep:
+                if next_sweep is not None:
+                    outcomes["pending_expired"] += await backend.expire_pending(received_at - max_age)
+                next_sweep = received_at + config.PENDING_SWEEP_INTERVAL
+            key = None
+            if dedup is not None:
+                key = dedup_key(body)
+                if dedup.seen(key, now=received_at):
+                    outcomes["duplicate"] += 1
+                    continue
+            try:
+                result, notification = await process_event(
+                    body, datetime.fromtimestamp(received_at, tz=pytz.utc), backend=backend, stats=stats
+                )
+            except Exception:
+                if key is not None:
+                    dedup.forget(key)
+                outcomes["error"] += 1
+                continue
+            outcomes[result.get("reason") or result["status"]] += 1
+            if notification is not None:
+                outcomes["notifications"] += 1
+    return {"shard": shard, "outcomes": outcomes, "batch": buffer.take_batch(), "stats": stats}
+
+
+def merge_batches(batches: list) -> dict:
+    # Contactos y pendientes no se repiten entre shards (se reparten por contact_id);
+    # vendedores y global sí, y se suman
+    merged = {"contacts": [], "pending_added": [], "pending_removed": [], "response_times": [], "vendors": [], "global": None}
+    vendors = {}
+    global_total, global_count = 0.0, 0
+    for batch in batches:
+        merged["contacts"].extend(batch["contacts"])
+        merged["pending_added"].extend(batch["pending_added"])
+        merged["response_times"].extend(batch["response_times"])
+        for row in batch["vendors"]:
+            vendor = vendors.get(row["client_id"])
+            if vendor is None:
+                vendors[row["client_id"]] = dict(row)
+            else:
+                vendor["total_seconds"] += row["total_seconds"]
+                vendor["response_count"] += row["response_count"]
+                vendor["client_name"] = vendor["client_name"] or row["client_name"]
+        if batch["global"]:
+            global_total += batch["global"]["total_seconds"]
+            global_count += batch["global"]["response_count"]
+    merged["vendors"] = list(vendors.values())
+    if global_count:
+        merged["global"] = {"id": GLOBAL_STATS_ID, "total_seconds": global_total, "response_count": global_count}
+    return merged
+
+
+def replay(paths: list, workers: int, log_tz, keep_response_times: bool = False, verbose: bool = False) -> dict:
+    started = time.perf_counter()
+    inboxes = [multiprocessing.Queue(maxsize=QUEUE_CHUNKS) for _ in range(workers)]
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=run_shard, args=(n, inboxes[n], results, keep_response_times, verbose), name=f"replay-{n}"
+        )
+        for n in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    # El lector solo extrae contact_id (y la hora del mensaje si falta) para elegir el shard
+    extractor = PayloadExtractor()
+    counters = Counter()
+    chunks = [[] for _ in range(workers)]
+    for path in paths:
+        for received_at, body in iter_events(path, log_tz, counters):
+            counters["events"] += 1
+            info = extractor.extract(body)
+            if received_at is None:
+                # Solo la hora del mensaje: date_created y similares son el alta del contacto
+                parsed = parse_timestamp(info["message_timestamp"], source=info["location_id"])
+                if parsed is None:
+                    counters["no_timestamp"] += 1
+                    continue
+                received_at = parsed.timestamp()
+            shard = shard_for(info["contact_id"], workers)
+            chunks[shard].append((received_at, body))
+            if len(chunks[shard]) >= CHUNK_SIZE:
+                inboxes[shard].put(chunks[shard])
+                chunks[shard] = []
+    for shard, chunk in enumerate(chunks):
+        if chunk:
+            inboxes[shard].put(chunk)
+        inboxes[shard].put(None)
+
+    # Se vacía la cola de resultados antes del join (un resultado grande bloquea al hijo)
+    shard_results = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    failed = [result for result in shard_results if "error" in result]
+    if failed:
+        raise RuntimeError(f"Falló el replay en {len(failed)} shards: {failed[0]['error']}")
+
+    outcomes = Counter()
+    stats = StreamingStats(max_keys=sys.maxsize)
+    for result in shard_results:
+        outcomes.update(result["outcomes"])
+        stats.merge(result["stats"])
+    batch = merge_batches([result["batch"] for result in shard_results])
+    return {
+        "counters": counters,
+        "outcomes": outcomes,
+        "batch": batch,
+        "stats": stats,
+        "elapsed_seconds": time.perf_counter() - started,
+    }
+
+
+def build_report(result: dict, top: int) -> dict:
+    batch = result["batch"]
+    stats = result["stats"]
+    global_row = batch["global"] or {"total_seconds": 0.0, "response_count": 0}
+    vendors = sorted(batch["vendors"], key=lambda row: row["response_count"], reverse=True)
+    elapsed = result["elapsed_seconds"]
+    return {
+        "input": dict(result["counters"]),
+        "outcomes": dict(result["outcomes"]),
+        "elapsed_seconds": round(elapsed, 2),
+        "events_per_second": round(result["counters"]["events"] / elapsed, 1) if elapsed else None,
+        "global": {
+            "response_count": global_row["response_count"],
+            "average_seconds": global_row["total_seconds"] / global_row["response_count"] if global_row["response_count"] else None,
+            "summary": stats.get("global", window="all"),
+        },
+        "vendors": [
+            {
+                "client_id": row["client_id"],
+                "client_name": row["client_name"],
+                "response_count": row["response_count"],
+                "average_seconds": row["total_seconds"] / row["response_count"] if row["response_count"] else None,
+                "summary": stats.get("vendor", row["client_id"], window="all"),
+            }
+            for row in vendors[:top]
+        ],
+        "contacts": len(batch["contacts"]),
+        "pending": len(batch["pending_added"]),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconstruye las estadísticas a partir de webhooks capturados.")
+    parser.add_argument("paths", nargs="+", help="log de la app o NDJSON (.gz admitido), del más viejo al más reciente")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="procesos (shards por contact_id)")
+    parser.add_argument("--log-tz", default="UTC", help="zona horaria de las fechas del log de texto anterior")
+    parser.add_argument("--database-url", help="si se indica, escribe contactos, vendedores, global y pendientes")
+    parser.add_argument("--with-response-times", action="store_true", help="escribe también cada tiempo de respuesta")
+    parser.add_argument("--top", type=int, default=20, help="vendedores en el reporte")
+    parser.add_argument("--verbose", action="store_true", help="deja el logging de cada evento")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    result = replay(
+        args.paths, max(1, args.workers), pytz.timezone(args.log_tz),
+        keep_response_times=args.with_response_times, verbose=args.verbose,
+    )
+    report = build_report(result, args.top)
+
+    if args.database_url:
+        run_migrations(args.database_url)
+        engine = get_engine(args.database_url)
+        report["rows_written"] = replace_state(engine, result["batch"])
+        engine.dispose()
+        logger.info(f"💾 Estado reconstruido guardado en {engine.url.render_as_string(hide_password=True)}")
+
+    print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
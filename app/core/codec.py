@@ -0,0 +1,63 @@
+import json
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+# orjson es opcional: parsea directo desde bytes y serializa a bytes sin pasar por str.
+# Sin orjson se usa json de la librería estándar con la misma interfaz.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+
+JSON_HEADERS = {"content-type": "application/json"}
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj, sort_keys: bool = False) -> bytes:
+        return orjson.dumps(obj, default=str, option=(_OPTIONS | orjson.OPT_SORT_KEYS) if sort_keys else _OPTIONS)
+else:
+    def loads(data):
+        # Solo UTF-8, igual que orjson (json.loads con bytes adivina UTF-16/32)
+        return json.loads(data.decode("utf-8") if isinstance(data, (bytes, bytearray)) else data)
+
+    def dumps(obj, sort_keys: bool = False) -> bytes:
+        return json.dumps(
+            obj, ensure_ascii=False, separators=(",", ":"), default=str, sort_keys=sort_keys
+        ).encode("utf-8")
+
+
+def add_field(body: bytes, key: str, value) -> bytes:
+    """Agrega un campo a un objeto JSON ya serializado sin volver a serializarlo."""
+    return body[:-1] + b',' + dumps(key) + b':' + dumps(value) + b'}'
+
+
+class RawJson:
+    """JSON ya serializado que el formatter del log inserta tal cual.
+
+    Los saltos de línea crudos solo pueden estar entre tokens (dentro de un string
+    van escapados), así que se reemplazan por espacios para mantener una línea por registro.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def text(self) -> str:
+        data = self.data
+        if b"\n" in data or b"\r" in data:
+            data = data.replace(b"\r", b" ").replace(b"\n", b" ")
+        return data.decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    # Misma salida que JSONResponse, serializada con el codec de arriba
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
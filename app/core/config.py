@@ -0,0 +1,117 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+# CONFIGURACIÓN: Cliente HTTP compartido hacia GHL
+GHL_HTTP_TIMEOUT = _env_float("GHL_HTTP_TIMEOUT", 10.0)
+GHL_MAX_CONNECTIONS = _env_int("GHL_MAX_CONNECTIONS", 100)
+GHL_MAX_KEEPALIVE = _env_int("GHL_MAX_KEEPALIVE", 20)
+GHL_KEEPALIVE_EXPIRY = _env_float("GHL_KEEPALIVE_EXPIRY", 30.0)
+
+# CONFIGURACIÓN: Cola de envíos en segundo plano
+DELIVERY_QUEUE_SIZE = _env_int("DELIVERY_QUEUE_SIZE", 1000)
+DELIVERY_WORKERS = _env_int("DELIVERY_WORKERS", 4)
+DELIVERY_MAX_ATTEMPTS = _env_int("DELIVERY_MAX_ATTEMPTS", 5)
+DELIVERY_BACKOFF_INITIAL = _env_float("DELIVERY_BACKOFF_INITIAL", 0.5)
+DELIVERY_BACKOFF_MAX = _env_float("DELIVERY_BACKOFF_MAX", 30.0)
+DELIVERY_SHUTDOWN_TIMEOUT = _env_float("DELIVERY_SHUTDOWN_TIMEOUT", 10.0)
+# Ventana (s) en la que se agrupan las notificaciones de un mismo (contact_id, webhook):
+# se envía solo la última, con la cantidad de respuestas que resume. 0 = sin agrupar
+DELIVERY_COALESCE_WINDOW = _env_float("DELIVERY_COALESCE_WINDOW", 2.0)
+# Máximo de notificaciones esperando su ventana (más allá se descartan)
+DELIVERY_MAX_COALESCING = _env_int("DELIVERY_MAX_COALESCING", 10000)
+# Token bucket por webhook de destino: requests/s y ráfaga máxima. 0 = sin límite
+GHL_RATE_PER_SECOND = _env_float("GHL_RATE_PER_SECOND", 10.0)
+GHL_RATE_BURST = _env_int("GHL_RATE_BURST", 20)
+
+# CONFIGURACIÓN: Almacén de conversaciones en memoria
+CONVERSATION_MAX_CONTACTS = _env_int("CONVERSATION_MAX_CONTACTS", 50000)
+CONVERSATION_TTL_SECONDS = _env_float("CONVERSATION_TTL_SECONDS", 24 * 3600)
+CONVERSATION_MAX_MESSAGES = _env_int("CONVERSATION_MAX_MESSAGES", 20)
+CONVERSATION_MAX_PENDING = _env_int("CONVERSATION_MAX_PENDING", 100)
+CONVERSATION_MAX_MESSAGE_CHARS = _env_int("CONVERSATION_MAX_MESSAGE_CHARS", 500)
+# Tiempo máximo de respuesta (minutos): respuestas más lentas se descartan y los
+# inbound pendientes más viejos se sacan de la cola cada PENDING_SWEEP_INTERVAL segundos
+TIEMPO_MAXIMO_MINUTOS = _env_int("TIEMPO_MAXIMO_MINUTOS", 300)
+PENDING_SWEEP_INTERVAL = _env_float("PENDING_SWEEP_INTERVAL", 60.0)
+
+# CONFIGURACIÓN: Procesamiento de eventos por contacto
+# Los eventos se reparten en N colas por hash de contact_id: cada contacto se procesa
+# en orden de llegada y contactos de colas distintas en paralelo
+EVENT_SHARDS = _env_int("EVENT_SHARDS", 16)
+EVENT_SHARD_QUEUE_SIZE = _env_int("EVENT_SHARD_QUEUE_SIZE", 1000)
+EVENT_SHUTDOWN_TIMEOUT = _env_float("EVENT_SHUTDOWN_TIMEOUT", 10.0)
+
+# CONFIGURACIÓN: Persistencia (write-behind hacia la base de datos)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./webhook_stats.db")
+PERSISTENCE_ENABLED = os.getenv("PERSISTENCE_ENABLED", "1") == "1"
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "1") == "1"
+PERSISTENCE_FLUSH_INTERVAL = _env_float("PERSISTENCE_FLUSH_INTERVAL", 2.0)
+PERSISTENCE_BATCH_SIZE = _env_int("PERSISTENCE_BATCH_SIZE", 500)
+
+# CONFIGURACIÓN: Backend de estado compartido
+# "memory": un solo proceso (con persistencia write-behind opcional)
+# "sql": estado en base de datos compartida, seguro con varios workers/nodos
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_DATABASE_URL = os.getenv("STATE_DATABASE_URL", DATABASE_URL)
+SQLITE_BUSY_TIMEOUT_MS = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+
+# CONFIGURACIÓN: Timestamps
+# Zona horaria asumida para timestamps sin zona que manda GHL
+TIMESTAMP_DEFAULT_TZ = os.getenv("TIMESTAMP_DEFAULT_TZ", "UTC")
+# "received": hora de llegada al servicio | "message": timestamp del propio mensaje
+# (solo si el workflow manda la hora del mensaje en timestamp/time/createdAt/date;
+# si falta se usa la de llegada)
+RESPONSE_TIME_SOURCE = os.getenv("RESPONSE_TIME_SOURCE", "received")
+
+# CONFIGURACIÓN: Estadísticas en streaming (percentiles y ventanas)
+STATS_MAX_KEYS_PER_SCOPE = _env_int("STATS_MAX_KEYS_PER_SCOPE", 50000)
+STATS_WARMUP_FROM_DB = os.getenv("STATS_WARMUP_FROM_DB", "1") == "1"
+# Con STATE_BACKEND=sql, /stats se arma con los response_times de todos los workers;
+# cada cuántos segundos se recalcula como máximo
+STATS_SHARED_REFRESH_SECONDS = _env_float("STATS_SHARED_REFRESH_SECONDS", 30.0)
+# Workers de uvicorn (startup.sh lo exporta con el valor efectivo)
+WEB_CONCURRENCY = _env_int("WEB_CONCURRENCY", 1)
+
+# CONFIGURACIÓN: Logging
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", "webhook_messages.log")
+# "size": rota por tamaño | "time": rota por tiempo (LOG_ROTATE_WHEN) | "none"
+LOG_ROTATION = os.getenv("LOG_ROTATION", "size")
+LOG_MAX_BYTES = _env_int("LOG_MAX_BYTES", 50 * 1024 * 1024)
+LOG_BACKUP_COUNT = _env_int("LOG_BACKUP_COUNT", 10)
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
+# Fracción de requests cuyo body completo se guarda en el log (1.0 = todos)
+LOG_BODY_SAMPLE_RATE = _env_float("LOG_BODY_SAMPLE_RATE", 1.0)
+LOG_CONSOLE = os.getenv("LOG_CONSOLE", "1") == "1"
+
+# CONFIGURACIÓN: Readiness (/healthcheck?ready=true)
+# No listo si la cola de envíos (o las de eventos) supera esta fracción de su capacidad
+READY_MAX_QUEUE_FILL = _env_float("READY_MAX_QUEUE_FILL", 0.9)
+# ...o si el write-behind acumula más cambios sin guardar que esto (base caída)
+READY_MAX_BUFFERED_WRITES = _env_int("READY_MAX_BUFFERED_WRITES", 20000)
+
+# CONFIGURACIÓN: Deduplicación de reintentos de GHL
+# Por id de mensaje, o por hash del body si no trae id: dos webhooks idénticos
+# dentro de la ventana cuentan como uno (la ventana real es de TTL a 2*TTL).
+# Con STATE_BACKEND=memory el índice es del proceso; con "sql" las claves van a la
+# tabla dedup_keys y valen para todos los workers (ventana de TTL exacto)
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") == "1"
+DEDUP_TTL_SECONDS = _env_float("DEDUP_TTL_SECONDS", 600)
+DEDUP_MAX_KEYS = _env_int("DEDUP_MAX_KEYS", 200000)
+
+# CONFIGURACIÓN: Ingesta por lotes (/webhook/batch)
+BATCH_MAX_ITEMS = _env_int("BATCH_MAX_ITEMS", 10000)
+# Tamaño máximo del body: un array se lee entero en memoria antes de procesarse
+BATCH_MAX_BYTES = _env_int("BATCH_MAX_BYTES", 32 * 1024 * 1024)
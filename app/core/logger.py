@@ -0,0 +1,112 @@
+import atexit
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from typing import Optional
+
+from app.core import codec, config
+
+LOGGER_NAME = "message_tracker"
+
+# Atributos estándar de LogRecord: todo lo demás viene de `extra` y va al JSON
+_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Un registro por línea: {"ts", "level", "msg", ...campos de extra}."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        raw = None
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                if type(value) is codec.RawJson:
+                    # Ya viene serializado (el body recibido, el payload a GHL): se inserta tal cual
+                    raw = raw or []
+                    raw.append((key, value))
+                else:
+                    entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        line = codec.dumps(entry).decode("utf-8")
+        if raw:
+            line = line[:-1] + "".join(f",{codec.dumps(key).decode()}:{value.text()}" for key, value in raw) + "}"
+        return line
+
+
+class LoopSafeQueueHandler(QueueHandler):
+    # En el event loop solo se arma el mensaje; el JSON y la escritura a disco
+    # ocurren en el hilo del QueueListener
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _file_handler(log_file: str) -> logging.Handler:
+    if config.LOG_ROTATION == "time":
+        handler = TimedRotatingFileHandler(
+            log_file, when=config.LOG_ROTATE_WHEN, backupCount=config.LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    elif config.LOG_ROTATION == "size":
+        handler = RotatingFileHandler(
+            log_file, maxBytes=config.LOG_MAX_BYTES, backupCount=config.LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    else:
+        handler = logging.FileHandler(log_file, encoding="utf-8")
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def setup_logging(log_file: Optional[str] = config.LOG_FILE, console: bool = config.LOG_CONSOLE):
+    """Configura el logger de la app con una cola y un hilo escritor (idempotente)."""
+    global _listener
+    if _listener is not None:
+        return
+    handlers = []
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        handlers.append(console_handler)
+    if log_file:
+        handlers.append(_file_handler(log_file))
+
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(config.LOG_LEVEL)
+    logger.handlers = [LoopSafeQueueHandler(log_queue)]
+    logger.propagate = False
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    # Vacía la cola y cierra los archivos
+    global _listener
+    if _listener is None:
+        return
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers = []
+    logger.propagate = True
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+def sample_body() -> bool:
+    rate = config.LOG_BODY_SAMPLE_RATE
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
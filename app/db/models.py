@@ -0,0 +1,71 @@
+from typing import Optional
+
+from sqlalchemy import Float, Index, Integer, String, Text
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+# Los tiempos se guardan como epoch (float) para no depender del soporte de zonas horarias del motor
+
+class Contact(Base):
+    __tablename__ = "contacts"
+
+    contact_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    name: Mapped[Optional[str]] = mapped_column(String(255))
+    phone: Mapped[Optional[str]] = mapped_column(String(64))
+    response_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    response_total_seconds: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    last_seen: Mapped[float] = mapped_column(Float, nullable=False, index=True)
+
+
+class PendingMessage(Base):
+    __tablename__ = "pending_messages"
+    __table_args__ = (
+        Index("ix_pending_messages_contact_received", "contact_id", "received_at"),
+        Index("ix_pending_messages_received_at", "received_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    contact_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    received_at: Mapped[float] = mapped_column(Float, nullable=False)
+    message_at: Mapped[Optional[float]] = mapped_column(Float)
+    message: Mapped[Optional[str]] = mapped_column(Text)
+
+
+class ResponseTime(Base):
+    __tablename__ = "response_times"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    contact_id: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    client_id: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    location_id: Mapped[Optional[str]] = mapped_column(String(64))
+    received_at: Mapped[float] = mapped_column(Float, nullable=False, index=True)
+    response_seconds: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+class VendorStats(Base):
+    __tablename__ = "vendor_stats"
+
+    client_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    client_name: Mapped[Optional[str]] = mapped_column(String(255))
+    total_seconds: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    response_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class GlobalStats(Base):
+    __tablename__ = "global_stats"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    total_seconds: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    response_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class DedupKey(Base):
+    # Reintentos de GHL ya vistos por algún worker (STATE_BACKEND=sql)
+    __tablename__ = "dedup_keys"
+
+    key: Mapped[str] = mapped_column(String(32), primary_key=True)
+    seen_at: Mapped[float] = mapped_column(Float, nullable=False, index=True)
@@ -0,0 +1,66 @@
+import logging
+import os
+from typing import Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Connection, Engine
+
+from app.core import config
+
+logger = logging.getLogger("message_tracker")
+
+_engine: Optional[Engine] = None
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "alembic.ini")
+
+
+def get_engine(url: str = None) -> Engine:
+    global _engine
+    if url is not None:
+        return create_engine(url, future=True)
+    if _engine is None:
+        _engine = create_engine(config.DATABASE_URL, future=True, pool_pre_ping=True)
+    return _engine
+
+
+def dispose_engine():
+    global _engine
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+
+
+def run_migrations(url: str = None):
+    from alembic import command
+    from alembic.config import Config
+
+    alembic_cfg = Config(ALEMBIC_INI)
+    alembic_cfg.set_main_option("sqlalchemy.url", url or config.DATABASE_URL)
+    # No pisar la configuración de logging de la app
+    alembic_cfg.attributes["skip_logging"] = True
+    command.upgrade(alembic_cfg, "head")
+
+
+def upsert(conn: Connection, table, rows: list, index_elements: list, set_=None, where=None):
+    # INSERT ... ON CONFLICT DO UPDATE en lote (SQLite y Postgres); `where` limita
+    # qué filas existentes se actualizan
+    if not rows:
+        return None
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise RuntimeError(f"Motor de base de datos no soportado para upsert: {dialect}")
+    stmt = insert(table)
+    if set_ is None:
+        set_ = {
+            column.name: stmt.excluded[column.name]
+            for column in table.columns
+            if column.name not in index_elements
+        }
+    elif callable(set_):
+        set_ = set_(stmt.excluded)
+    stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=set_, where=where)
+    return conn.execute(stmt, rows)
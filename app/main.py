@@ -1,7 +1,37 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.api import api_router
+from app.core.codec import FastJSONResponse
+from app.core.logger import setup_logging, shutdown_logging
+from app.services.contact_shards import contact_shards
+from app.services.delivery_queue import delivery_queue
+from app.services.ghl_client import close_http_client, open_http_client
+from app.services.pending_sweeper import pending_sweeper
+from app.services.state import state_backend
+
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    # Logging en segundo plano + backend de estado (con sus promedios persistidos)
+    # + cliente HTTP compartido + cola de envíos a GHL + shards de eventos por contacto
+    setup_logging()
+    await state_backend.start()
+    await pending_sweeper.start(state_backend)
+    client = await open_http_client()
+    await delivery_queue.start(client)
+    await contact_shards.start()
+    try:
+        yield
+    finally:
+        # Primero se terminan los eventos aceptados: pueden encolar envíos
+        await contact_shards.stop()
+        await delivery_queue.stop()
+        await pending_sweeper.stop()
+        await close_http_client()
+        await state_backend.stop()
+        shutdown_logging()
 
 def create_application():
     application = FastAPI(
@@ -15,7 +45,9 @@ def create_application():
             "docExpansion": "none",
             "persistAuthorization": True,    
             "tryItOutEnabled":True,           
-        }
+        },
+        lifespan=lifespan,
+        default_response_class=FastJSONResponse,
     )
 
     application.include_router(api_router)
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import zlib
+
+from app.core import config
+from app.services.metrics import metrics, perf_counter
+
+logger = logging.getLogger("message_tracker")
+
+
+def shard_for(contact_id, shards: int) -> int:
+    # crc32 y no hash(): tiene que dar lo mismo en todos los procesos
+    return zlib.crc32(str(contact_id).encode("utf-8")) % shards
+
+
+class ContactShards:
+    """Procesamiento de eventos en N colas asyncio, repartidas por hash de contact_id.
+
+    Todos los eventos de un contacto caen en la misma cola y su worker los procesa de
+    a uno en orden de llegada, así que inbound y outbound de un contacto no se
+    adelantan entre sí aunque el backend haga I/O entre pasos (sin locks). Contactos
+    de colas distintas avanzan en paralelo.
+    """
+
+    def __init__(self, shards: int = config.EVENT_SHARDS, queue_size: int = config.EVENT_SHARD_QUEUE_SIZE):
+        self.shards = max(1, shards)
+        self.queue_size = queue_size
+        self._queues: list = []
+        self._tasks: list = []
+        self.processed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    @property
+    def capacity(self) -> int:
+        return self.shards * self.queue_size
+
+    def stats(self) -> dict:
+        return {
+            "shards": self.shards,
+            "depth": self.depth,
+            "capacity": self.capacity,
+            "busiest": max((queue.qsize() for queue in self._queues), default=0),
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.shards)]
+        self._tasks = [
+            asyncio.create_task(self._worker(queue), name=f"event-shard-{n}")
+            for n, queue in enumerate(self._queues)
+        ]
+        logger.info(f"🧵 Procesamiento por contacto iniciado ({self.shards} shards, {self.queue_size} eventos por shard)")
+
+    async def stop(self, timeout: float = config.EVENT_SHUTDOWN_TIMEOUT):
+        if not self._tasks:
+            return
+        try:
+            # Lo ya encolado tiene un request esperando: se termina antes de cerrar
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Shards de eventos cerrados con {self.depth} eventos sin procesar")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = []
+
+    async def submit(self, contact_id, fn, *args, **kwargs) -> asyncio.Future:
+        """Encola fn(*args, **kwargs) en el shard del contacto (espera si está lleno).
+
+        Devuelve un futuro con el resultado: quien encola varios eventos seguidos puede
+        esperarlos después sin perder el orden por contacto.
+        """
+        if not self._tasks:
+            raise RuntimeError("Los shards de eventos no están iniciados (¿falta el lifespan de la app?)")
+        future = asyncio.get_running_loop().create_future()
+        await self._queues[shard_for(contact_id, self.shards)].put((fn, args, kwargs, future, perf_counter()))
+        return future
+
+    async def run(self, contact_id, fn, *args, **kwargs):
+        return await (await self.submit(contact_id, fn, *args, **kwargs))
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            fn, args, kwargs, future, enqueued_at = await queue.get()
+            metrics.observe("shard_wait", perf_counter() - enqueued_at)
+            try:
+                result = await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                # Si quien esperaba se fue (cliente desconectado) el evento igual quedó procesado
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self.processed += 1
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                queue.task_done()
+
+
+contact_shards = ContactShards()
@@ -0,0 +1,233 @@
+import heapq
+import itertools
+import logging
+import resource
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+from app.core import config
+
+logger = logging.getLogger("message_tracker")
+
+# Entradas ya resueltas que se toleran en el índice de pendientes antes de compactarlo
+PENDING_INDEX_SLACK = 1024
+
+
+class MessageRecord:
+    # Registro compacto: sin body crudo y con un solo timestamp de recepción (epoch)
+    __slots__ = ("received_at", "message_at", "direction", "message", "response_seconds")
+
+    def __init__(self, received_at: float, message_at: Optional[float], direction: str, message):
+        self.received_at = received_at
+        self.message_at = message_at
+        self.direction = sys.intern(str(direction))
+        if message is not None:
+            message = str(message)[:config.CONVERSATION_MAX_MESSAGE_CHARS]
+        self.message = message
+        self.response_seconds: Optional[float] = None
+
+
+class Conversation:
+    __slots__ = (
+        "contact_id",
+        "name",
+        "phone",
+        "messages",
+        "pending_client_messages",
+        "response_count",
+        "response_total_seconds",
+        "last_seen",
+    )
+
+    def __init__(self, contact_id: str, name=None, phone=None, max_messages: int = config.CONVERSATION_MAX_MESSAGES):
+        self.contact_id = contact_id
+        self.name = name
+        self.phone = phone
+        # Solo se guardan los últimos K mensajes por contacto
+        self.messages = deque(maxlen=max_messages)
+        self.pending_client_messages: deque = deque()
+        self.response_count = 0
+        self.response_total_seconds = 0.0
+        self.last_seen = 0.0
+
+    def add_message(self, record: MessageRecord):
+        self.messages.append(record)
+
+    def add_pending(self, record: MessageRecord) -> Optional[MessageRecord]:
+        self.pending_client_messages.append(record)
+        if len(self.pending_client_messages) > config.CONVERSATION_MAX_PENDING:
+            # Se descarta el inbound más antiguo para no crecer sin límite
+            return self.pending_client_messages.popleft()
+        return None
+
+    def pop_pending(self) -> Optional[MessageRecord]:
+        # Primer mensaje pendiente (FIFO)
+        return self.pending_client_messages.popleft() if self.pending_client_messages else None
+
+    def add_response(self, total_seconds: float):
+        self.response_count += 1
+        self.response_total_seconds += total_seconds
+
+
+class ConversationStore:
+    """Conversaciones por contact_id con límite de contactos, TTL de inactividad y desalojo LRU.
+
+    Los pendientes se agregan y consumen a través del almacén: además de la cola de
+    cada conversación se mantiene un heap por hora de llegada, así vencer los más
+    viejos no requiere recorrer todas las conversaciones.
+    """
+
+    def __init__(
+        self,
+        max_contacts: int = config.CONVERSATION_MAX_CONTACTS,
+        ttl_seconds: float = config.CONVERSATION_TTL_SECONDS,
+        max_messages: int = config.CONVERSATION_MAX_MESSAGES,
+    ):
+        self.max_contacts = max_contacts
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        # Orden de inserción = orden de último acceso (el más viejo al principio)
+        self._data: "OrderedDict[str, Conversation]" = OrderedDict()
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+        # (received_at, secuencia, contact_id, record); los ya consumidos quedan hasta
+        # vencer o hasta compactar, y se reconocen porque no están en _pending_live
+        self._pending_index: list = []
+        self._pending_live: set = set()
+        self._pending_seq = itertools.count()
+        self.expired_pending = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, contact_id) -> bool:
+        return contact_id in self._data
+
+    def __iter__(self):
+        return iter(self._data.values())
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending_live)
+
+    def get(self, contact_id) -> Optional[Conversation]:
+        return self._data.get(contact_id)
+
+    def get_or_create(self, contact_id, name=None, phone=None, now: Optional[float] = None) -> Conversation:
+        now = time.time() if now is None else now
+        conv = self._data.get(contact_id)
+        if conv is None:
+            conv = Conversation(contact_id, name, phone, self.max_messages)
+            self._data[contact_id] = conv
+        else:
+            self._data.move_to_end(contact_id)
+        conv.last_seen = now
+        self.evict(now)
+        return conv
+
+    def evict(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        removed = 0
+        cutoff = now - self.ttl_seconds
+        # Los inactivos están al principio: se corta en el primero que sigue vigente
+        while self._data:
+            contact_id, conv = next(iter(self._data.items()))
+            if conv.last_seen >= cutoff:
+                break
+            del self._data[contact_id]
+            self._pending_live.difference_update(conv.pending_client_messages)
+            self.evicted_ttl += 1
+            removed += 1
+        while len(self._data) > self.max_contacts:
+            _, conv = self._data.popitem(last=False)
+            self._pending_live.difference_update(conv.pending_client_messages)
+            self.evicted_lru += 1
+            removed += 1
+        return removed
+
+    def add_pending(self, conv: Conversation, record: MessageRecord) -> Optional[MessageRecord]:
+        """Agrega un inbound pendiente; devuelve el que se descartó por el límite, si hubo."""
+        dropped = conv.add_pending(record)
+        if dropped is not None:
+            self._pending_live.discard(dropped)
+        self._pending_live.add(record)
+        heapq.heappush(self._pending_index, (record.received_at, next(self._pending_seq), conv.contact_id, record))
+        if len(self._pending_index) > 2 * len(self._pending_live) + PENDING_INDEX_SLACK:
+            self._compact_pending_index()
+        return dropped
+
+    def pop_pending(self, conv: Conversation) -> Optional[MessageRecord]:
+        record = conv.pop_pending()
+        if record is not None:
+            self._pending_live.discard(record)
+        return record
+
+    def expire_pending(self, cutoff: float) -> list:
+        """Saca los pendientes recibidos antes de `cutoff` (epoch); devuelve [(contact_id, record)]."""
+        expired = []
+        index = self._pending_index
+        while index and index[0][0] < cutoff:
+            _, _, contact_id, record = heapq.heappop(index)
+            if record not in self._pending_live:
+                continue
+            # Vigente implica que sigue en la cola de su conversación (al desalojar
+            # un contacto sus pendientes dejan de ser vigentes)
+            self._pending_live.discard(record)
+            pending = self._data[contact_id].pending_client_messages
+            # Casi siempre es el primero de la cola (llegan en orden)
+            if pending[0] is record:
+                pending.popleft()
+            else:
+                pending.remove(record)
+            expired.append((contact_id, record))
+        self.expired_pending += len(expired)
+        return expired
+
+    def _compact_pending_index(self):
+        live = self._pending_live
+        self._pending_index = [entry for entry in self._pending_index if entry[3] in live]
+        heapq.heapify(self._pending_index)
+
+    def clear(self):
+        self._data.clear()
+        self._pending_index = []
+        self._pending_live.clear()
+
+    def memory_usage(self) -> dict:
+        # Estimación con sys.getsizeof (recorre todo el almacén, solo para diagnóstico)
+        contacts = len(self._data)
+        messages = 0
+        pending = 0
+        size = sys.getsizeof(self._data)
+        for contact_id, conv in self._data.items():
+            size += sys.getsizeof(contact_id) + sys.getsizeof(conv)
+            size += sys.getsizeof(conv.messages) + sys.getsizeof(conv.pending_client_messages)
+            size += sys.getsizeof(conv.name) + sys.getsizeof(conv.phone)
+            messages += len(conv.messages)
+            pending += len(conv.pending_client_messages)
+            for record in conv.messages:
+                size += sys.getsizeof(record)
+                if record.message is not None:
+                    size += sys.getsizeof(record.message)
+        # ru_maxrss viene en KB en Linux
+        max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {
+            "contacts": contacts,
+            "max_contacts": self.max_contacts,
+            "ttl_seconds": self.ttl_seconds,
+            "max_messages_per_contact": self.max_messages,
+            "messages": messages,
+            "pending_client_messages": pending,
+            "estimated_bytes": size,
+            "bytes_per_contact": round(size / contacts, 1) if contacts else 0.0,
+            "evicted_lru": self.evicted_lru,
+            "evicted_ttl": self.evicted_ttl,
+            "pending_index_entries": len(self._pending_index),
+            "expired_pending": self.expired_pending,
+            "process_max_rss_bytes": max_rss_kb * 1024,
+        }
+
+
+conversations = ConversationStore()
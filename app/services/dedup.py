@@ -0,0 +1,107 @@
+import hashlib
+import time
+from typing import Optional
+
+from app.core import codec, config
+
+# Dónde trae GHL el id del mensaje (primer nivel, dentro de "message" o de "customData")
+MESSAGE_ID_FIELDS = ('messageId', 'message_id')
+NESTED_ID_PARENTS = ('message', 'customData')
+
+
+def find_message_id(data) -> Optional[str]:
+    # Búsqueda acotada a propósito: corre antes de la extracción completa
+    if not isinstance(data, dict):
+        return None
+    for key in MESSAGE_ID_FIELDS:
+        value = data.get(key)
+        if value:
+            return str(value)
+    for parent in NESTED_ID_PARENTS:
+        nested = data.get(parent)
+        if type(nested) is dict:
+            for key in MESSAGE_ID_FIELDS + ('id',):
+                value = nested.get(key)
+                if value:
+                    return str(value)
+    return None
+
+
+def dedup_key(data) -> tuple:
+    # Con id de mensaje se usa el id; si no, un hash del body serializado con las
+    # claves ordenadas: la misma clave para /webhook/raw, /webhook/batch y el replay.
+    # blake2b y no hash(): tiene que coincidir entre procesos (tabla compartida)
+    message_id = find_message_id(data)
+    if message_id is not None:
+        return ("id", message_id)
+    return ("body", hashlib.blake2b(codec.dumps(data, sort_keys=True), digest_size=16).hexdigest())
+
+
+def stored_key(key: tuple) -> str:
+    # Clave de largo fijo para la tabla dedup_keys (los ids de mensaje no tienen largo acotado)
+    kind, value = key
+    return hashlib.blake2b(f"{kind}:{value}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+class DedupIndex:
+    """Claves vistas recientemente, en dos sets que rotan cada `ttl_seconds`.
+
+    Una clave se recuerda entre ttl y 2*ttl segundos. Si el set actual llega a la
+    mitad de `max_keys` se rota antes, así que la memoria queda acotada aunque
+    llegue una ráfaga (a costa de acortar la ventana durante esa ráfaga).
+    """
+
+    def __init__(self, ttl_seconds: float = config.DEDUP_TTL_SECONDS, max_keys: int = config.DEDUP_MAX_KEYS):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._current: set = set()
+        self._previous: set = set()
+        # Se fija con la primera clave: `now` puede venir de otro reloj (ej: la hora
+        # de los eventos en el replay)
+        self._rotated_at: Optional[float] = None
+        self.duplicates = 0
+        self.rotations = 0
+
+    def __len__(self) -> int:
+        return len(self._current) + len(self._previous)
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self),
+            "duplicates": self.duplicates,
+            "rotations": self.rotations,
+            "ttl_seconds": self.ttl_seconds,
+            "max_keys": self.max_keys,
+        }
+
+    def _rotate(self, now: float):
+        # Si pasaron dos ventanas sin tráfico, lo anterior ya venció entero
+        self._previous = self._current if now - self._rotated_at < 2 * self.ttl_seconds else set()
+        self._current = set()
+        self._rotated_at = now
+        self.rotations += 1
+
+    def seen(self, key, now: Optional[float] = None) -> bool:
+        """True si la clave ya se vio dentro de la ventana; si no, la registra."""
+        now = time.monotonic() if now is None else now
+        if self._rotated_at is None:
+            self._rotated_at = now
+        elif now - self._rotated_at >= self.ttl_seconds or len(self._current) >= self.max_keys // 2:
+            self._rotate(now)
+        if key in self._current or key in self._previous:
+            self.duplicates += 1
+            return True
+        self._current.add(key)
+        return False
+
+    def forget(self, key):
+        # El procesamiento falló: el reintento de GHL tiene que poder entrar
+        self._current.discard(key)
+        self._previous.discard(key)
+
+    def clear(self):
+        self._current.clear()
+        self._previous.clear()
+
+
+dedup_index = DedupIndex()
@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
+
+from app.core import codec, config
+from app.services.metrics import metrics, perf_counter
+
+logger = logging.getLogger("message_tracker")
+
+# Con la cola de workers llena, cada cuánto se vuelve a intentar despachar
+QUEUE_FULL_RETRY_SECONDS = 0.05
+
+
+class RetryableStatusError(Exception):
+    # GHL respondió 429 o 5xx: vale la pena reintentar
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """`rate` requests por segundo con ráfagas de hasta `burst`; rate <= 0 es sin límite."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_take(self, now: Optional[float] = None) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def delay(self, now: Optional[float] = None) -> float:
+        # Segundos hasta que haya un token
+        if self.rate <= 0:
+            return 0.0
+        self._refill(time.monotonic() if now is None else now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    async def acquire(self):
+        while not self.try_take():
+            await asyncio.sleep(self.delay())
+
+
+class PendingNotification:
+    __slots__ = ("payload", "body", "count", "due")
+
+    def __init__(self, payload: dict, body: Optional[bytes], count: int, due: float):
+        self.payload = payload
+        self.body = body
+        self.count = count
+        self.due = due
+
+
+class DeliveryQueue:
+    """Envíos a GHL: agrupados por (contact_id, webhook), limitados por destino y
+    consumidos por N workers asíncronos desde una cola acotada.
+
+    Las notificaciones esperan su ventana por destino en orden de llegada; un
+    despachador las pasa a la cola de workers cuando vence la ventana y el token
+    bucket del destino lo permite. Mientras esperan, las nuevas del mismo contacto
+    reemplazan a la anterior, así que un destino limitado recibe menos requests en
+    lugar de acumular atraso.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = config.DELIVERY_QUEUE_SIZE,
+        workers: int = config.DELIVERY_WORKERS,
+        max_attempts: int = config.DELIVERY_MAX_ATTEMPTS,
+        coalesce_window: float = config.DELIVERY_COALESCE_WINDOW,
+        max_coalescing: int = config.DELIVERY_MAX_COALESCING,
+        rate_per_second: float = config.GHL_RATE_PER_SECOND,
+        rate_burst: int = config.GHL_RATE_BURST,
+    ):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.coalesce_window = coalesce_window
+        self.max_coalescing = max_coalescing
+        self.rate_per_second = rate_per_second
+        self.rate_burst = rate_burst
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        # url -> OrderedDict(contact_id -> PendingNotification), en orden de llegada
+        self._coalescing: dict = {}
+        self._coalescing_size = 0
+        self._buckets: dict = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._tasks: list = []
+        self._client: Optional[httpx.AsyncClient] = None
+        self.enqueued = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.in_flight = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def coalescing(self) -> int:
+        return self._coalescing_size
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "capacity": self.maxsize,
+            "workers": len(self._tasks),
+            "in_flight": self.in_flight,
+            "coalescing": self.coalescing,
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
+
+    async def start(self, client: httpx.AsyncClient):
+        if self._tasks:
+            return
+        self._client = client
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch(), name="ghl-dispatcher")
+        self._tasks = [
+            asyncio.create_task(self._worker(n), name=f"ghl-delivery-{n}")
+            for n in range(self.workers)
+        ]
+        logger.info(
+            f"📮 Cola de envíos iniciada ({self.workers} workers, capacidad {self.maxsize}, "
+            f"ventana {self.coalesce_window}s, {self.rate_per_second or 'sin límite'} req/s por destino)"
+        )
+
+    async def stop(self, timeout: float = config.DELIVERY_SHUTDOWN_TIMEOUT):
+        if not self._tasks:
+            return
+        self._dispatcher.cancel()
+        await asyncio.gather(self._dispatcher, return_exceptions=True)
+        self._dispatcher = None
+        self._wakeup = None
+        try:
+            # Al cerrar se envía lo que queda sin esperar la ventana ni el límite
+            await asyncio.wait_for(self._drain(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Cola de envíos cerrada con {self.depth + self.coalescing} envíos pendientes")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._client = None
+
+    async def _drain(self):
+        for url, entries in list(self._coalescing.items()):
+            while entries:
+                _, entry = entries.popitem(last=False)
+                self._coalescing_size -= 1
+                await self._queue.put((url, self._finalize(entry), perf_counter()))
+            del self._coalescing[url]
+        await self._queue.join()
+
+    def enqueue(self, url: str, payload: dict, body: Optional[bytes] = None, count: int = 1) -> bool:
+        """Encola un payload para `url`; `body` es el payload ya serializado (si se tiene)
+        y `count` la cantidad de respuestas que resume."""
+        entries = self._coalescing.get(url)
+        if entries is None:
+            entries = self._coalescing[url] = OrderedDict()
+        key = payload.get("contact_id")
+        entry = entries.get(key)
+        if entry is not None:
+            # La última notificación trae los promedios más recientes: reemplaza a la anterior
+            entry.payload = payload
+            entry.body = body
+            entry.count += count
+            self.coalesced += 1
+            self.enqueued += 1
+            return True
+        if self._coalescing_size >= self.max_coalescing:
+            self.dropped += 1
+            if not entries:
+                del self._coalescing[url]
+            logger.warning("⚠️ Cola de envíos llena (%s) - webhook descartado", self.max_coalescing)
+            return False
+        entries[key] = PendingNotification(payload, body, count, time.monotonic() + self.coalesce_window)
+        self._coalescing_size += 1
+        self.enqueued += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def _bucket(self, url: str) -> TokenBucket:
+        bucket = self._buckets.get(url)
+        if bucket is None:
+            bucket = self._buckets[url] = TokenBucket(self.rate_per_second, self.rate_burst)
+        return bucket
+
+    @staticmethod
+    def _finalize(entry: PendingNotification) -> bytes:
+        # El conteo se agrega a los bytes ya serializados (los mismos que fueron al log)
+        body = entry.body if entry.body is not None else codec.dumps(entry.payload)
+        return codec.add_field(body, "coalesced_responses", entry.count)
+
+    async def _dispatch(self):
+        while True:
+            self._wakeup.clear()
+            delay = self._release_due(time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _release_due(self, now: float) -> Optional[float]:
+        # Pasa a la cola de workers lo vencido y permitido; devuelve cuánto dormir
+        next_delay = None
+        for url in list(self._coalescing):
+            entries = self._coalescing[url]
+            bucket = self._bucket(url)
+            wait = None
+            while entries:
+                entry = next(iter(entries.values()))
+                if entry.due > now:
+                    wait = entry.due - now
+                    break
+                if self._queue.full():
+                    return QUEUE_FULL_RETRY_SECONDS
+                if not bucket.try_take(now):
+                    self.rate_limited += 1
+                    wait = bucket.delay(now)
+                    break
+                entries.popitem(last=False)
+                self._coalescing_size -= 1
+                self._queue.put_nowait((url, self._finalize(entry), perf_counter()))
+            if not entries:
+                del self._coalescing[url]
+            elif next_delay is None or wait < next_delay:
+                next_delay = wait
+        return next_delay
+
+    async def _worker(self, n: int):
+        while True:
+            url, body, enqueued_at = await self._queue.get()
+            started = perf_counter()
+            metrics.observe("ghl_queue_wait", started - enqueued_at)
+            self.in_flight += 1
+            try:
+                await self._deliver(url, body)
+                self.sent += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error("❌ Error enviando webhook tras %s intentos: %s", self.max_attempts, e)
+            finally:
+                self.in_flight -= 1
+                # Incluye los reintentos y sus esperas
+                metrics.observe("ghl_post", perf_counter() - started)
+                self._queue.task_done()
+
+    async def _deliver(self, url: str, body: bytes):
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_exponential_jitter(
+                initial=config.DELIVERY_BACKOFF_INITIAL,
+                max=config.DELIVERY_BACKOFF_MAX,
+            ),
+            retry=retry_if_exception_type((httpx.TransportError, RetryableStatusError)),
+            before_sleep=self._before_sleep,
+            reraise=True,
+        )
+        async for attempt in retrying:
+            with attempt:
+                if attempt.retry_state.attempt_number > 1:
+                    # Los reintentos también cuentan para el límite del destino
+                    await self._bucket(url).acquire()
+                ghl_response = await self._client.post(url, content=body, headers=codec.JSON_HEADERS)
+                if ghl_response.status_code == 429 or ghl_response.status_code >= 500:
+                    raise RetryableStatusError(ghl_response.status_code)
+        logger.info("✅ Webhook enviado - Status: %s | Respuesta: %s", ghl_response.status_code, ghl_response.text)
+
+    def _before_sleep(self, retry_state):
+        self.retries += 1
+        logger.warning(
+            "🔁 Reintentando webhook (intento %s): %s",
+            retry_state.attempt_number, retry_state.outcome.exception(),
+        )
+
+
+delivery_queue = DeliveryQueue()
@@ -0,0 +1,163 @@
+# Campos que se buscan en el payload de GHL, en orden de prioridad
+CONTACT_FIELDS = ('contactId', 'contact_id')
+# "id"/"userId" solo valen si no hay un contactId explícito en ningún nivel
+CONTACT_FALLBACK_FIELDS = ('id', 'userId', 'user_id')
+MESSAGE_FIELDS = ('message', 'body', 'text', 'content', 'messageBody')
+TIMESTAMP_FIELDS = ('timestamp', 'time', 'createdAt', 'date', 'dateAdded', 'date_created', 'dateCreated', 'created_at')
+# Solo estas son la hora del mensaje; el resto suelen ser la fecha de alta del contacto
+MESSAGE_TIMESTAMP_FIELDS = ('timestamp', 'time', 'createdAt', 'date')
+DIRECTION_FIELDS = ('direction', 'type', 'messageType', 'messageDirection', 'messageStatus')
+
+# Objetos anidados cuyo "id" nunca es el del contacto (ej: location.id)
+FOREIGN_ID_PARENTS = frozenset({
+    'location', 'workflow', 'company', 'business', 'calendar', 'appointment', 'opportunity', 'attachments',
+})
+
+_GROUPS = (
+    ("contact_id", CONTACT_FIELDS),
+    ("message", MESSAGE_FIELDS),
+    ("timestamp", TIMESTAMP_FIELDS),
+    ("direction", DIRECTION_FIELDS),
+)
+
+# Todas las claves que pueden resolver algo: un nodo sin ninguna se salta sin
+# probar grupo por grupo (la mayoría de los objetos anidados de GHL)
+_WANTED = frozenset(CONTACT_FIELDS + CONTACT_FALLBACK_FIELDS + MESSAGE_FIELDS + TIMESTAMP_FIELDS + DIRECTION_FIELDS)
+
+
+def _search(node: dict, keys: tuple):
+    """Búsqueda recursiva de un solo grupo: (clave, valor) del primer nivel que lo tiene."""
+    for key in keys:
+        if key in node:
+            value = node[key]
+            if value:
+                return key, value
+    for value in node.values():
+        if type(value) is dict and value:
+            found = _search(value, keys)
+            if found:
+                return found
+    return None
+
+
+def _walk(data: dict) -> tuple:
+    """Un solo recorrido en preorden que resuelve todos los grupos de campos.
+
+    Respeta la semántica de la búsqueda anidada original: en cada nivel se
+    prueban las claves en orden de prioridad y gana el primer nivel (en
+    preorden) con un valor no vacío. Devuelve (clave que ganó, valor) por grupo.
+    """
+    keys_found = {}
+    values = {}
+    remaining = _GROUPS
+    # None: todavía se busca; () cuando ya hay un contactId explícito y no hace
+    # falta; (clave, valor) del primer "id" candidato, que no se reemplaza
+    fallback = None
+    # Queda un solo grupo y el fallback ya no cambia: el resto del preorden es
+    # una búsqueda simple (el caso de los payloads planos, donde solo falta direction)
+    single = None
+
+    def visit(node: dict, parent_key) -> bool:
+        nonlocal remaining, fallback, single
+        if single is not None:
+            found = _search(node, single[1])
+            if found:
+                keys_found[single[0]], values[single[0]] = found
+                return True
+            return False
+        # La raíz casi siempre tiene alguna; ahí no se paga recorrer todas sus claves
+        if parent_key is None or not _WANTED.isdisjoint(node):
+            found = False
+            for group, keys in remaining:
+                for key in keys:
+                    if key in node:
+                        value = node[key]
+                        if value:
+                            keys_found[group] = key
+                            values[group] = value
+                            found = True
+                            break
+            if found:
+                if fallback is None and "contact_id" in values:
+                    fallback = ()
+                remaining = [item for item in remaining if item[0] not in values]
+                if not remaining:
+                    return True
+                if len(remaining) == 1 and fallback is not None:
+                    single = remaining[0]
+                    for value in node.values():
+                        if type(value) is dict and value:
+                            found = _search(value, single[1])
+                            if found:
+                                keys_found[single[0]], values[single[0]] = found
+                                return True
+                    return False
+            if fallback is None and parent_key not in FOREIGN_ID_PARENTS:
+                for key in CONTACT_FALLBACK_FIELDS:
+                    if key in node:
+                        value = node[key]
+                        if value:
+                            fallback = (key, value)
+                            break
+        for key, value in node.items():
+            if type(value) is dict and value and visit(value, key):
+                return True
+        return False
+
+    visit(data, None)
+    if "contact_id" not in values and fallback:
+        keys_found["contact_id"], values["contact_id"] = fallback
+    return keys_found, values
+
+
+class PayloadExtractor:
+    """Extrae los campos del mensaje del payload de GHL en un solo recorrido."""
+
+    def extract(self, data: dict) -> dict:
+        message_info = {
+            "contact_id": None,
+            "message": None,
+            "timestamp": None,
+            "message_timestamp": None,
+            "direction": None,
+            "contact_name": None,
+            "phone": None,
+            "location_id": None,
+        }
+        if not isinstance(data, dict):
+            return message_info
+
+        keys_found, values = _walk(data)
+        message_info.update(values)
+        if keys_found.get("timestamp") in MESSAGE_TIMESTAMP_FIELDS:
+            message_info["message_timestamp"] = values["timestamp"]
+
+        if not message_info["direction"]:
+            if 'Mensajes del cliente' in data:
+                message_info["direction"] = "inbound"
+            elif 'mensajes salientes' in data:
+                message_info["direction"] = "outbound"
+            custom = data.get('customData')
+            if isinstance(custom, dict):
+                if 'direction' in custom:
+                    message_info["direction"] = custom['direction']
+                elif 'type' in custom:
+                    message_info["direction"] = custom['type']
+
+        if 'full_name' in data:
+            message_info["contact_name"] = data['full_name']
+        elif 'first_name' in data:
+            message_info["contact_name"] = data['first_name']
+
+        if 'phone' in data:
+            message_info["phone"] = data['phone']
+
+        location = data.get('location')
+        if isinstance(location, dict):
+            message_info["location_id"] = location.get('id')
+
+        return message_info
+
+
+payload_extractor = PayloadExtractor()
+
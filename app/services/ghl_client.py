@@ -0,0 +1,44 @@
+import logging
+from typing import Optional
+
+import httpx
+
+from app.core import config
+
+logger = logging.getLogger("message_tracker")
+
+# Cliente único durante toda la vida de la app (keep-alive + pool de conexiones)
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def open_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        http2 = _http2_available()
+        _client = httpx.AsyncClient(
+            timeout=config.GHL_HTTP_TIMEOUT,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=config.GHL_MAX_CONNECTIONS,
+                max_keepalive_connections=config.GHL_MAX_KEEPALIVE,
+                keepalive_expiry=config.GHL_KEEPALIVE_EXPIRY,
+            ),
+        )
+        logger.info(f"🌐 Cliente HTTP hacia GHL iniciado (http2={http2})")
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("🌐 Cliente HTTP hacia GHL cerrado")
@@ -0,0 +1,84 @@
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# Límites de los buckets en segundos (de 50 µs a 10 s), como los histogramas de Prometheus
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Etapas de receive_raw_webhook (shard_wait: espera en la cola del contacto; las de GHL corren en la cola de envíos)
+STAGES = (
+    "body_read", "decode", "dedup", "shard_wait", "logging", "extract", "state", "stats", "enqueue", "total",
+    "ghl_queue_wait", "ghl_post",
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+perf_counter = time.perf_counter
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        # Un contador por bucket (no acumulado) + el de +Inf al final
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Metrics:
+    """Histogramas por etapa y contadores de resultados del webhook, en memoria del proceso."""
+
+    def __init__(self):
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.outcomes = Counter()
+
+    def observe(self, stage: str, seconds: float):
+        self.stages[stage].observe(seconds)
+
+    def count(self, outcome: str, amount: int = 1):
+        self.outcomes[outcome] += amount
+
+    def clear(self):
+        for stage in STAGES:
+            self.stages[stage] = Histogram()
+        self.outcomes.clear()
+
+    def render(self, gauges: dict = None, counters: dict = None) -> str:
+        """Formato de texto de Prometheus. gauges/counters: nombre -> (ayuda, valor)."""
+        lines = [
+            "# HELP webhook_stage_seconds Tiempo por etapa del procesamiento de webhooks",
+            "# TYPE webhook_stage_seconds histogram",
+        ]
+        for stage, histogram in self.stages.items():
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'webhook_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'webhook_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'webhook_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'webhook_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        lines.append("# HELP webhook_outcomes_total Webhooks procesados por resultado")
+        lines.append("# TYPE webhook_outcomes_total counter")
+        for outcome, total in sorted(self.outcomes.items()):
+            lines.append(f'webhook_outcomes_total{{outcome="{outcome}"}} {total}')
+
+        for kind, values in (("gauge", gauges or {}), ("counter", counters or {})):
+            for name, (help_text, value) in values.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
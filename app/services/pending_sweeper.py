@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from app.core import config
+from app.services.state.base import StateBackend
+
+logger = logging.getLogger("message_tracker")
+
+
+class PendingSweeper:
+    """Cada `interval` segundos descarta en bloque los inbound pendientes más viejos que `max_age_seconds`.
+
+    Un inbound sin respuesta dentro del tiempo máximo ya no puede dar un tiempo válido:
+    si quedara en la cola, el próximo outbound del contacto lo emparejaría y la
+    respuesta se descartaría por exceder el límite en lugar de medirse contra un
+    inbound vigente.
+
+    En la misma pasada borra las claves de dedup vencidas (solo el backend sql las guarda).
+    """
+
+    def __init__(
+        self,
+        max_age_seconds: float = config.TIEMPO_MAXIMO_MINUTOS * 60,
+        interval: float = config.PENDING_SWEEP_INTERVAL,
+    ):
+        self.max_age_seconds = max_age_seconds
+        self.interval = interval
+        self._backend: Optional[StateBackend] = None
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.expired = 0
+
+    async def start(self, backend: StateBackend):
+        if self._task is not None or self.interval <= 0:
+            return
+        self._backend = backend
+        self._task = asyncio.create_task(self._run(), name="pending-sweeper")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def sweep(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        if config.DEDUP_ENABLED:
+            await self._backend.expire_dedup(now - config.DEDUP_TTL_SECONDS)
+        expired = await self._backend.expire_pending(now - self.max_age_seconds)
+        self.sweeps += 1
+        self.expired += expired
+        if expired:
+            logger.info("🧹 %s inbound pendientes vencidos descartados", expired)
+        return expired
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error("❌ Error descartando pendientes vencidos: %s", e)
+
+
+pending_sweeper = PendingSweeper()
@@ -0,0 +1,375 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import and_, bindparam, delete, func, select
+from sqlalchemy.engine import Engine
+
+from app.core import config
+from app.db.models import Contact, GlobalStats, PendingMessage, ResponseTime, VendorStats
+from app.db.session import upsert
+from app.services.conversation_store import Conversation, ConversationStore, MessageRecord
+from app.services.response_stats import ResponseStats, StreamingStats
+
+logger = logging.getLogger("message_tracker")
+
+GLOBAL_STATS_ID = 1
+
+
+class WriteBehindBuffer:
+    """Acumula los cambios del request en memoria y los vuelca a la base en lotes.
+
+    Vendedores y global se guardan con su valor absoluto más reciente (upsert
+    idempotente). De los contactos se acumula lo sumado desde el último flush y
+    se incrementa en la base: un contacto desalojado de memoria que vuelve
+    empieza de cero en el store, pero no pisa lo que ya estaba guardado.
+    Pendientes y tiempos de respuesta se insertan en bloque.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = config.PERSISTENCE_FLUSH_INTERVAL,
+        batch_size: int = config.PERSISTENCE_BATCH_SIZE,
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._engine: Optional[Engine] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._reset()
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+        self.last_flush_ms = 0.0
+
+    def _reset(self):
+        self._contacts = {}
+        self._pending_added = {}
+        self._pending_removed = set()
+        self._response_times = []
+        self._vendors = {}
+        self._global = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._engine is not None
+
+    @property
+    def size(self) -> int:
+        return (
+            len(self._contacts) + len(self._pending_added) + len(self._pending_removed)
+            + len(self._response_times) + len(self._vendors) + (1 if self._global else 0)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "buffered": self.size,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "errors": self.errors,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
+
+    # --- Registro desde el request (sin I/O) ---
+
+    def record_contact(self, conv: Conversation, response_seconds: Optional[float] = None):
+        if not self.enabled:
+            return
+        row = self._contacts.get(conv.contact_id)
+        if row is None:
+            row = self._contacts[conv.contact_id] = {
+                "contact_id": str(conv.contact_id),
+                "response_count": 0,
+                "response_total_seconds": 0.0,
+            }
+        row["name"] = _str_or_none(conv.name)
+        row["phone"] = _str_or_none(conv.phone)
+        row["last_seen"] = conv.last_seen
+        if response_seconds is not None:
+            row["response_count"] += 1
+            row["response_total_seconds"] += response_seconds
+        self._maybe_wakeup()
+
+    def record_pending_added(self, contact_id, record: MessageRecord):
+        if not self.enabled:
+            return
+        contact_id = str(contact_id)
+        self._pending_added[(contact_id, record.received_at)] = {
+            "contact_id": contact_id,
+            "received_at": record.received_at,
+            "message_at": record.message_at,
+            "message": record.message,
+        }
+        self._maybe_wakeup()
+
+    def record_pending_removed(self, contact_id, record: MessageRecord):
+        if not self.enabled:
+            return
+        key = (str(contact_id), record.received_at)
+        # Si el alta todavía no llegó a la base, se cancelan entre sí
+        if self._pending_added.pop(key, None) is None:
+            self._pending_removed.add(key)
+        self._maybe_wakeup()
+
+    def record_response(self, contact_id, client_id, location_id, received_at: float, response_seconds: float):
+        if not self.enabled:
+            return
+        self._response_times.append({
+            "contact_id": str(contact_id),
+            "client_id": str(client_id),
+            "location_id": _str_or_none(location_id),
+            "received_at": received_at,
+            "response_seconds": response_seconds,
+        })
+        self._maybe_wakeup()
+
+    def record_vendor(self, client_id, client_name, total_seconds: float, response_count: int):
+        if not self.enabled:
+            return
+        self._vendors[client_id] = {
+            "client_id": str(client_id),
+            "client_name": _str_or_none(client_name),
+            "total_seconds": total_seconds,
+            "response_count": response_count,
+        }
+
+    def record_global(self, total_seconds: float, response_count: int):
+        if not self.enabled:
+            return
+        self._global = {
+            "id": GLOBAL_STATS_ID,
+            "total_seconds": total_seconds,
+            "response_count": response_count,
+        }
+
+    def _maybe_wakeup(self):
+        if self._wakeup is not None and self.size >= self.batch_size:
+            self._wakeup.set()
+
+    # --- Ciclo de vida ---
+
+    async def start(self, engine: Engine):
+        if self._task is not None:
+            return
+        self._engine = engine
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="write-behind")
+        logger.info(f"💾 Persistencia write-behind iniciada (cada {self.flush_interval}s o {self.batch_size} cambios)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # El ciclo hace un último flush antes de salir
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._engine = None
+        self._wakeup = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            if self._stopping:
+                return
+
+    def take_batch(self) -> dict:
+        # Lo acumulado hasta ahora, en el formato de _write_batch; el buffer queda vacío
+        batch = {
+            "contacts": list(self._contacts.values()),
+            "pending_added": list(self._pending_added.values()),
+            "pending_removed": list(self._pending_removed),
+            "response_times": self._response_times,
+            "vendors": list(self._vendors.values()),
+            "global": self._global,
+        }
+        self._reset()
+        return batch
+
+    async def flush(self):
+        if not self.enabled or not self.size:
+            return
+        batch = self.take_batch()
+        started = time.perf_counter()
+        try:
+            written = await asyncio.to_thread(_write_batch, self._engine, batch)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Error guardando en base de datos, se reintenta en el próximo ciclo: {str(e)}")
+            self._restore(batch)
+            return
+        self.flushes += 1
+        self.rows_written += written
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+    def _restore(self, batch: dict):
+        # Lo nuevo que llegó durante el flush fallido tiene prioridad; en los
+        # contactos se suman los incrementos de los dos lados
+        for row in batch["contacts"]:
+            newer = self._contacts.get(row["contact_id"])
+            if newer is None:
+                self._contacts[row["contact_id"]] = row
+            else:
+                newer["response_count"] += row["response_count"]
+                newer["response_total_seconds"] += row["response_total_seconds"]
+        for row in batch["vendors"]:
+            self._vendors.setdefault(row["client_id"], row)
+        if self._global is None:
+            self._global = batch["global"]
+        for row in batch["pending_added"]:
+            key = (row["contact_id"], row["received_at"])
+            if key in self._pending_removed:
+                self._pending_removed.discard(key)
+            else:
+                self._pending_added.setdefault(key, row)
+        self._pending_removed.update(batch["pending_removed"])
+        self._response_times = batch["response_times"] + self._response_times
+
+
+def _str_or_none(value) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def _increment_contact(excluded):
+    # set_ para upsert: datos del contacto pisados, contadores sumados
+    contacts = Contact.__table__
+    return {
+        "name": func.coalesce(excluded.name, contacts.c.name),
+        "phone": func.coalesce(excluded.phone, contacts.c.phone),
+        "last_seen": excluded.last_seen,
+        "response_count": contacts.c.response_count + excluded.response_count,
+        "response_total_seconds": contacts.c.response_total_seconds + excluded.response_total_seconds,
+    }
+
+
+def _write_batch(engine: Engine, batch: dict, increment_contacts: bool = True) -> int:
+    written = 0
+    with engine.begin() as conn:
+        upsert(
+            conn, Contact.__table__, batch["contacts"], ["contact_id"],
+            set_=_increment_contact if increment_contacts else None,
+        )
+        upsert(conn, VendorStats.__table__, batch["vendors"], ["client_id"])
+        if batch["global"]:
+            upsert(conn, GlobalStats.__table__, [batch["global"]], ["id"])
+            written += 1
+        if batch["pending_added"]:
+            conn.execute(PendingMessage.__table__.insert(), batch["pending_added"])
+        if batch["pending_removed"]:
+            conn.execute(
+                delete(PendingMessage).where(and_(
+                    PendingMessage.contact_id == bindparam("b_contact_id"),
+                    PendingMessage.received_at == bindparam("b_received_at"),
+                )),
+                [
+                    {"b_contact_id": contact_id, "b_received_at": received_at}
+                    for contact_id, received_at in batch["pending_removed"]
+                ],
+            )
+        if batch["response_times"]:
+            conn.execute(ResponseTime.__table__.insert(), batch["response_times"])
+        written += (
+            len(batch["contacts"]) + len(batch["vendors"]) + len(batch["pending_added"])
+            + len(batch["pending_removed"]) + len(batch["response_times"])
+        )
+    return written
+
+
+def replace_state(engine: Engine, batch: dict) -> int:
+    """Escribe un estado reconstruido (ej: replay): pisa contactos, vendedores y global
+    (el batch trae totales, no incrementos) y reemplaza los pendientes con el mismo
+    (contact_id, received_at)."""
+    if batch["pending_added"]:
+        with engine.begin() as conn:
+            conn.execute(
+                delete(PendingMessage).where(and_(
+                    PendingMessage.contact_id == bindparam("b_contact_id"),
+                    PendingMessage.received_at == bindparam("b_received_at"),
+                )),
+                [
+                    {"b_contact_id": row["contact_id"], "b_received_at": row["received_at"]}
+                    for row in batch["pending_added"]
+                ],
+            )
+    return _write_batch(engine, batch, increment_contacts=False)
+
+
+def load_state(engine: Engine, store: ConversationStore, stats: ResponseStats, now: Optional[float] = None) -> dict:
+    """Carga promedios, contactos recientes y sus pendientes al arrancar."""
+    now = time.time() if now is None else now
+    cutoff = now - store.ttl_seconds
+    with engine.connect() as conn:
+        global_row = conn.execute(
+            select(GlobalStats.total_seconds, GlobalStats.response_count).where(GlobalStats.id == GLOBAL_STATS_ID)
+        ).first()
+        vendors = {
+            row.client_id: (row.total_seconds, row.response_count)
+            for row in conn.execute(select(VendorStats.client_id, VendorStats.total_seconds, VendorStats.response_count))
+        }
+        contacts = conn.execute(
+            select(Contact)
+            .where(Contact.last_seen >= cutoff)
+            .order_by(Contact.last_seen.desc())
+            .limit(store.max_contacts)
+        ).all()
+        pending = conn.execute(
+            select(PendingMessage.contact_id, PendingMessage.received_at, PendingMessage.message_at, PendingMessage.message)
+            .where(PendingMessage.received_at >= cutoff)
+            .order_by(PendingMessage.received_at)
+        ).all()
+
+    if global_row is not None:
+        stats.restore(global_row.total_seconds, global_row.response_count, vendors)
+    else:
+        stats.restore(0.0, 0, vendors)
+
+    # Del más viejo al más reciente para respetar el orden LRU
+    for row in reversed(contacts):
+        conv = store.get_or_create(row.contact_id, row.name, row.phone, now=row.last_seen)
+        conv.response_count = row.response_count
+        conv.response_total_seconds = row.response_total_seconds
+    pending_loaded = 0
+    for row in pending:
+        conv = store.get(row.contact_id)
+        if conv is None:
+            continue
+        record = MessageRecord(row.received_at, row.message_at, "inbound", row.message)
+        store.add_pending(conv, record)
+        pending_loaded += 1
+
+    return {
+        "vendors": len(vendors),
+        "contacts": len(contacts),
+        "pending": pending_loaded,
+        "global_response_count": stats.global_response_count,
+    }
+
+
+def warmup_streaming_stats(engine: Engine, stats: StreamingStats, since: float, chunk_size: int = 5000) -> int:
+    """Recarga en los sketches los tiempos de respuesta desde `since` (epoch), en streaming."""
+    loaded = 0
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_size).execute(
+            select(
+                ResponseTime.contact_id, ResponseTime.client_id, ResponseTime.location_id,
+                ResponseTime.received_at, ResponseTime.response_seconds,
+            )
+            .where(ResponseTime.received_at >= since)
+            .order_by(ResponseTime.received_at)
+        )
+        for row in result:
+            stats.record(row.contact_id, row.client_id, row.location_id, row.response_seconds, now=row.received_at)
+            loaded += 1
+    return loaded
+
+
+write_behind = WriteBehindBuffer()
@@ -0,0 +1,138 @@
+import time
+from collections import OrderedDict, defaultdict
+from typing import Optional
+
+from app.core import config
+from app.services.sketches import RollingWindow, Summary
+
+
+class ResponseStats:
+    """Promedios acumulados de tiempos de respuesta: global y por vendedor (client_id)."""
+
+    def __init__(self):
+        self.global_total_seconds = 0.0
+        self.global_response_count = 0
+        self.client_stats = defaultdict(lambda: {
+            "total_seconds": 0.0,
+            "response_count": 0
+        })
+
+    def record(self, client_id, total_seconds: float) -> dict:
+        self.global_total_seconds += total_seconds
+        self.global_response_count += 1
+        vendor = self.client_stats[client_id]
+        vendor["total_seconds"] += total_seconds
+        vendor["response_count"] += 1
+        return vendor
+
+    def restore(self, global_total_seconds: float, global_response_count: int, vendors: dict):
+        self.global_total_seconds = global_total_seconds
+        self.global_response_count = global_response_count
+        self.client_stats.clear()
+        for client_id, (total_seconds, response_count) in vendors.items():
+            self.client_stats[client_id] = {
+                "total_seconds": total_seconds,
+                "response_count": response_count
+            }
+
+
+response_stats = ResponseStats()
+
+
+# Ventanas deslizantes: nombre -> (segundos por slot, cantidad de slots)
+WINDOWS = {
+    "1h": (300, 12),
+    "24h": (3600, 24),
+    "7d": (6 * 3600, 28),
+}
+ALL_TIME = "all"
+SCOPES = ("global", "location", "vendor", "conversation")
+# Las conversaciones solo llevan acumulado total (son muchas y de vida corta)
+WINDOWED_SCOPES = ("global", "location", "vendor")
+
+
+class ScopeStats:
+    __slots__ = ("all_time", "windows")
+
+    def __init__(self, windowed: bool):
+        self.all_time = Summary()
+        self.windows = {name: RollingWindow(*spec) for name, spec in WINDOWS.items()} if windowed else {}
+
+    def add(self, value: float, now: float):
+        self.all_time.add(value)
+        for window in self.windows.values():
+            window.add(value, now)
+
+    def summary(self, window: str, now: float) -> Optional[Summary]:
+        if window == ALL_TIME:
+            return self.all_time
+        rolling = self.windows.get(window)
+        return rolling.summary(now) if rolling is not None else None
+
+    def merge(self, other: "ScopeStats"):
+        self.all_time.merge(other.all_time)
+        for name, window in other.windows.items():
+            if name in self.windows:
+                self.windows[name].merge(window)
+
+
+class StreamingStats:
+    """Agregados incrementales (count, media, min/max, p50/p90/p99) por global, location,
+    vendedor y conversación, más ventanas de 1h/24h/7d para los tres primeros."""
+
+    def __init__(self, max_keys: int = config.STATS_MAX_KEYS_PER_SCOPE):
+        self.max_keys = max_keys
+        self._scopes = {scope: OrderedDict() for scope in SCOPES}
+
+    def _scope_stats(self, scope: str, key) -> ScopeStats:
+        keyed = self._scopes[scope]
+        stats = keyed.get(key)
+        if stats is None:
+            stats = ScopeStats(scope in WINDOWED_SCOPES)
+            keyed[key] = stats
+            if len(keyed) > self.max_keys:
+                keyed.popitem(last=False)
+        else:
+            keyed.move_to_end(key)
+        return stats
+
+    def record(self, contact_id, client_id, location_id, response_seconds: float, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        self._scope_stats("global", None).add(response_seconds, now)
+        self._scope_stats("location", str(location_id)).add(response_seconds, now)
+        self._scope_stats("vendor", str(client_id)).add(response_seconds, now)
+        self._scope_stats("conversation", str(contact_id)).add(response_seconds, now)
+
+    def get(self, scope: str, key=None, window: str = ALL_TIME, now: Optional[float] = None) -> Optional[dict]:
+        now = time.time() if now is None else now
+        stats = self._scopes[scope].get(None if scope == "global" else str(key))
+        if stats is None:
+            return None
+        summary = stats.summary(window, now)
+        return summary.to_dict() if summary is not None else None
+
+    def top(self, scope: str, window: str = ALL_TIME, limit: int = 100, now: Optional[float] = None) -> list:
+        # Las claves con más respuestas dentro de la ventana pedida
+        now = time.time() if now is None else now
+        rows = []
+        for key, stats in self._scopes[scope].items():
+            summary = stats.summary(window, now)
+            if summary is not None and summary.count:
+                rows.append((summary.count, key, summary))
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return [dict(summary.to_dict(), key=key) for _, key, summary in rows[:limit]]
+
+    def keys(self, scope: str) -> int:
+        return len(self._scopes[scope])
+
+    def merge(self, other: "StreamingStats"):
+        for scope in SCOPES:
+            for key, stats in other._scopes[scope].items():
+                self._scope_stats(scope, key).merge(stats)
+
+    def clear(self):
+        for keyed in self._scopes.values():
+            keyed.clear()
+
+
+streaming_stats = StreamingStats()
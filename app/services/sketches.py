@@ -0,0 +1,143 @@
+import math
+from typing import Optional
+
+# Sketch de cuantiles con error relativo acotado (estilo DDSketch): cada valor cae
+# en el bucket ceil(log_gamma(x)); dos sketches se combinan sumando sus buckets.
+
+RELATIVE_ACCURACY = 0.01
+MIN_TRACKED_VALUE = 1e-3  # por debajo de 1 ms todo cuenta como cero
+MAX_BUCKETS = 2048
+
+
+class QuantileSketch:
+    __slots__ = ("gamma", "_log_gamma", "buckets", "zero_count", "count")
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: dict = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float, weight: int = 1):
+        self.count += weight
+        if value <= MIN_TRACKED_VALUE:
+            self.zero_count += weight
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + weight
+        if len(self.buckets) > MAX_BUCKETS:
+            self._collapse()
+
+    def _collapse(self):
+        # Se juntan los dos buckets más bajos: pierde precisión solo en los valores más chicos
+        lowest, second = sorted(self.buckets)[:2]
+        self.buckets[second] += self.buckets.pop(lowest)
+
+    def merge(self, other: "QuantileSketch"):
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for index, bucket_count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + bucket_count
+        while len(self.buckets) > MAX_BUCKETS:
+            self._collapse()
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Punto medio del bucket (gamma^(i-1), gamma^i]
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class Summary:
+    """count, suma, mínimo, máximo y cuantiles de una serie de tiempos de respuesta."""
+
+    __slots__ = ("count", "total", "min", "max", "sketch")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.sketch = QuantileSketch()
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.sketch.add(value)
+
+    def merge(self, other: "Summary"):
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.sketch.quantile(0.50),
+            "p90": self.sketch.quantile(0.90),
+            "p99": self.sketch.quantile(0.99),
+        }
+
+
+class RollingWindow:
+    """Ventana deslizante como ring buffer de `slots` resúmenes de `slot_seconds` cada uno."""
+
+    __slots__ = ("slot_seconds", "slots", "_ring")
+
+    def __init__(self, slot_seconds: int, slots: int):
+        self.slot_seconds = slot_seconds
+        self.slots = slots
+        # Cada posición: [id del slot, Summary] (se crea al primer valor)
+        self._ring: list = [None] * slots
+
+    def add(self, value: float, now: float):
+        slot_id = int(now // self.slot_seconds)
+        position = slot_id % self.slots
+        entry = self._ring[position]
+        if entry is not None and entry[0] > slot_id:
+            # Llegó tarde: su slot ya salió de la ventana y no debe pisar al más nuevo
+            return
+        if entry is None or entry[0] != slot_id:
+            entry = [slot_id, Summary()]
+            self._ring[position] = entry
+        entry[1].add(value)
+
+    def summary(self, now: float) -> Summary:
+        current = int(now // self.slot_seconds)
+        merged = Summary()
+        for entry in self._ring:
+            if entry is not None and current - self.slots < entry[0] <= current:
+                merged.merge(entry[1])
+        return merged
+
+    def merge(self, other: "RollingWindow"):
+        # Por posición gana el slot más reciente; si es el mismo se suman
+        for position, entry in enumerate(other._ring):
+            if entry is None:
+                continue
+            current = self._ring[position]
+            if current is None or current[0] < entry[0]:
+                current = [entry[0], Summary()]
+                self._ring[position] = current
+            if current[0] == entry[0]:
+                current[1].merge(entry[1])
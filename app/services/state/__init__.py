@@ -0,0 +1,15 @@
+from app.core import config
+from app.services.state.base import StateBackend
+
+
+def create_state_backend(kind: str = config.STATE_BACKEND) -> StateBackend:
+    if kind == "memory":
+        from app.services.state.memory import MemoryStateBackend
+        return MemoryStateBackend()
+    if kind == "sql":
+        from app.services.state.sql import SqlStateBackend
+        return SqlStateBackend()
+    raise ValueError(f"STATE_BACKEND desconocido: {kind}")
+
+
+state_backend = create_state_backend()
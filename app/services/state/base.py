@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy.engine import Engine
+
+from app.core import config
+from app.services.conversation_store import MessageRecord
+from app.services.persistence import warmup_streaming_stats
+from app.services.response_stats import WINDOWS, StreamingStats, streaming_stats
+
+logger = logging.getLogger("message_tracker")
+
+
+def aggregate(total_seconds: float, response_count: int) -> dict:
+    return {"total_seconds": total_seconds, "response_count": response_count}
+
+
+def stats_horizon(now: float) -> float:
+    # Desde cuándo hacen falta tiempos de respuesta para llenar la ventana más larga (7d)
+    return now - max(slot_seconds * slots for slot_seconds, slots in WINDOWS.values())
+
+
+async def warmup_stats(engine: Engine):
+    # Los percentiles y ventanas (hasta 7d) sobreviven a los reinicios
+    if not config.STATS_WARMUP_FROM_DB:
+        return
+    since = stats_horizon(time.time())
+    loaded = await asyncio.to_thread(warmup_streaming_stats, engine, streaming_stats, since)
+    logger.info(f"📈 Estadísticas recargadas con {loaded} tiempos de respuesta recientes")
+
+
+class StateBackend:
+    """Estado que comparte receive_raw_webhook: contactos, pendientes y promedios.
+
+    record_response devuelve {"global", "vendor", "conversation"}, cada uno con
+    total_seconds y response_count ya incrementados de forma atómica.
+    """
+
+    name = "base"
+
+    @property
+    def ready(self) -> bool:
+        return True
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def register_message(self, contact_id, name, phone, record: MessageRecord):
+        raise NotImplementedError
+
+    async def push_pending(self, contact_id, record: MessageRecord) -> int:
+        raise NotImplementedError
+
+    async def pop_pending(self, contact_id) -> Optional[MessageRecord]:
+        raise NotImplementedError
+
+    async def expire_pending(self, cutoff: float) -> int:
+        # Descarta los pendientes recibidos antes de `cutoff` (epoch); devuelve cuántos
+        raise NotImplementedError
+
+    async def record_response(
+        self, contact_id, client_id, client_name, location_id, received_at: float, response_seconds: float
+    ) -> dict:
+        raise NotImplementedError
+
+    async def describe(self) -> dict:
+        raise NotImplementedError
+
+    async def gauges(self) -> dict:
+        # {"contacts", "pending", "dedup_keys"} para /metrics
+        raise NotImplementedError
+
+    async def seen_message(self, key: tuple) -> bool:
+        # True si la clave de dedup ya llegó dentro de la ventana; si no, la registra
+        raise NotImplementedError
+
+    async def forget_message(self, key: tuple):
+        # El procesamiento falló: el reintento de GHL tiene que poder entrar
+        raise NotImplementedError
+
+    async def expire_dedup(self, cutoff: float) -> int:
+        # Borra las claves de dedup vistas antes de `cutoff` (epoch); devuelve cuántas
+        return 0
+
+    async def shared_stats(self) -> Optional[StreamingStats]:
+        # Percentiles de todos los workers, si el backend los comparte; None: solo los del proceso
+        return None
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from typing import Optional
+
+from app.core import config
+from app.db.session import dispose_engine, get_engine, run_migrations
+from app.services.conversation_store import ConversationStore, MessageRecord, conversations
+from app.services.dedup import DedupIndex, dedup_index
+from app.services.persistence import WriteBehindBuffer, load_state, write_behind
+from app.services.response_stats import ResponseStats, response_stats
+from app.services.state.base import StateBackend, aggregate, warmup_stats
+
+logger = logging.getLogger("message_tracker")
+
+
+class MemoryStateBackend(StateBackend):
+    # Estado en memoria del proceso; solo es correcto con un único worker
+    name = "memory"
+
+    def __init__(
+        self,
+        store: ConversationStore = conversations,
+        stats: ResponseStats = response_stats,
+        persistence: WriteBehindBuffer = write_behind,
+        persist: bool = config.PERSISTENCE_ENABLED,
+        dedup: DedupIndex = dedup_index,
+    ):
+        self.store = store
+        self.stats = stats
+        self.persistence = persistence
+        self.persist = persist
+        self.dedup = dedup
+
+    async def start(self):
+        if not self.persist:
+            return
+        engine = get_engine()
+        if config.DB_AUTO_MIGRATE:
+            await asyncio.to_thread(run_migrations)
+        loaded = await asyncio.to_thread(load_state, engine, self.store, self.stats)
+        logger.info(f"💾 Estado cargado desde la base: {loaded}")
+        await warmup_stats(engine)
+        await self.persistence.start(engine)
+
+    async def stop(self):
+        if not self.persist:
+            return
+        await self.persistence.stop()
+        dispose_engine()
+
+    def _conversation(self, contact_id):
+        return self.store.get(contact_id) or self.store.get_or_create(contact_id)
+
+    async def register_message(self, contact_id, name, phone, record: MessageRecord):
+        conv = self.store.get_or_create(contact_id, name, phone, now=record.received_at)
+        conv.add_message(record)
+        self.persistence.record_contact(conv)
+
+    async def push_pending(self, contact_id, record: MessageRecord) -> int:
+        conv = self._conversation(contact_id)
+        dropped = self.store.add_pending(conv, record)
+        self.persistence.record_pending_added(contact_id, record)
+        if dropped is not None:
+            self.persistence.record_pending_removed(contact_id, dropped)
+        return len(conv.pending_client_messages)
+
+    async def pop_pending(self, contact_id) -> Optional[MessageRecord]:
+        # Tomamos el primer mensaje pendiente (FIFO)
+        pending = self.store.pop_pending(self._conversation(contact_id))
+        if pending is not None:
+            self.persistence.record_pending_removed(contact_id, pending)
+        return pending
+
+    async def expire_pending(self, cutoff: float) -> int:
+        expired = self.store.expire_pending(cutoff)
+        for contact_id, record in expired:
+            self.persistence.record_pending_removed(contact_id, record)
+        return len(expired)
+
+    async def record_response(
+        self, contact_id, client_id, client_name, location_id, received_at: float, response_seconds: float
+    ) -> dict:
+        conv = self._conversation(contact_id)
+        conv.add_response(response_seconds)
+        vendor = self.stats.record(client_id, response_seconds)
+        self.persistence.record_contact(conv, response_seconds)
+        self.persistence.record_vendor(client_id, client_name, vendor["total_seconds"], vendor["response_count"])
+        self.persistence.record_global(self.stats.global_total_seconds, self.stats.global_response_count)
+        self.persistence.record_response(contact_id, client_id, location_id, received_at, response_seconds)
+        return {
+            "global": aggregate(self.stats.global_total_seconds, self.stats.global_response_count),
+            "vendor": aggregate(vendor["total_seconds"], vendor["response_count"]),
+            "conversation": aggregate(conv.response_total_seconds, conv.response_count),
+        }
+
+    async def describe(self) -> dict:
+        usage = self.store.memory_usage()
+        usage["backend"] = self.name
+        return usage
+
+    async def gauges(self) -> dict:
+        return {
+            "contacts": len(self.store),
+            "pending": self.store.pending_count,
+            "dedup_keys": len(self.dedup),
+        }
+
+    async def seen_message(self, key: tuple) -> bool:
+        # El índice rota solo: expire_dedup no tiene nada que hacer
+        return self.dedup.seen(key)
+
+    async def forget_message(self, key: tuple):
+        self.dedup.forget(key)
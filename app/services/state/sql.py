@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import create_engine, event, func, select, delete
+from sqlalchemy.engine import Connection, Engine
+
+from app.core import config
+from app.db.models import Contact, DedupKey, GlobalStats, PendingMessage, ResponseTime, VendorStats
+from app.db.session import run_migrations, upsert
+from app.services.conversation_store import MessageRecord
+from app.services.dedup import stored_key
+from app.services.persistence import GLOBAL_STATS_ID, warmup_streaming_stats
+from app.services.response_stats import StreamingStats
+from app.services.state.base import StateBackend, aggregate, stats_horizon, warmup_stats
+
+logger = logging.getLogger("message_tracker")
+
+
+def create_shared_engine(url: str) -> Engine:
+    if not url.startswith("sqlite"):
+        return create_engine(url, future=True, pool_pre_ping=True)
+
+    # SQLite compartido entre procesos: WAL para lectores concurrentes y
+    # BEGIN IMMEDIATE para que cada transacción tome el lock de escritura al inicio
+    engine = create_engine(url, future=True, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+def _increment(*columns):
+    # set_ para upsert: columna = columna + excluded.columna
+    def build(excluded):
+        return {column.name: column + excluded[column.name] for column in columns}
+    return build
+
+
+class SqlStateBackend(StateBackend):
+    """Estado en una base compartida (SQLite en WAL o Postgres).
+
+    Cada operación es una transacción corta: la cola de pendientes se consume
+    con SELECT ... FOR UPDATE SKIP LOCKED (o el lock de escritura de SQLite) y
+    los promedios se incrementan en la base con ON CONFLICT DO UPDATE.
+    """
+
+    name = "sql"
+
+    def __init__(self, url: str = config.STATE_DATABASE_URL):
+        self.url = url
+        self.engine: Optional[Engine] = None
+        self._shared_stats: Optional[StreamingStats] = None
+        self._shared_stats_at = 0.0
+        self._shared_stats_lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.engine is not None
+
+    async def start(self):
+        self.engine = create_shared_engine(self.url)
+        if config.DB_AUTO_MIGRATE:
+            await asyncio.to_thread(run_migrations, self.url)
+        await warmup_stats(self.engine)
+        logger.info(f"🗄️ Backend de estado compartido iniciado ({self.engine.dialect.name})")
+
+    async def stop(self):
+        if self.engine is not None:
+            self.engine.dispose()
+            self.engine = None
+
+    async def _run(self, fn, *args):
+        return await asyncio.to_thread(self._transaction, fn, *args)
+
+    def _transaction(self, fn, *args):
+        with self.engine.begin() as conn:
+            return fn(conn, *args)
+
+    async def register_message(self, contact_id, name, phone, record: MessageRecord):
+        await self._run(_register_message, str(contact_id), name, phone, record.received_at)
+
+    async def push_pending(self, contact_id, record: MessageRecord) -> int:
+        return await self._run(_push_pending, str(contact_id), record)
+
+    async def pop_pending(self, contact_id) -> Optional[MessageRecord]:
+        return await self._run(_pop_pending, str(contact_id))
+
+    async def expire_pending(self, cutoff: float) -> int:
+        return await self._run(_expire_pending, cutoff)
+
+    async def record_response(
+        self, contact_id, client_id, client_name, location_id, received_at: float, response_seconds: float
+    ) -> dict:
+        return await self._run(
+            _record_response, str(contact_id), str(client_id), client_name,
+            location_id, received_at, response_seconds,
+        )
+
+    async def describe(self) -> dict:
+        return await asyncio.to_thread(self._describe)
+
+    def _describe(self) -> dict:
+        with self.engine.connect() as conn:
+            contacts = conn.execute(select(func.count()).select_from(Contact)).scalar_one()
+            pending = conn.execute(select(func.count()).select_from(PendingMessage)).scalar_one()
+            dedup_keys = conn.execute(select(func.count()).select_from(DedupKey)).scalar_one()
+        return {
+            "backend": self.name,
+            "dialect": self.engine.dialect.name,
+            "contacts": contacts,
+            "pending_client_messages": pending,
+            "dedup_keys": dedup_keys,
+        }
+
+    async def gauges(self) -> dict:
+        described = await self.describe()
+        return {
+            "contacts": described["contacts"],
+            "pending": described["pending_client_messages"],
+            "dedup_keys": described["dedup_keys"],
+        }
+
+    async def seen_message(self, key: tuple) -> bool:
+        # Hora de pared y no monotonic: la comparan todos los workers
+        now = time.time()
+        return not await self._run(_claim_dedup_key, stored_key(key), now, now - config.DEDUP_TTL_SECONDS)
+
+    async def forget_message(self, key: tuple):
+        await self._run(_forget_dedup_key, stored_key(key))
+
+    async def expire_dedup(self, cutoff: float) -> int:
+        return await self._run(_expire_dedup, cutoff)
+
+    async def shared_stats(self) -> StreamingStats:
+        # Se rearma desde response_times (la escriben todos los workers), a lo sumo
+        # cada STATS_SHARED_REFRESH_SECONDS; los requests concurrentes esperan el mismo
+        async with self._shared_stats_lock:
+            if self._shared_stats is None or time.monotonic() - self._shared_stats_at >= config.STATS_SHARED_REFRESH_SECONDS:
+                stats = StreamingStats()
+                await asyncio.to_thread(warmup_streaming_stats, self.engine, stats, stats_horizon(time.time()))
+                self._shared_stats = stats
+                self._shared_stats_at = time.monotonic()
+            return self._shared_stats
+
+
+def _str_or_none(value) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def _register_message(conn: Connection, contact_id: str, name, phone, received_at: float):
+    table = Contact.__table__
+    upsert(
+        conn, table,
+        [{
+            "contact_id": contact_id,
+            "name": _str_or_none(name),
+            "phone": _str_or_none(phone),
+            "response_count": 0,
+            "response_total_seconds": 0.0,
+            "last_seen": received_at,
+        }],
+        ["contact_id"],
+        set_=lambda excluded: {
+            "name": func.coalesce(table.c.name, excluded.name),
+            "phone": func.coalesce(table.c.phone, excluded.phone),
+            "last_seen": excluded.last_seen,
+        },
+    )
+
+
+def _push_pending(conn: Connection, contact_id: str, record: MessageRecord) -> int:
+    conn.execute(PendingMessage.__table__.insert(), {
+        "contact_id": contact_id,
+        "received_at": record.received_at,
+        "message_at": record.message_at,
+        "message": record.message,
+    })
+    return conn.execute(
+        select(func.count()).select_from(PendingMessage).where(PendingMessage.contact_id == contact_id)
+    ).scalar_one()
+
+
+def _pop_pending(conn: Connection, contact_id: str) -> Optional[MessageRecord]:
+    row = conn.execute(
+        select(PendingMessage.id, PendingMessage.received_at, PendingMessage.message_at, PendingMessage.message)
+        .where(PendingMessage.contact_id == contact_id)
+        .order_by(PendingMessage.received_at, PendingMessage.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).first()
+    if row is None:
+        return None
+    conn.execute(delete(PendingMessage).where(PendingMessage.id == row.id))
+    return MessageRecord(row.received_at, row.message_at, "inbound", row.message)
+
+
+def _expire_pending(conn: Connection, cutoff: float) -> int:
+    # Un solo DELETE por rango sobre ix_pending_messages_received_at
+    return conn.execute(delete(PendingMessage).where(PendingMessage.received_at < cutoff)).rowcount
+
+
+def _claim_dedup_key(conn: Connection, key: str, now: float, cutoff: float) -> bool:
+    # Inserta la clave, o la renueva si la anterior ya venció; si ninguna de las dos
+    # (la vio otro worker dentro de la ventana) no cambia ninguna fila
+    table = DedupKey.__table__
+    result = upsert(
+        conn, table, [{"key": key, "seen_at": now}], ["key"],
+        where=table.c.seen_at < cutoff,
+    )
+    return result.rowcount == 1
+
+
+def _forget_dedup_key(conn: Connection, key: str):
+    conn.execute(delete(DedupKey).where(DedupKey.key == key))
+
+
+def _expire_dedup(conn: Connection, cutoff: float) -> int:
+    return conn.execute(delete(DedupKey).where(DedupKey.seen_at < cutoff)).rowcount
+
+
+def _record_response(
+    conn: Connection, contact_id: str, client_id: str, client_name,
+    location_id, received_at: float, response_seconds: float,
+) -> dict:
+    conn.execute(ResponseTime.__table__.insert(), {
+        "contact_id": contact_id,
+        "client_id": client_id,
+        "location_id": _str_or_none(location_id),
+        "received_at": received_at,
+        "response_seconds": response_seconds,
+    })
+
+    contacts = Contact.__table__
+    upsert(
+        conn, contacts,
+        [{
+            "contact_id": contact_id,
+            "response_count": 1,
+            "response_total_seconds": response_seconds,
+            "last_seen": received_at,
+        }],
+        ["contact_id"],
+        set_=_increment(contacts.c.response_count, contacts.c.response_total_seconds),
+    )
+
+    vendors = VendorStats.__table__
+    upsert(
+        conn, vendors,
+        [{
+            "client_id": client_id,
+            "client_name": _str_or_none(client_name),
+            "total_seconds": response_seconds,
+            "response_count": 1,
+        }],
+        ["client_id"],
+        set_=_increment(vendors.c.total_seconds, vendors.c.response_count),
+    )
+
+    global_table = GlobalStats.__table__
+    upsert(
+        conn, global_table,
+        [{"id": GLOBAL_STATS_ID, "total_seconds": response_seconds, "response_count": 1}],
+        ["id"],
+        set_=_increment(global_table.c.total_seconds, global_table.c.response_count),
+    )
+
+    # Se leen dentro de la misma transacción: los valores incluyen este incremento
+    conversation = conn.execute(
+        select(Contact.response_total_seconds, Contact.response_count).where(Contact.contact_id == contact_id)
+    ).one()
+    vendor = conn.execute(
+        select(VendorStats.total_seconds, VendorStats.response_count).where(VendorStats.client_id == client_id)
+    ).one()
+    global_row = conn.execute(
+        select(GlobalStats.total_seconds, GlobalStats.response_count).where(GlobalStats.id == GLOBAL_STATS_ID)
+    ).one()
+    return {
+        "global": aggregate(global_row.total_seconds, global_row.response_count),
+        "vendor": aggregate(vendor.total_seconds, vendor.response_count),
+        "conversation": aggregate(conversation.response_total_seconds, conversation.response_count),
+    }
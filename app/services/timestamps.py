@@ -0,0 +1,93 @@
+from datetime import datetime
+from typing import Optional
+
+import pytz
+
+from app.core import config
+
+DEFAULT_TZ = pytz.timezone(config.TIMESTAMP_DEFAULT_TZ)
+
+# Formatos que no cubre fromisoformat, en el orden en que se prueban
+FALLBACK_FORMATS = (
+    "%Y-%m-%dT%H:%M:%S.%fZ",
+    "%Y-%m-%dT%H:%M:%SZ",
+    "%Y-%m-%d %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%Y-%m-%d",
+)
+ISO = "iso"
+
+# Por encima de esto un epoch numérico está en milisegundos (año 5138 en segundos)
+EPOCH_MS_THRESHOLD = 10 ** 11
+
+MAX_SOURCES = 1024
+
+# Último formato que funcionó por origen (location_id), para probarlo primero
+_format_by_source: dict = {}
+
+
+def _aware(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        return DEFAULT_TZ.localize(dt)
+    return dt
+
+
+def _from_epoch(value: float) -> datetime:
+    if abs(value) >= EPOCH_MS_THRESHOLD:
+        value = value / 1000.0
+    return datetime.fromtimestamp(value, tz=pytz.utc)
+
+
+def _remember(source, fmt: str):
+    if source is None or _format_by_source.get(source) == fmt:
+        return
+    if len(_format_by_source) >= MAX_SOURCES:
+        _format_by_source.clear()
+    _format_by_source[source] = fmt
+
+
+def _parse_with(fmt: str, ts_str: str) -> datetime:
+    if fmt == ISO:
+        if ts_str.endswith("Z"):
+            ts_str = ts_str[:-1] + "+00:00"
+        return datetime.fromisoformat(ts_str)
+    return datetime.strptime(ts_str, fmt)
+
+
+def parse_timestamp(ts_value, source=None) -> Optional[datetime]:
+    """Devuelve un datetime con zona horaria o None si el valor no se reconoce.
+
+    Acepta datetimes, epoch en segundos o milisegundos (int, float o string
+    numérico), ISO 8601 y los formatos de FALLBACK_FORMATS.
+    """
+    if not ts_value:
+        return None
+    if isinstance(ts_value, datetime):
+        return _aware(ts_value)
+    if isinstance(ts_value, bool):
+        return None
+    if isinstance(ts_value, (int, float)):
+        try:
+            return _from_epoch(ts_value)
+        except (OverflowError, OSError, ValueError):
+            return None
+
+    ts_str = str(ts_value).strip()
+    if ts_str.isdigit():
+        try:
+            return _from_epoch(int(ts_str))
+        except (OverflowError, OSError, ValueError):
+            return None
+
+    remembered = _format_by_source.get(source)
+    candidates = (ISO,) + FALLBACK_FORMATS
+    if remembered is not None and remembered != ISO:
+        candidates = (remembered,) + tuple(fmt for fmt in candidates if fmt != remembered)
+    for fmt in candidates:
+        try:
+            parsed = _parse_with(fmt, ts_str)
+        except ValueError:
+            continue
+        _remember(source, fmt)
+        return _aware(parsed)
+    return None
@@ -0,0 +1,95 @@
+"""Microbenchmark: extractor de una pasada vs. la búsqueda recursiva original.
+
+Uso: python -m benchmarks.bench_extractor [--iterations N] [--repeat N]
+"""
+import argparse
+import timeit
+
+from app.services.extractor import PayloadExtractor
+from benchmarks.payloads import make_conversation_mix, nest_payload
+
+
+# Implementación original (4 recorridos recursivos del payload), como referencia
+def search_nested_value(data: dict, search_keys: list):
+    for key in search_keys:
+        if key in data and data[key]:
+            return data[key]
+    for key, value in data.items():
+        if isinstance(value, dict):
+            result = search_nested_value(value, search_keys)
+            if result:
+                return result
+    return None
+
+
+def legacy_extract(data: dict) -> dict:
+    message_info = {"contact_id": None, "message": None, "timestamp": None, "direction": None,
+                    "contact_name": None, "phone": None}
+    message_info["contact_id"] = search_nested_value(data, ['contactId', 'contact_id', 'id', 'userId', 'user_id'])
+    message_info["message"] = search_nested_value(data, ['message', 'body', 'text', 'content', 'messageBody'])
+    message_info["timestamp"] = search_nested_value(data, ['timestamp', 'time', 'createdAt', 'date', 'dateAdded', 'date_created', 'dateCreated', 'created_at'])
+    message_info["direction"] = search_nested_value(data, ['direction', 'type', 'messageType', 'messageDirection', 'messageStatus'])
+    if not message_info["direction"]:
+        if 'customData' in data and isinstance(data['customData'], dict):
+            custom = data['customData']
+            if 'direction' in custom:
+                message_info["direction"] = custom['direction']
+            elif 'type' in custom:
+                message_info["direction"] = custom['type']
+    if 'full_name' in data:
+        message_info["contact_name"] = data['full_name']
+    elif 'first_name' in data:
+        message_info["contact_name"] = data['first_name']
+    if 'phone' in data:
+        message_info["phone"] = data['phone']
+    return message_info
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--contacts", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    flat = make_conversation_mix(args.contacts, 4)
+    for title, payloads in (("planos", flat), ("anidados", [nest_payload(p) for p in flat])):
+        run(title, payloads, args.iterations, args.repeat)
+
+
+def run(title: str, payloads: list, iterations: int, repeat: int):
+    # Mismo resultado que la implementación original, salvo el contact_id que
+    # la original toma de location.id cuando el contactId está más abajo
+    check = PayloadExtractor()
+    wrong_legacy_ids = 0
+    for payload in payloads:
+        expected = legacy_extract(payload)
+        got = check.extract(payload)
+        if expected["contact_id"] == payload["location"]["id"]:
+            wrong_legacy_ids += 1
+            expected["contact_id"] = got["contact_id"]
+        for field in expected:
+            assert got[field] == expected[field], (field, got[field], expected[field])
+
+    cases = {
+        "legacy (4 recorridos)": lambda: [legacy_extract(p) for p in payloads],
+        "una pasada": lambda: [check.extract(p) for p in payloads],
+    }
+    print(f"{len(payloads)} payloads {title} de ~{len(str(payloads[0]))} bytes, {iterations} iteraciones")
+    # Se alternan los casos en cada repetición para que el ruido de la máquina
+    # afecte a los dos por igual
+    best = dict.fromkeys(cases, float("inf"))
+    for _ in range(repeat):
+        for name, fn in cases.items():
+            best[name] = min(best[name], timeit.timeit(fn, number=iterations))
+    baseline = None
+    for name in cases:
+        per_payload_us = best[name] / (iterations * len(payloads)) * 1e6
+        baseline = baseline or per_payload_us
+        print(f"  {name:<24} {per_payload_us:8.2f} µs/payload  x{baseline / per_payload_us:.2f}")
+    if wrong_legacy_ids:
+        print(f"  la implementación original tomó location.id como contact_id en {wrong_legacy_ids} payloads")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Microbenchmarks del camino caliente: decode/encode JSON, extract_message_info, parse_timestamp y estadísticas.
+
+Uso: python -m benchmarks.bench_hotpath [--iterations N] [--save base.json] [--compare base.json]
+
+Con --compare sale con código 1 si algún caso quedó más lento que la base guardada
+por encima de --tolerance (por defecto 25%), para correrlo antes de un deploy.
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import timeit
+from datetime import datetime, timezone
+
+from app.api.endpoints.webhook import calculate_average, decode_body, extract_message_info, format_duration
+from app.core import codec
+from app.core.logger import JsonFormatter
+from app.services.response_stats import ResponseStats, StreamingStats
+from app.services.sketches import QuantileSketch
+from app.services.timestamps import parse_timestamp
+from benchmarks.payloads import make_conversation_mix, nest_payload
+
+# Formatos de fecha que mandan los distintos workflows de GHL
+TIMESTAMP_SAMPLES = {
+    "iso con Z": "2024-05-01T12:30:45.123Z",
+    "iso con offset": "2024-05-01T12:30:45-05:00",
+    "sin zona": "2024-05-01 12:30:45",
+    "dd/mm/aaaa": "01/05/2024 12:30",
+    "epoch s": 1714566645,
+    "epoch ms": 1714566645123,
+}
+
+
+def build_cases(contacts: int) -> dict:
+    """nombre -> (función, operaciones por llamada)."""
+    flat = make_conversation_mix(contacts, 4)
+    nested = [nest_payload(p) for p in flat]
+    rng = random.Random(3)
+    durations = [rng.uniform(1, 6 * 3600) for _ in range(1000)]
+    now = datetime.now(timezone.utc).timestamp()
+
+    bodies = [json.dumps(p).encode("utf-8") for p in nested]
+    formatter = JsonFormatter()
+    records = [
+        logging.makeLogRecord({"msg": "📦 Body recibido", "event": "webhook_body", "body": codec.RawJson(body)})
+        for body in bodies
+    ]
+    cases = {
+        f"decode_body (orjson={codec.HAS_ORJSON})": (lambda: [decode_body(b) for b in bodies], len(bodies)),
+        "codec.dumps (payload anidado)": (lambda: [codec.dumps(p) for p in nested], len(nested)),
+        "JsonFormatter (body crudo)": (lambda: [formatter.format(r) for r in records], len(records)),
+        "extract_message_info (plano)": (lambda: [extract_message_info(p) for p in flat], len(flat)),
+        "extract_message_info (anidado)": (lambda: [extract_message_info(p) for p in nested], len(nested)),
+    }
+    for name, value in TIMESTAMP_SAMPLES.items():
+        cases[f"parse_timestamp ({name})"] = (
+            lambda value=value: [parse_timestamp(value, source="bench") for _ in range(1000)], 1000
+        )
+
+    cases["format_duration"] = (lambda: [format_duration(d) for d in durations], len(durations))
+    cases["calculate_average"] = (lambda: [calculate_average(d * 10, 10) for d in durations], len(durations))
+
+    response_stats = ResponseStats()
+    cases["ResponseStats.record"] = (
+        lambda: [response_stats.record(f"vendor-{n % 20}", d) for n, d in enumerate(durations)], len(durations)
+    )
+
+    streaming = StreamingStats()
+    contact_ids = [f"contact{n:06d}" for n in range(contacts)]
+
+    def record_streaming():
+        for n, d in enumerate(durations):
+            streaming.record(contact_ids[n % contacts], f"vendor-{n % 20}", "loc", d, now=now + n)
+    cases["StreamingStats.record"] = (record_streaming, len(durations))
+
+    record_streaming()
+    cases["StreamingStats.get (24h, p50/p90/p99)"] = (
+        lambda: [streaming.get("vendor", f"vendor-{n}", window="24h", now=now) for n in range(20)], 20
+    )
+
+    sketch = QuantileSketch()
+    cases["QuantileSketch.add"] = (lambda: [sketch.add(d) for d in durations], len(durations))
+    cases["QuantileSketch.quantile"] = (lambda: [sketch.quantile(q / 100) for q in range(100)], 100)
+    return cases
+
+
+def run(cases: dict, iterations: int) -> dict:
+    results = {}
+    for name, (fn, ops) in cases.items():
+        best = min(timeit.repeat(fn, number=iterations, repeat=3))
+        results[name] = best / (iterations * ops) * 1e6
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, per_op_us in results.items():
+        before = baseline.get(name)
+        if before and per_op_us > before * (1 + tolerance):
+            regressions.append((name, before, per_op_us))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--contacts", type=int, default=200)
+    parser.add_argument("--save", help="guarda los resultados (µs/op) en este JSON")
+    parser.add_argument("--compare", help="compara contra un JSON guardado con --save")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = run(build_cases(args.contacts), args.iterations)
+    for name, per_op_us in results.items():
+        line = f"  {name:<40} {per_op_us:9.3f} µs/op"
+        if baseline and baseline.get(name):
+            line += f"  ({(per_op_us / baseline[name] - 1) * 100:+.0f}%)"
+        print(line)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"⚠️ Regresión en {name}: {before:.3f} -> {after:.3f} µs/op")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Stand-in local del webhook de LeadConnector, con latencia y tasa de error configurables.
+
+Uso suelto (para apuntar otra herramienta de carga):
+    python -m benchmarks.ghl_stub --port 9100 --latency-ms 80 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import random
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+STUB_PATH = "/hooks/{location_id}/webhook-trigger/{trigger_id}"
+
+
+class StubBehavior:
+    """Cómo responde el stub: latencia base + jitter, y fracción de 503 (GHL reintentable)."""
+
+    def __init__(self, latency_ms: float = 50.0, jitter_ms: float = 20.0, error_rate: float = 0.0, seed: int = 7):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self.received = 0
+        self.errors = 0
+        self.by_location = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "errors": self.errors,
+            "max_in_flight": self.max_in_flight,
+            "by_location": dict(self.by_location),
+        }
+
+    def delay_seconds(self) -> float:
+        return max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+
+def create_stub_app(behavior: StubBehavior) -> FastAPI:
+    stub = FastAPI(title="GHL stub", docs_url=None, redoc_url=None, openapi_url=None)
+
+    @stub.post(STUB_PATH)
+    async def webhook_trigger(location_id: str, trigger_id: str, request: Request):
+        await request.body()
+        behavior.received += 1
+        behavior.by_location[location_id] += 1
+        behavior.in_flight += 1
+        behavior.max_in_flight = max(behavior.max_in_flight, behavior.in_flight)
+        try:
+            await asyncio.sleep(behavior.delay_seconds())
+        finally:
+            behavior.in_flight -= 1
+        if behavior.should_fail():
+            behavior.errors += 1
+            return PlainTextResponse("Service Unavailable", status_code=503)
+        return JSONResponse({"status": "Success: test request received"})
+
+    @stub.get("/stub/stats")
+    async def stub_stats():
+        return behavior.stats()
+
+    return stub
+
+
+def stub_url(base_url: str, location_id: str, trigger_id: str = "00000000-0000-0000-0000-000000000000") -> str:
+    return base_url.rstrip("/") + STUB_PATH.format(location_id=location_id, trigger_id=trigger_id)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    behavior = StubBehavior(args.latency_ms, args.jitter_ms, args.error_rate)
+    uvicorn.run(create_stub_app(behavior), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Prueba de carga de /webhook/raw con la app y un stub de GHL en el mismo proceso.
+
+La app (con su lifespan completo: logging, estado, cola de envíos) y el stub corren
+con uvicorn en un hilo aparte; el generador de carga usa httpx desde el hilo principal.
+Reporta throughput, latencias p50/p90/p99, lag del event loop de la app y crecimiento
+de RSS.
+
+Uso: python -m benchmarks.load_test [--contacts 2000] [--messages 6] [--concurrency 64]
+         [--latency-ms 80] [--error-rate 0.02] [--locations 4] [--json]
+
+La base y el log van a un directorio temporal salvo que DATABASE_URL / LOG_FILE estén
+definidas; el log por consola se apaga (LOG_CONSOLE=0) para no medir la terminal.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.ghl_stub import StubBehavior, create_stub_app, stub_url
+from benchmarks.payloads import LOCATION_ID, make_conversation_mix
+
+LAG_PROBE_INTERVAL = 0.01
+
+
+def configure_environment(workdir: str):
+    # Tiene que correr antes de importar la app: config lee el entorno al importarse
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'webhook_stats.db')}")
+    os.environ.setdefault("LOG_FILE", os.path.join(workdir, "webhook_messages.log"))
+    os.environ.setdefault("LOG_CONSOLE", "0")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        # Fuera de Linux: pico de RSS (en macOS viene en bytes, en Linux en KiB)
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def percentile(sorted_values: list, q: float):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def latency_summary(values: list, scale: float = 1000.0) -> dict:
+    ordered = sorted(values)
+    return {
+        "p50": _scaled(percentile(ordered, 0.50), scale),
+        "p90": _scaled(percentile(ordered, 0.90), scale),
+        "p99": _scaled(percentile(ordered, 0.99), scale),
+        "max": _scaled(ordered[-1] if ordered else None, scale),
+    }
+
+
+def _scaled(value, scale: float):
+    return round(value * scale, 3) if value is not None else None
+
+
+class ServerThread:
+    """Corre varios servidores uvicorn en un event loop propio, más una sonda de lag."""
+
+    def __init__(self, apps: list):
+        import uvicorn
+
+        self.servers = [
+            uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+            for app, port in apps
+        ]
+        self.loop = None
+        self.lag_samples = []
+        self.recording = False
+        self._thread = threading.Thread(target=self._run, name="bench-servers", daemon=True)
+
+    def start(self, timeout: float = 30.0):
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not all(server.started for server in self.servers):
+            if not self._thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("No arrancaron los servidores de la prueba de carga")
+            time.sleep(0.05)
+
+    def stop(self):
+        for server in self.servers:
+            server.should_exit = True
+        self._thread.join()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._serve())
+        self.loop.close()
+
+    async def _serve(self):
+        probe = asyncio.create_task(self._probe_lag())
+        await asyncio.gather(*(server.serve() for server in self.servers))
+        probe.cancel()
+
+    async def _probe_lag(self):
+        # Cuánto se atrasa un sleep corto: mide cuánto bloquea el loop el trabajo de la app
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            if self.recording:
+                self.lag_samples.append(max(0.0, loop.time() - started - LAG_PROBE_INTERVAL))
+
+
+def build_requests(contacts: int, messages: int, locations: list) -> list:
+    payloads = make_conversation_mix(contacts, messages)
+    for payload in payloads:
+        payload["location"]["id"] = locations[int(payload["contact_id"][-6:]) % len(locations)]
+    # Serializados de antemano: el cliente no compite con la app por CPU al medir
+    return [json.dumps(payload).encode("utf-8") for payload in payloads]
+
+
+async def drive(base_url: str, bodies: list, concurrency: int) -> dict:
+    latencies = []
+    statuses = Counter()
+    pending = iter(bodies)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        async def worker():
+            for body in pending:
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/webhook/raw", content=body, headers={"content-type": "application/json"})
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {"latencies": latencies, "statuses": statuses, "elapsed": elapsed}
+
+
+def wait_for_drain(delivery_queue, behavior: StubBehavior, timeout: float) -> float:
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if delivery_queue.depth == 0 and delivery_queue.coalescing == 0 and behavior.in_flight == 0:
+            break
+        time.sleep(0.05)
+    return time.monotonic() - started
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="webhook-load-")
+    configure_environment(workdir)
+
+    from app.api.endpoints import webhook
+    from app.main import app
+    from app.services.delivery_queue import delivery_queue
+
+    app_port, stub_port = free_port(), free_port()
+    stub_base = f"http://127.0.0.1:{stub_port}"
+    locations = [LOCATION_ID] + [f"benchLocation{n:04d}" for n in range(1, args.locations)]
+    # Las locations conocidas y el webhook por defecto apuntan al stub
+    for location_id in locations[:-1] or locations:
+        webhook.LOCATION_WEBHOOKS[location_id] = stub_url(stub_base, location_id)
+    webhook.WEBHOOK_DEFAULT = stub_url(stub_base, "default")
+
+    behavior = StubBehavior(args.latency_ms, args.jitter_ms, args.error_rate)
+    servers = ServerThread([(app, app_port), (create_stub_app(behavior), stub_port)])
+    servers.start()
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        warmup = build_requests(min(args.contacts, 100), 2, locations)
+        asyncio.run(drive(base_url, warmup, args.concurrency))
+        wait_for_drain(delivery_queue, behavior, args.drain_timeout)
+
+        bodies = build_requests(args.contacts, args.messages, locations)
+        rss_before = rss_bytes()
+        servers.recording = True
+        load = asyncio.run(drive(base_url, bodies, args.concurrency))
+        drain_seconds = wait_for_drain(delivery_queue, behavior, args.drain_timeout)
+        servers.recording = False
+        rss_after = rss_bytes()
+        delivery = delivery_queue.stats()
+    finally:
+        servers.stop()
+
+    return {
+        "requests": len(bodies),
+        "concurrency": args.concurrency,
+        "elapsed_seconds": round(load["elapsed"], 3),
+        "throughput_rps": round(len(bodies) / load["elapsed"], 1),
+        "latency_ms": latency_summary(load["latencies"]),
+        "event_loop_lag_ms": latency_summary(servers.lag_samples),
+        "statuses": {str(status): count for status, count in load["statuses"].items()},
+        "rss_mb": {
+            "before": round(rss_before / 2 ** 20, 1),
+            "after": round(rss_after / 2 ** 20, 1),
+            "growth": round((rss_after - rss_before) / 2 ** 20, 1),
+        },
+        "delivery": delivery,
+        "drain_seconds": round(drain_seconds, 3),
+        "ghl_stub": behavior.stats(),
+        "workdir": workdir,
+    }
+
+
+def print_report(report: dict):
+    latency = report["latency_ms"]
+    lag = report["event_loop_lag_ms"]
+    rss = report["rss_mb"]
+    print(f"{report['requests']} requests, concurrencia {report['concurrency']}, {report['elapsed_seconds']} s")
+    print(f"  throughput        {report['throughput_rps']:>10} req/s")
+    print(f"  latencia (ms)     p50 {latency['p50']}  p90 {latency['p90']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"  lag del loop (ms) p50 {lag['p50']}  p90 {lag['p90']}  p99 {lag['p99']}  max {lag['max']}")
+    print(f"  RSS (MB)          {rss['before']} -> {rss['after']} ({rss['growth']:+})")
+    print(f"  status            {report['statuses']}")
+    print(f"  envíos a GHL      {report['delivery']} (cola vacía en {report['drain_seconds']} s)")
+    print(f"  stub GHL          {report['ghl_stub']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=6, help="mensajes por contacto (inbound/outbound alternados)")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--locations", type=int, default=4, help="la última no está en LOCATION_WEBHOOKS (va al default)")
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=30.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument("--json", action="store_true", help="imprime el reporte en JSON")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+# Payloads con la forma (y el tamaño) de los webhooks de workflows de GHL
+
+LOCATION_ID = "f1nXHhZhhRHOiU74mtmb"
+
+
+def _attribution(rng: random.Random) -> dict:
+    return {
+        "sessionSource": "CRM UI",
+        "medium": "manual",
+        "mediumId": None,
+        "url": f"https://example.com/landing/{rng.randint(1, 999)}",
+        "campaign": "",
+        "utmSource": "facebook",
+        "utmMedium": "cpc",
+        "fbclid": f"fb{rng.getrandbits(64):x}",
+        "ip": f"10.0.{rng.randint(0, 255)}.{rng.randint(0, 255)}",
+    }
+
+
+def make_payload(contact_id: str, direction: str, message: str = None, location_id: str = LOCATION_ID,
+                 timestamp: datetime = None, rng: random.Random = None, custom_fields: int = 40) -> dict:
+    rng = rng or random.Random(hash(contact_id))
+    timestamp = timestamp or datetime.now(timezone.utc)
+    message = message or ("Hola, quiero información" if direction == "inbound" else "Claro, te cuento")
+    payload = {
+        "contact_id": contact_id,
+        "first_name": "Ana",
+        "last_name": f"Pérez {contact_id[-4:]}",
+        "full_name": f"Ana Pérez {contact_id[-4:]}",
+        "email": f"{contact_id}@example.com",
+        "phone": f"+1555{rng.randint(1000000, 9999999)}",
+        "tags": "lead,facebook,nuevo",
+        "country": "US",
+        "date_created": (timestamp - timedelta(days=rng.randint(1, 90))).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "full_address": "",
+        "contact_type": "lead",
+        "location": {
+            "name": "LEADGROWTH",
+            "address": "123 Main St",
+            "city": "Miami",
+            "state": "FL",
+            "country": "US",
+            "postalCode": "33101",
+            "fullAddress": "123 Main St, Miami FL 33101",
+            "id": location_id,
+        },
+        "message": {"body": message},
+        "workflow": {"id": f"wf-{rng.getrandbits(32):x}", "name": "Tiempo de respuesta"},
+        "triggerData": {},
+        "contact": {
+            "attributionSource": _attribution(rng),
+            "lastAttributionSource": _attribution(rng),
+        },
+        "attributionSource": {},
+        "customData": {
+            "direction": direction,
+            "client_id": f"vendor-{rng.randint(1, 20)}",
+            "client_name": f"Vendedor {rng.randint(1, 20)}",
+        },
+    }
+    for n in range(custom_fields):
+        payload[f"custom_field_{n}"] = f"valor {rng.randint(0, 10**6)}"
+    return payload
+
+
+def nest_payload(payload: dict) -> dict:
+    # Variante con los datos del mensaje anidados (webhooks reenviados por otros workflows)
+    fields = dict(payload)
+    location = fields.pop("location")
+    custom = fields.pop("customData")
+    message = fields.pop("message")
+    contact_id = fields.pop("contact_id")
+    date_created = fields.pop("date_created")
+    return {
+        "location": location,
+        "event": {
+            "contact": dict(fields, attributes={"contactId": contact_id}),
+            "payload": {"meta": {"createdAt": date_created}, "message": message},
+        },
+        "customData": custom,
+    }
+
+
+def make_conversation_mix(contacts: int, messages_per_contact: int, seed: int = 7) -> list:
+    """Mezcla intercalada de inbound/outbound para varios contactos (inbound primero en cada par)."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    per_contact = []
+    for n in range(contacts):
+        contact_id = f"contact{n:06d}"
+        events = []
+        for i in range(messages_per_contact):
+            direction = "inbound" if i % 2 == 0 else "outbound"
+            events.append(make_payload(contact_id, direction, timestamp=now + timedelta(seconds=i * 30), rng=rng))
+        per_contact.append(events)
+    mix = []
+    while per_contact:
+        idx = rng.randrange(len(per_contact))
+        mix.append(per_contact[idx].pop(0))
+        if not per_contact[idx]:
+            per_contact.pop(idx)
+    return mix
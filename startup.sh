@@ -1,5 +1,22 @@
 export PYTHONPATH=/app
 
 
-echo " Iniciando FastAPI..."
-uvicorn app.main:app --host 0.0.0.0 --port 8000
\ No newline at end of file
+echo " Aplicando migraciones..."
+alembic upgrade head
+# Con STATE_BACKEND=sql el estado compartido puede vivir en otra base: también se migra
+if [ "${STATE_BACKEND:-memory}" = "sql" ] && [ -n "$STATE_DATABASE_URL" ] && [ "$STATE_DATABASE_URL" != "$DATABASE_URL" ]; then
+    echo " Aplicando migraciones en STATE_DATABASE_URL..."
+    alembic -x url="$STATE_DATABASE_URL" upgrade head
+fi
+# Las migraciones ya corrieron: los workers no deben repetirlas en paralelo
+export DB_AUTO_MIGRATE=0
+
+WORKERS=${WEB_CONCURRENCY:-1}
+if [ "$WORKERS" -gt 1 ] && [ "${STATE_BACKEND:-memory}" != "sql" ]; then
+    echo " ⚠️ Con más de un worker se necesita STATE_BACKEND=sql, usando 1 worker"
+    WORKERS=1
+fi
+export WEB_CONCURRENCY=$WORKERS
+
+echo " Iniciando FastAPI con $WORKERS worker(s)..."
+uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers $WORKERS
@@ -0,0 +1,23 @@
+import pytest
+
+from app.db.session import get_engine, run_migrations
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    # SQLite en un archivo temporal, con las migraciones de alembic aplicadas
+    url = f"sqlite:///{tmp_path / 'webhook_stats.db'}"
+    run_migrations(url)
+    return url
+
+
+@pytest.fixture
+def engine(database_url):
+    engine = get_engine(database_url)
+    yield engine
+    engine.dispose()
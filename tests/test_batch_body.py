@@ -0,0 +1,51 @@
+import pytest
+
+from app.api.endpoints.webhook import BatchItemError, BatchTooLarge, iter_batch_items
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRequest:
+    def __init__(self, chunks: list, headers: dict = None):
+        self.chunks = chunks
+        self.headers = headers or {}
+        self.read = 0
+
+    async def stream(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+
+async def items(request, max_bytes: int = 1 << 20) -> list:
+    return [item async for item in iter_batch_items(request, max_bytes=max_bytes)]
+
+
+async def test_ndjson_lines_split_across_chunks():
+    body = b'{"a": 1}\n\n{"b": "x\\ny"}\n  {"c": [1, 2]}\nno es json\n{"d": 4}'
+    for size in (1, 2, 3, 7, len(body)):
+        chunks = [body[start:start + size] for start in range(0, len(body), size)]
+        got = await items(FakeRequest(chunks))
+        assert [item for item in got if not isinstance(item, BatchItemError)] == [
+            {"a": 1}, {"b": "x\ny"}, {"c": [1, 2]}, {"d": 4},
+        ]
+        assert isinstance(got[3], BatchItemError)
+
+
+async def test_json_array_after_leading_whitespace():
+    got = await items(FakeRequest([b"  \n", b' [{"a": 1},', b' {"b": 2}]']))
+    assert got == [{"a": 1}, {"b": 2}]
+
+
+async def test_body_over_the_limit_stops_reading():
+    request = FakeRequest([b'{"a": 1}\n'] * 100)
+    with pytest.raises(BatchTooLarge):
+        await items(request, max_bytes=50)
+    assert request.read == 6
+
+
+async def test_declared_length_over_the_limit_is_rejected_before_reading():
+    request = FakeRequest([b"[]"], headers={"content-length": "5000"})
+    with pytest.raises(BatchTooLarge):
+        await items(request, max_bytes=100)
+    assert request.read == 0
@@ -0,0 +1,64 @@
+import importlib.util
+import json
+import sys
+
+import pytest
+
+from app.api.endpoints.webhook import decode_body
+from app.core import codec
+
+
+def stdlib_codec(monkeypatch):
+    # Una copia del módulo cargada como si orjson no estuviera instalado
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    spec = importlib.util.spec_from_file_location("codec_sin_orjson", codec.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert module.HAS_ORJSON is False
+    return module
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def implementation(request, monkeypatch):
+    return codec if request.param == "orjson" else stdlib_codec(monkeypatch)
+
+
+def test_round_trip_and_sorted_keys(implementation):
+    data = {"b": [1, 2.5, None], "a": {"ñ": "acentuado", "z": True}}
+    encoded = implementation.dumps(data)
+    assert isinstance(encoded, bytes)
+    assert implementation.loads(encoded) == data
+    # Mismos bytes con las dos implementaciones: de esto depende la clave de dedup del body
+    assert implementation.dumps(data, sort_keys=True) == '{"a":{"z":true,"ñ":"acentuado"},"b":[1,2.5,null]}'.encode()
+
+
+def test_loads_rejects_invalid_utf8(implementation):
+    with pytest.raises(ValueError):
+        implementation.loads(b'{"a": "\xff"}')
+
+
+@pytest.mark.parametrize("value", ["texto", 12, 1.5, None, {"anidado": [1]}])
+def test_add_field_matches_serializing_again(implementation, value):
+    body = implementation.dumps({"contact_id": "c1"})
+    assert json.loads(implementation.add_field(body, "coalesced_responses", value)) == {
+        "contact_id": "c1", "coalesced_responses": value,
+    }
+
+
+def test_decode_body_keeps_the_raw_bytes_of_valid_json():
+    raw = b'{"contact_id": "c1", "message": "hola"}'
+    assert decode_body(raw) == ({"contact_id": "c1", "message": "hola"}, raw)
+
+
+@pytest.mark.parametrize("raw", [b"", b"  \n"])
+def test_decode_body_empty(raw):
+    assert decode_body(raw) == ({}, None)
+
+
+def test_decode_body_falls_back_on_invalid_utf8():
+    # Los bytes inválidos se descartan y el body ya no se loguea tal cual
+    assert decode_body(b'{"message": "hola\xff"}') == ({"message": "hola"}, None)
+
+
+def test_decode_body_keeps_loose_text():
+    assert decode_body(b"contact_id=c1&message=hola") == ({"raw_text": "contact_id=c1&message=hola"}, None)
@@ -0,0 +1,92 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+from app.services.contact_shards import ContactShards, shard_for
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def shards():
+    shards = ContactShards(shards=4, queue_size=100)
+    await shards.start()
+    yield shards
+    await shards.stop(timeout=1)
+
+
+async def test_events_of_a_contact_run_one_at_a_time_in_order(shards):
+    log = []
+
+    async def step(contact_id, n, delay):
+        log.append((contact_id, n, "inicio"))
+        await asyncio.sleep(delay)
+        log.append((contact_id, n, "fin"))
+        return n
+
+    # El primero tarda más: si corrieran en paralelo, el segundo terminaría antes
+    futures = [await shards.submit("c1", step, "c1", n, delay) for n, delay in enumerate((0.05, 0.0, 0.01))]
+    assert await asyncio.gather(*futures) == [0, 1, 2]
+    assert log == [("c1", n, stage) for n in range(3) for stage in ("inicio", "fin")]
+
+
+async def test_contacts_on_other_shards_are_not_blocked(shards):
+    slow, fast = "a", next(c for c in "bcdefgh" if shard_for(c, shards.shards) != shard_for("a", shards.shards))
+    release = asyncio.Event()
+
+    async def wait_release():
+        await release.wait()
+        return "lento"
+
+    async def quick():
+        return "rápido"
+
+    blocked = await shards.submit(slow, wait_release)
+    assert await asyncio.wait_for(shards.run(fast, quick), timeout=1) == "rápido"
+    assert not blocked.done()
+    release.set()
+    assert await blocked == "lento"
+
+
+async def test_a_failing_event_does_not_stop_its_shard(shards):
+    async def boom():
+        raise ValueError("roto")
+
+    async def ok():
+        return "ok"
+
+    with pytest.raises(ValueError):
+        await shards.run("c1", boom)
+    assert await shards.run("c1", ok) == "ok"
+    assert (shards.failed, shards.processed) == (1, 1)
+
+
+async def test_stop_finishes_what_was_already_queued():
+    shards = ContactShards(shards=1, queue_size=10)
+    await shards.start()
+    done = []
+
+    async def work(n):
+        await asyncio.sleep(0)
+        done.append(n)
+
+    for n in range(5):
+        await shards.submit("c1", work, n)
+    await shards.stop(timeout=1)
+    assert done == [0, 1, 2, 3, 4]
+    assert not shards.running
+
+
+async def test_submit_before_start_fails():
+    with pytest.raises(RuntimeError):
+        await ContactShards(shards=1).submit("c1", asyncio.sleep, 0)
+
+
+def test_shard_is_the_same_in_every_process_and_ignores_the_id_type():
+    # El lector del replay y sus procesos tienen que coincidir
+    code = "from app.services.contact_shards import shard_for; print([shard_for(f'c{n}', 8) for n in range(20)])"
+    other = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout.strip()
+    assert other == str([shard_for(f"c{n}", 8) for n in range(20)])
+    assert shard_for(42, 8) == shard_for("42", 8)
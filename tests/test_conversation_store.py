@@ -0,0 +1,79 @@
+from app.services import conversation_store
+from app.services.conversation_store import ConversationStore, MessageRecord
+
+NOW = 1_700_000_000.0
+
+
+def inbound(received_at: float) -> MessageRecord:
+    return MessageRecord(received_at, None, "inbound", "hola")
+
+
+def test_lru_evicts_least_recently_seen():
+    store = ConversationStore(max_contacts=2, ttl_seconds=3600)
+    store.get_or_create("a", now=NOW)
+    store.get_or_create("b", now=NOW + 1)
+    store.get_or_create("a", now=NOW + 2)
+    store.get_or_create("c", now=NOW + 3)
+    assert [conv.contact_id for conv in store] == ["a", "c"]
+    assert store.evicted_lru == 1
+
+
+def test_ttl_evicts_inactive_contacts():
+    store = ConversationStore(max_contacts=100, ttl_seconds=60)
+    store.get_or_create("a", now=NOW)
+    store.get_or_create("b", now=NOW + 30)
+    store.get_or_create("c", now=NOW + 70)
+    assert "a" not in store
+    assert "b" in store and "c" in store
+    assert store.evicted_ttl == 1
+
+
+def test_evicted_contact_pending_is_no_longer_live():
+    store = ConversationStore(max_contacts=1, ttl_seconds=3600)
+    store.add_pending(store.get_or_create("a", now=NOW), inbound(NOW))
+    store.get_or_create("b", now=NOW + 1)
+    assert store.pending_count == 0
+    # El índice todavía lo tiene, pero vencerlo no toca a un contacto que ya no está
+    assert store.expire_pending(NOW + 10) == []
+
+
+def test_expire_pending_takes_only_older_live_records():
+    store = ConversationStore(max_contacts=100, ttl_seconds=86400)
+    a = store.get_or_create("a", now=NOW)
+    b = store.get_or_create("b", now=NOW)
+    old_a, waiting, new_a = inbound(NOW), inbound(NOW + 5), inbound(NOW + 100)
+    old_b = inbound(NOW + 10)
+    store.add_pending(a, old_a)
+    store.add_pending(b, old_b)
+    store.add_pending(a, waiting)
+    store.add_pending(a, new_a)
+    # Se respondió el más viejo de "a": sale de la cola y ya no puede vencer
+    assert store.pop_pending(a) is old_a
+
+    assert store.expire_pending(NOW + 50) == [("a", waiting), ("b", old_b)]
+    assert list(a.pending_client_messages) == [new_a]
+    assert not b.pending_client_messages
+    assert store.pending_count == 1
+    assert store.expired_pending == 2
+
+
+def test_pending_limit_drops_oldest(monkeypatch):
+    monkeypatch.setattr(conversation_store.config, "CONVERSATION_MAX_PENDING", 2)
+    store = ConversationStore(max_contacts=100, ttl_seconds=86400)
+    conv = store.get_or_create("a", now=NOW)
+    records = [inbound(NOW + n) for n in range(3)]
+    assert store.add_pending(conv, records[0]) is None
+    assert store.add_pending(conv, records[1]) is None
+    assert store.add_pending(conv, records[2]) is records[0]
+    assert store.pending_count == 2
+    assert store.expire_pending(NOW + 10) == [("a", records[1]), ("a", records[2])]
+
+
+def test_pending_index_is_compacted(monkeypatch):
+    monkeypatch.setattr(conversation_store, "PENDING_INDEX_SLACK", 4)
+    store = ConversationStore(max_contacts=100, ttl_seconds=86400)
+    conv = store.get_or_create("a", now=NOW)
+    for n in range(50):
+        store.add_pending(conv, inbound(NOW + n))
+        store.pop_pending(conv)
+    assert len(store._pending_index) <= 2 * store.pending_count + 4 + 1
@@ -0,0 +1,66 @@
+import subprocess
+import sys
+
+from app.services.dedup import DedupIndex, dedup_key
+
+
+def test_key_remembered_between_ttl_and_twice_ttl():
+    index = DedupIndex(ttl_seconds=10, max_keys=100)
+    assert index.seen("a", now=0) is False
+    assert index.seen("a", now=5) is True
+    # Rotó en t=10: "a" pasa al set anterior y se sigue recordando
+    assert index.seen("b", now=10) is False
+    assert index.seen("a", now=15) is True
+    # Segunda rotación en t=20: el set donde estaba "a" se descarta
+    assert index.seen("c", now=20) is False
+    assert index.seen("a", now=21) is False
+    assert index.rotations == 2
+    assert index.duplicates == 2
+
+
+def test_idle_longer_than_two_windows_forgets_everything():
+    index = DedupIndex(ttl_seconds=10, max_keys=100)
+    index.seen("a", now=0)
+    assert index.seen("a", now=25) is False
+    assert len(index) == 1
+
+
+def test_rotates_early_when_current_set_is_full():
+    index = DedupIndex(ttl_seconds=600, max_keys=4)
+    for key in ("a", "b"):
+        index.seen(key, now=0)
+    # El set actual llegó a max_keys // 2: rota antes del TTL
+    assert index.seen("c", now=1) is False
+    assert index.rotations == 1
+    assert index.seen("a", now=2) is True
+    index.seen("d", now=3)
+    index.seen("e", now=4)
+    assert len(index) <= 4
+
+
+def test_forget_lets_a_retry_in():
+    index = DedupIndex(ttl_seconds=10, max_keys=100)
+    index.seen("a", now=0)
+    index.forget("a")
+    assert index.seen("a", now=1) is False
+
+
+def test_dedup_key_prefers_message_id():
+    assert dedup_key({"messageId": "m-1", "body": "x"}) == ("id", "m-1")
+    assert dedup_key({"message": {"id": 42}}) == ("id", "42")
+    assert dedup_key({"customData": {"message_id": "m-2"}}) == ("id", "m-2")
+
+
+def test_dedup_key_ignores_key_order():
+    # /webhook/raw y /webhook/batch tienen que dar la misma clave para el mismo body
+    first = {"contact_id": "c1", "message": "hola", "extra": {"a": 1, "b": 2}}
+    second = {"extra": {"b": 2, "a": 1}, "message": "hola", "contact_id": "c1"}
+    assert dedup_key(first) == dedup_key(second)
+    assert dedup_key(first) != dedup_key(dict(first, message="chau"))
+
+
+def test_body_key_is_the_same_in_every_process():
+    # Con STATE_BACKEND=sql la comparan workers distintos (hash() cambia por proceso)
+    code = "from app.services.dedup import dedup_key; print(dedup_key({'message': 'hola'})[1])"
+    other = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout.strip()
+    assert dedup_key({"message": "hola"}) == ("body", other)
@@ -0,0 +1,81 @@
+import time
+
+from app.core import codec
+from app.services.delivery_queue import DeliveryQueue, TokenBucket
+
+URL = "https://ghl.example/hook"
+
+
+def test_token_bucket_allows_burst_then_refills():
+    bucket = TokenBucket(rate=2, burst=3)
+    now = bucket.updated
+    assert [bucket.try_take(now) for _ in range(4)] == [True, True, True, False]
+    assert bucket.delay(now) == 0.5
+    assert bucket.try_take(now + 0.5) is True
+    assert bucket.try_take(now + 0.5) is False
+    # Nunca acumula más que la ráfaga
+    assert [bucket.try_take(now + 60) for _ in range(4)] == [True, True, True, False]
+
+
+def test_token_bucket_without_rate_is_unlimited():
+    bucket = TokenBucket(rate=0, burst=1)
+    assert all(bucket.try_take() for _ in range(100))
+    assert bucket.delay() == 0.0
+
+
+def make_queue(**kwargs) -> DeliveryQueue:
+    options = {"maxsize": 100, "workers": 1, "coalesce_window": 1.0, "max_coalescing": 100, "rate_per_second": 0}
+    options.update(kwargs)
+    return DeliveryQueue(**options)
+
+
+def released(queue: DeliveryQueue) -> list:
+    items = []
+    while not queue._queue.empty():
+        url, body, _ = queue._queue.get_nowait()
+        items.append((url, codec.loads(body)))
+    return items
+
+
+def test_notifications_for_a_contact_are_coalesced():
+    queue = make_queue()
+    queue.enqueue(URL, {"contact_id": "c1", "average": 10})
+    queue.enqueue(URL, {"contact_id": "c1", "average": 20}, body=codec.dumps({"contact_id": "c1", "average": 20}))
+    queue.enqueue(URL, {"contact_id": "c2", "average": 5}, count=3)
+    assert (queue.enqueued, queue.coalesced, queue.coalescing) == (3, 1, 2)
+
+    now = time.monotonic()
+    assert 0 < queue._release_due(now) <= 1.0
+    assert released(queue) == []
+
+    assert queue._release_due(now + 2) is None
+    assert released(queue) == [
+        (URL, {"contact_id": "c1", "average": 20, "coalesced_responses": 2}),
+        (URL, {"contact_id": "c2", "average": 5, "coalesced_responses": 3}),
+    ]
+    assert queue.coalescing == 0
+
+
+def test_release_respects_rate_limit_per_destination():
+    queue = make_queue(rate_per_second=1, rate_burst=1, coalesce_window=0)
+    for contact_id in ("c1", "c2"):
+        queue.enqueue(URL, {"contact_id": contact_id})
+    queue.enqueue("https://otro.example/hook", {"contact_id": "c3"})
+
+    now = time.monotonic() + 0.01
+    wait = queue._release_due(now)
+    assert [payload["contact_id"] for _, payload in released(queue)] == ["c1", "c3"]
+    assert queue.rate_limited == 1
+    assert 0 < wait <= 1.0
+
+    queue._release_due(now + wait)
+    assert [payload["contact_id"] for _, payload in released(queue)] == ["c2"]
+
+
+def test_enqueue_drops_when_coalescing_is_full():
+    queue = make_queue(max_coalescing=1)
+    assert queue.enqueue(URL, {"contact_id": "c1"}) is True
+    # El mismo contacto se agrupa aunque no haya lugar para otro
+    assert queue.enqueue(URL, {"contact_id": "c1"}) is True
+    assert queue.enqueue(URL, {"contact_id": "c2"}) is False
+    assert queue.dropped == 1
@@ -0,0 +1,122 @@
+import copy
+import random
+
+import pytest
+
+from app.services.extractor import (
+    CONTACT_FALLBACK_FIELDS, CONTACT_FIELDS, DIRECTION_FIELDS, FOREIGN_ID_PARENTS, MESSAGE_FIELDS,
+    TIMESTAMP_FIELDS, PayloadExtractor,
+)
+from benchmarks.payloads import make_conversation_mix, nest_payload
+
+extractor = PayloadExtractor()
+
+
+def _preorder(node: dict, parent_key=None):
+    yield parent_key, node
+    for key, value in node.items():
+        if type(value) is dict and value:
+            yield from _preorder(value, key)
+
+
+def _first(data: dict, keys: tuple, skip_parents=frozenset()):
+    # Referencia: un recorrido completo por grupo, como la búsqueda original
+    for parent_key, node in _preorder(data):
+        if parent_key in skip_parents:
+            continue
+        for key in keys:
+            if node.get(key):
+                return node[key]
+    return None
+
+
+def reference(data: dict) -> dict:
+    contact_id = _first(data, CONTACT_FIELDS) or _first(data, CONTACT_FALLBACK_FIELDS, FOREIGN_ID_PARENTS)
+    return {
+        "contact_id": contact_id,
+        "message": _first(data, MESSAGE_FIELDS),
+        "timestamp": _first(data, TIMESTAMP_FIELDS),
+    }
+
+
+def test_fallback_id_only_without_an_explicit_contact_id():
+    first = {"location": {"id": "L"}, "id": "evt-1", "customData": {"message": "m", "timestamp": "t", "direction": "inbound"}}
+    second = copy.deepcopy(first)
+    second["customData"]["contactId"] = "REAL"
+    assert extractor.extract(first)["contact_id"] == "evt-1"
+    assert extractor.extract(second)["contact_id"] == "REAL"
+
+
+def test_empty_higher_priority_key_falls_through():
+    first = {"contactId": "c", "message": "", "timestamp": "t", "direction": "d", "data": {"body": "anidado"}}
+    assert extractor.extract(first)["message"] == "anidado"
+    assert extractor.extract(dict(first, message="texto real"))["message"] == "texto real"
+
+
+def test_first_level_in_preorder_wins():
+    payload = {"meta": {"contactId": "antes"}, "contact": {"contactId": "despues"}, "message": "m"}
+    assert extractor.extract(payload)["contact_id"] == "antes"
+
+
+def test_last_group_keeps_searching_after_the_node_that_switched():
+    # El message y el timestamp se resuelven dentro de "x"; direction está en un hermano posterior
+    payload = {"contactId": "c", "x": {"message": "m", "timestamp": "t", "y": {"z": 1}}, "w": {"direction": "d"}}
+    info = extractor.extract(payload)
+    assert (info["message"], info["timestamp"], info["direction"]) == ("m", "t", "d")
+
+
+def test_location_id_is_never_the_contact():
+    payload = {"location": {"id": "L"}, "contact": {"id": "c1"}, "message": "m"}
+    info = extractor.extract(payload)
+    assert (info["contact_id"], info["location_id"]) == ("c1", "L")
+
+
+def test_message_timestamp_only_from_message_level_keys():
+    info = extractor.extract({"contact_id": "c", "date_created": "2024-01-01T00:00:00Z"})
+    assert (info["timestamp"], info["message_timestamp"]) == ("2024-01-01T00:00:00Z", None)
+    info = extractor.extract({"contact_id": "c", "timestamp": "2024-01-01T00:00:00Z"})
+    assert info["message_timestamp"] == "2024-01-01T00:00:00Z"
+
+
+def _nodes(node: dict):
+    for key, value in list(node.items()):
+        yield node, key
+        if type(value) is dict:
+            yield from _nodes(value)
+
+
+def _mutate(payload: dict, rng: random.Random):
+    keys = ["contactId", "id", "userId", "message", "body", "timestamp", "date", "direction", "type"]
+    for _ in range(rng.randint(1, 2)):
+        parent, key = rng.choice(list(_nodes(payload)))
+        roll = rng.random()
+        if roll < 0.3:
+            parent[key] = rng.choice(["", None, "X"])
+        elif roll < 0.5:
+            parent[key] = {rng.choice(keys): "anidado"}
+        elif roll < 0.8 and type(parent[key]) is dict:
+            parent[key][rng.choice(keys)] = rng.choice(["", "Y"])
+        elif roll < 0.9:
+            parent[rng.choice(keys)] = rng.choice(["", "Z"])
+        else:
+            items = list(parent.items())
+            rng.shuffle(items)
+            parent.clear()
+            parent.update(items)
+
+
+@pytest.mark.parametrize("nested", [False, True])
+def test_single_pass_matches_one_search_per_group(nested):
+    rng = random.Random(7)
+    base = make_conversation_mix(10, 4)
+    if nested:
+        base = [nest_payload(payload) for payload in base]
+    for _ in range(2000):
+        payload = copy.deepcopy(rng.choice(base))
+        if rng.random() < 0.7:
+            _mutate(payload, rng)
+        info = extractor.extract(payload)
+        assert {key: info[key] for key in ("contact_id", "message", "timestamp")} == reference(payload)
+        direction = _first(payload, DIRECTION_FIELDS)
+        if direction:
+            assert info["direction"] == direction
@@ -0,0 +1,54 @@
+import json
+import logging
+import sys
+
+from app.core import logger as app_logger
+from app.core.codec import RawJson
+from app.core.logger import LOGGER_NAME, JsonFormatter, LoopSafeQueueHandler
+
+
+def record(msg="hola %s", args=("mundo",), exc_info=None, **extra) -> logging.LogRecord:
+    record = logging.LogRecord(LOGGER_NAME, logging.INFO, __file__, 1, msg, args, exc_info)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_one_json_object_per_record_with_extra_fields():
+    line = JsonFormatter().format(record(event="webhook_body", received_at=1.5, nested={"a": [1, 2]}))
+    entry = json.loads(line)
+    assert {key: entry[key] for key in ("level", "msg", "event", "received_at", "nested")} == {
+        "level": "INFO", "msg": "hola mundo", "event": "webhook_body", "received_at": 1.5, "nested": {"a": [1, 2]},
+    }
+    assert "args" not in entry and "pathname" not in entry
+
+
+def test_raw_json_is_spliced_as_is_on_a_single_line():
+    pretty = b'{\n  "contact_id": "c1",\n  "message": "linea 1\\nlinea 2"\r\n}'
+    line = JsonFormatter().format(record(body=RawJson(pretty), payload=RawJson(b'[1,2]'), event="x"))
+    assert "\n" not in line
+    entry = json.loads(line)
+    assert entry["body"] == {"contact_id": "c1", "message": "linea 1\nlinea 2"}
+    assert (entry["payload"], entry["event"]) == ([1, 2], "x")
+
+
+def test_queue_handler_renders_message_and_traceback_before_queueing():
+    try:
+        raise ValueError("roto")
+    except ValueError:
+        prepared = LoopSafeQueueHandler(None).prepare(record(exc_info=sys.exc_info()))
+    assert (prepared.msg, prepared.args, prepared.exc_info) == ("hola mundo", None, None)
+    entry = json.loads(JsonFormatter().format(prepared))
+    assert entry["msg"] == "hola mundo"
+    assert "ValueError: roto" in entry["exc"]
+
+
+def test_setup_logging_writes_json_lines_from_the_listener_thread(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_logger, "_listener", None)
+    path = tmp_path / "webhook_messages.log"
+    app_logger.setup_logging(log_file=str(path), console=False)
+    try:
+        logging.getLogger(LOGGER_NAME).info("📦 Body recibido", extra={"body": RawJson(b'{"a": 1}')})
+    finally:
+        app_logger.shutdown_logging()
+    (entry,) = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert (entry["msg"], entry["body"]) == ("📦 Body recibido", {"a": 1})
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.endpoints import health_check
+from app.api.endpoints import metrics as metrics_endpoint
+from app.services.metrics import Metrics
+
+pytestmark = pytest.mark.anyio
+
+
+def test_render_prometheus_text_format():
+    metrics = Metrics()
+    metrics.observe("decode", 0.00007)
+    metrics.observe("decode", 0.0003)
+    metrics.observe("decode", 60.0)
+    metrics.count("inbound", 2)
+    metrics.count("duplicate")
+    lines = metrics.render(
+        gauges={"webhook_pending_inbound": ("Pendientes", 3)},
+        counters={"ghl_delivery_sent_total": ("Enviados", 7)},
+    ).splitlines()
+
+    # Buckets acumulados; lo que supera 10 s solo cuenta en +Inf
+    assert 'webhook_stage_seconds_bucket{stage="decode",le="5e-05"} 0' in lines
+    assert 'webhook_stage_seconds_bucket{stage="decode",le="0.0001"} 1' in lines
+    assert 'webhook_stage_seconds_bucket{stage="decode",le="0.0005"} 2' in lines
+    assert 'webhook_stage_seconds_bucket{stage="decode",le="10.0"} 2' in lines
+    assert 'webhook_stage_seconds_bucket{stage="decode",le="+Inf"} 3' in lines
+    assert 'webhook_stage_seconds_count{stage="decode"} 3' in lines
+    assert 'webhook_stage_seconds_count{stage="total"} 0' in lines
+    outcomes = [line for line in lines if line.startswith("webhook_outcomes_total{")]
+    assert outcomes == ['webhook_outcomes_total{outcome="duplicate"} 1', 'webhook_outcomes_total{outcome="inbound"} 2']
+    assert lines[-6:] == [
+        "# HELP webhook_pending_inbound Pendientes", "# TYPE webhook_pending_inbound gauge", "webhook_pending_inbound 3",
+        "# HELP ghl_delivery_sent_total Enviados", "# TYPE ghl_delivery_sent_total counter", "ghl_delivery_sent_total 7",
+    ]
+
+
+def app_client() -> httpx.AsyncClient:
+    app = FastAPI()
+    app.include_router(health_check.router)
+    app.include_router(metrics_endpoint.router)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.fixture
+def running(monkeypatch):
+    # Todo en marcha y con lugar: listo para recibir tráfico
+    delivery = SimpleNamespace(running=True, depth=0, maxsize=100, coalescing=0, max_coalescing=100)
+    shards = SimpleNamespace(running=True, depth=0, capacity=100)
+    monkeypatch.setattr(health_check, "state_backend", SimpleNamespace(ready=True))
+    monkeypatch.setattr(health_check, "delivery_queue", delivery)
+    monkeypatch.setattr(health_check, "contact_shards", shards)
+    monkeypatch.setattr(health_check, "write_behind", SimpleNamespace(size=0))
+    return SimpleNamespace(delivery=delivery, shards=shards)
+
+
+async def test_ready_when_every_check_passes(running):
+    async with app_client() as http:
+        assert (await http.get("/healthcheck")).json() == "alive"
+        response = await http.get("/healthcheck", params={"ready": "true"})
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+
+@pytest.mark.parametrize("field, value, check", [
+    ("delivery.running", False, "delivery_running"),
+    ("delivery.depth", 95, "delivery_backlog"),
+    ("shards.depth", 90, "shards_backlog"),
+])
+async def test_not_ready_returns_503_with_the_failing_check(running, field, value, check):
+    owner, attribute = field.split(".")
+    setattr(getattr(running, owner), attribute, value)
+    async with app_client() as http:
+        response = await http.get("/healthcheck", params={"ready": "true"})
+    assert response.status_code == 503
+    body = response.json()
+    assert body["status"] == "not_ready"
+    assert [name for name, ok in body["checks"].items() if not ok] == [check]
+
+
+async def test_metrics_endpoint_includes_state_gauges():
+    async with app_client() as http:
+        response = await http.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE webhook_pending_inbound gauge" in response.text
+    assert "webhook_dedup_keys " in response.text
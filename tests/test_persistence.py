@@ -0,0 +1,188 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.api.endpoints.webhook import process_event
+from app.db.models import Contact, GlobalStats, PendingMessage, ResponseTime, VendorStats
+from app.services import persistence
+from app.services.conversation_store import ConversationStore, MessageRecord
+from app.services.persistence import WriteBehindBuffer, load_state
+from app.services.response_stats import ResponseStats, StreamingStats
+from app.services.state.memory import MemoryStateBackend
+
+pytestmark = pytest.mark.anyio
+
+NOW = 1_700_000_000.0
+
+
+def inbound(received_at: float, message: str = "hola") -> MessageRecord:
+    return MessageRecord(received_at, None, "inbound", message)
+
+
+def outbound(received_at: float, message: str = "respuesta") -> MessageRecord:
+    return MessageRecord(received_at, None, "outbound", message)
+
+
+@pytest.fixture
+async def buffer(engine):
+    # Sin flush periódico: cada test decide cuándo se escribe
+    buffer = WriteBehindBuffer(flush_interval=3600, batch_size=10_000)
+    await buffer.start(engine)
+    yield buffer
+    await buffer.stop()
+
+
+def make_backend(buffer, max_contacts: int = 100) -> MemoryStateBackend:
+    store = ConversationStore(max_contacts=max_contacts, ttl_seconds=86400)
+    return MemoryStateBackend(store, ResponseStats(), buffer, persist=False)
+
+
+async def converse(backend, contact_id, started: float, response_seconds: float, client_id="v1"):
+    await backend.register_message(contact_id, "Ana", "+15550000", inbound(started))
+    await backend.push_pending(contact_id, inbound(started))
+    reply = outbound(started + response_seconds)
+    await backend.register_message(contact_id, None, None, reply)
+    pending = await backend.pop_pending(contact_id)
+    seconds = reply.received_at - pending.received_at
+    return await backend.record_response(contact_id, client_id, "Vendedor", "loc", reply.received_at, seconds)
+
+
+def contact_row(engine, contact_id):
+    with engine.connect() as conn:
+        return conn.execute(select(Contact).where(Contact.contact_id == contact_id)).one()
+
+
+async def test_flush_writes_buffered_rows(engine, buffer):
+    backend = make_backend(buffer)
+    await converse(backend, "c1", NOW, 30)
+    await backend.register_message("c2", None, None, inbound(NOW + 1))
+    await backend.push_pending("c2", inbound(NOW + 1))
+
+    await buffer.flush()
+
+    assert buffer.size == 0
+    assert buffer.flushes == 1
+    row = contact_row(engine, "c1")
+    assert (row.name, row.response_count, row.response_total_seconds) == ("Ana", 1, 30.0)
+    with engine.connect() as conn:
+        assert conn.execute(select(PendingMessage.contact_id)).scalars().all() == ["c2"]
+        assert conn.execute(select(ResponseTime.response_seconds)).scalars().all() == [30.0]
+        vendor = conn.execute(select(VendorStats)).one()
+        assert (vendor.client_id, vendor.total_seconds, vendor.response_count) == ("v1", 30.0, 1)
+        global_row = conn.execute(select(GlobalStats)).one()
+        assert (global_row.total_seconds, global_row.response_count) == (30.0, 1)
+
+
+async def test_pending_added_and_removed_before_flush_cancel_out(engine, buffer):
+    backend = make_backend(buffer)
+    await converse(backend, "c1", NOW, 10)
+    await buffer.flush()
+    with engine.connect() as conn:
+        assert conn.execute(select(PendingMessage)).all() == []
+
+
+async def test_failed_flush_restores_batch(engine, buffer, monkeypatch):
+    backend = make_backend(buffer)
+    await converse(backend, "c1", NOW, 30)
+
+    def broken(engine, batch):
+        raise RuntimeError("base caída")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(persistence, "_write_batch", broken)
+        await buffer.flush()
+    assert buffer.errors == 1
+    assert buffer.size > 0
+
+    # Lo que llega después del fallo se suma a lo restaurado
+    await converse(backend, "c1", NOW + 100, 10)
+    await buffer.flush()
+
+    row = contact_row(engine, "c1")
+    assert (row.response_count, row.response_total_seconds) == (2, 40.0)
+    with engine.connect() as conn:
+        assert sorted(conn.execute(select(ResponseTime.response_seconds)).scalars()) == [10.0, 30.0]
+        assert conn.execute(select(GlobalStats.response_count)).scalar_one() == 2
+
+
+async def test_returning_contact_keeps_persisted_counts(engine, buffer):
+    backend = make_backend(buffer, max_contacts=1)
+    await converse(backend, "c1", NOW, 30)
+    await converse(backend, "c1", NOW + 100, 10)
+    await buffer.flush()
+
+    # c2 desaloja a c1 del store; c1 vuelve y empieza de cero en memoria
+    await backend.register_message("c2", None, None, inbound(NOW + 200))
+    assert backend.store.get("c1") is None
+    await converse(backend, "c1", NOW + 300, 20)
+    await buffer.flush()
+
+    row = contact_row(engine, "c1")
+    assert (row.name, row.response_count, row.response_total_seconds) == ("Ana", 3, 60.0)
+
+
+async def test_load_state_after_restart(engine, buffer):
+    backend = make_backend(buffer)
+    await converse(backend, "c1", NOW, 30)
+    await converse(backend, "c2", NOW + 10, 90, client_id="v2")
+    await backend.register_message("c2", None, None, inbound(NOW + 500, "sigue pendiente"))
+    await backend.push_pending("c2", inbound(NOW + 500, "sigue pendiente"))
+    await buffer.stop()
+
+    store = ConversationStore(max_contacts=100, ttl_seconds=86400)
+    stats = ResponseStats()
+    loaded = load_state(engine, store, stats, now=NOW + 600)
+
+    assert loaded == {"vendors": 2, "contacts": 2, "pending": 1, "global_response_count": 2}
+    assert (stats.global_total_seconds, stats.global_response_count) == (120.0, 2)
+    c2 = store.get("c2")
+    assert (c2.response_count, c2.response_total_seconds) == (1, 90.0)
+    assert [record.message for record in c2.pending_client_messages] == ["sigue pendiente"]
+    assert store.pending_count == 1
+    # El pendiente cargado también entra en el vencimiento por antigüedad
+    record = c2.pending_client_messages[0]
+    assert store.expire_pending(NOW + 501) == [("c2", record)]
+    assert store.pending_count == 0
+
+
+async def test_load_state_skips_contacts_past_ttl(engine, buffer):
+    backend = make_backend(buffer)
+    await converse(backend, "old", NOW, 30)
+    await converse(backend, "new", NOW + 7200, 30)
+    await buffer.stop()
+
+    store = ConversationStore(max_contacts=100, ttl_seconds=3600)
+    load_state(engine, store, ResponseStats(), now=NOW + 7300)
+    assert "old" not in store
+    assert "new" in store
+
+
+async def test_numeric_ids_keep_their_counts_across_a_restart(engine, buffer):
+    # GHL puede mandar ids numéricos; la base los devuelve como texto al recargar
+    async def exchange(backend, started: float):
+        body = {"contact_id": 42, "client_id": 7, "message": "hola", "direction": "inbound"}
+        await process_event(body, datetime.fromtimestamp(started, tz=timezone.utc), backend=backend, stats=StreamingStats())
+        body = dict(body, message="respuesta", direction="outbound")
+        _, notification = await process_event(
+            body, datetime.fromtimestamp(started + 30, tz=timezone.utc), backend=backend, stats=StreamingStats()
+        )
+        return notification[1]
+
+    await exchange(make_backend(buffer), NOW)
+    await buffer.stop()
+
+    store = ConversationStore(max_contacts=100, ttl_seconds=86400)
+    stats = ResponseStats()
+    load_state(engine, store, stats, now=NOW + 60)
+    restarted = WriteBehindBuffer(flush_interval=3600, batch_size=10_000)
+    await restarted.start(engine)
+    payload = await exchange(MemoryStateBackend(store, stats, restarted, persist=False), NOW + 100)
+    await restarted.stop()
+
+    assert (payload["contact_id"], payload["client_id"]) == ("42", "7")
+    assert payload["vendor_total_responses"] == 2
+    assert payload["conversation_total_responses"] == 2
+    with engine.connect() as conn:
+        assert conn.execute(select(VendorStats.response_count)).scalar_one() == 2
+        assert contact_row(engine, "42").response_count == 2
@@ -0,0 +1,88 @@
+import gzip
+import json
+from collections import Counter
+
+import pytz
+
+from app.cli.replay import iter_events, merge_batches, replay
+from app.services.persistence import GLOBAL_STATS_ID
+
+
+def write_ndjson(path, entries: list) -> str:
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in entries), encoding="utf-8")
+    return str(path)
+
+
+def test_events_without_received_at_use_the_message_time(tmp_path):
+    path = write_ndjson(tmp_path / "eventos.ndjson", [
+        {"contact_id": "c1", "message": "hola", "direction": "inbound", "timestamp": "2024-05-01T12:00:00Z"},
+        {"contact_id": "c1", "message": "qué tal", "direction": "outbound", "timestamp": "2024-05-01T12:01:30Z"},
+        # Solo la fecha de alta del contacto: no sirve como hora del mensaje
+        {"contact_id": "c2", "message": "sin hora", "direction": "inbound", "date_created": "2024-01-01T00:00:00Z"},
+    ])
+    result = replay([path], workers=1, log_tz=pytz.utc)
+    assert result["counters"]["events"] == 3
+    assert result["counters"]["no_timestamp"] == 1
+    assert result["batch"]["global"]["total_seconds"] == 90
+
+
+def events(path) -> tuple:
+    counters = Counter()
+    return list(iter_events(str(path), pytz.utc, counters)), counters
+
+
+def test_iter_events_reads_the_legacy_text_log(tmp_path):
+    path = tmp_path / "webhook_messages.log"
+    path.write_text(
+        "2024-05-01 12:00:00,000 - 📨 Webhook recibido\n"
+        "2024-05-01 12:00:00,500 - 📦 Body recibido: {\n"
+        '  "contact_id": "c1",\n'
+        '  "message": "hola"\n'
+        "}\n"
+        '2024-05-01 12:00:01,000 - 📦 Body recibido: ["no", "es", "un", "dict"]\n'
+        "fecha rota - 📦 Body recibido: {}\n",
+        encoding="utf-8",
+    )
+    got, counters = events(path)
+    assert got == [
+        (1714564800.5, {"contact_id": "c1", "message": "hola"}),
+        (1714564801.0, ["no", "es", "un", "dict"]),
+    ]
+    assert counters["invalid"] == 1
+    assert counters["lines"] == 7
+
+
+def test_iter_events_reads_json_logs_and_ndjson(tmp_path):
+    path = tmp_path / "eventos.ndjson.gz"
+    lines = [
+        {"level": "INFO", "msg": "📦 Body recibido", "event": "webhook_body", "received_at": 100.0, "body": {"a": 1}},
+        {"level": "INFO", "msg": "✅ Procesado"},
+        {"received_at": 200.0, "body": {"b": 2}},
+        {"c": 3},
+    ]
+    with gzip.open(path, "wt", encoding="utf-8") as handle:
+        handle.write("".join(json.dumps(line) + "\n" for line in lines) + "{roto\n")
+    got, counters = events(path)
+    assert got == [(100.0, {"a": 1}), (200.0, {"b": 2}), (None, {"c": 3})]
+    assert counters["invalid"] == 1
+
+
+def test_merge_batches_sums_vendors_and_global():
+    def batch(contact_id, vendor_seconds, client_name):
+        return {
+            "contacts": [{"contact_id": contact_id}],
+            "pending_added": [{"contact_id": contact_id}],
+            "pending_removed": [],
+            "response_times": [],
+            "vendors": [{"client_id": "v1", "client_name": client_name, "total_seconds": vendor_seconds, "response_count": 1}],
+            "global": {"id": GLOBAL_STATS_ID, "total_seconds": vendor_seconds, "response_count": 1},
+        }
+
+    # Un shard sin respuestas no tiene fila global ni vendedores
+    empty = dict(batch("c", 0.0, None), vendors=[])
+    empty["global"] = None
+    merged = merge_batches([batch("a", 10.0, None), batch("b", 30.0, "Vendedor 1"), empty])
+    assert [row["contact_id"] for row in merged["contacts"]] == ["a", "b", "c"]
+    assert len(merged["pending_added"]) == 3
+    assert merged["vendors"] == [{"client_id": "v1", "client_name": "Vendedor 1", "total_seconds": 40.0, "response_count": 2}]
+    assert merged["global"] == {"id": GLOBAL_STATS_ID, "total_seconds": 40.0, "response_count": 2}
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from app.services import sketches
+from app.services.sketches import QuantileSketch, RollingWindow
+
+
+def exact_quantile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+@pytest.mark.parametrize("q", [0.5, 0.9, 0.99])
+def test_quantiles_within_the_relative_accuracy(q):
+    rng = random.Random(3)
+    values = [rng.lognormvariate(3, 1.5) for _ in range(20000)]
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    expected = exact_quantile(values, q)
+    assert abs(sketch.quantile(q) - expected) <= sketches.RELATIVE_ACCURACY * expected
+
+
+def test_merge_equals_adding_everything_to_one_sketch():
+    rng = random.Random(5)
+    values = [rng.uniform(0, 600) for _ in range(5000)] + [0.0] * 10
+    whole, left, right = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for n, value in enumerate(values):
+        whole.add(value)
+        (left if n % 2 else right).add(value)
+    left.merge(right)
+    assert (left.count, left.zero_count, left.buckets) == (whole.count, whole.zero_count, whole.buckets)
+
+
+def test_values_below_one_millisecond_count_as_zero():
+    sketch = QuantileSketch()
+    for value in (0.0, 0.0005, 0.0005, 10.0):
+        sketch.add(value)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(10.0, rel=sketches.RELATIVE_ACCURACY)
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_bucket_count_is_bounded(monkeypatch):
+    monkeypatch.setattr(sketches, "MAX_BUCKETS", 8)
+    sketch = QuantileSketch()
+    for n in range(100):
+        sketch.add(1.1 ** n)
+    assert len(sketch.buckets) == 8
+    assert sketch.count == 100
+    # Solo los valores más chicos pierden precisión
+    assert sketch.quantile(1.0) == pytest.approx(1.1 ** 99, rel=sketches.RELATIVE_ACCURACY)
+
+
+def test_rolling_window_drops_slots_that_left_the_window():
+    window = RollingWindow(slot_seconds=60, slots=3)
+    window.add(10.0, now=0)
+    window.add(20.0, now=60)
+    window.add(30.0, now=150)
+    assert window.summary(now=170).count == 3
+    # En t=180 el slot de t=0 ya quedó fuera
+    summary = window.summary(now=180)
+    assert (summary.count, summary.min) == (2, 20.0)
+    # t=200 reutiliza la posición del slot de t=0
+    window.add(40.0, now=200)
+    assert window.summary(now=200).total == 90.0
+    assert window.summary(now=1000).count == 0
+
+
+def test_rolling_window_merge_keeps_the_newest_slot_per_position():
+    first, second = RollingWindow(60, 2), RollingWindow(60, 2)
+    first.add(1.0, now=0)
+    first.add(2.0, now=60)
+    second.add(3.0, now=65)
+    second.add(4.0, now=120)
+    first.merge(second)
+    summary = first.summary(now=125)
+    assert (summary.count, summary.total) == (3, 9.0)
+
+
+def test_late_value_does_not_overwrite_a_newer_slot():
+    window = RollingWindow(slot_seconds=60, slots=3)
+    window.add(10.0, now=200)
+    # Mismo lugar del ring (slot 0 vs slot 3), pero ya fuera de la ventana
+    window.add(99.0, now=0)
+    summary = window.summary(now=200)
+    assert (summary.count, summary.max) == (1, 10.0)
@@ -0,0 +1,128 @@
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import inspect, select
+
+from app.db.models import Contact
+from app.db.session import ALEMBIC_INI, get_engine
+from app.services.conversation_store import MessageRecord
+from app.services.dedup import dedup_key
+from app.services.pending_sweeper import PendingSweeper
+from app.services.state import sql
+from app.services.state.sql import SqlStateBackend, create_shared_engine
+
+pytestmark = pytest.mark.anyio
+
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture
+async def backend(database_url):
+    # Sin start(): las migraciones ya corrieron y no hace falta recargar estadísticas
+    backend = SqlStateBackend(database_url)
+    backend.engine = create_shared_engine(database_url)
+    yield backend
+    await backend.stop()
+
+
+def inbound(received_at: float, message: str) -> MessageRecord:
+    return MessageRecord(received_at, received_at - 5, "inbound", message)
+
+
+async def test_pop_pending_is_fifo(backend):
+    await backend.register_message("c1", "Ana", None, inbound(NOW, "primero"))
+    assert await backend.push_pending("c1", inbound(NOW + 2, "segundo")) == 1
+    assert await backend.push_pending("c1", inbound(NOW, "primero")) == 2
+    await backend.push_pending("c2", inbound(NOW - 10, "de otro contacto"))
+
+    first = await backend.pop_pending("c1")
+    second = await backend.pop_pending("c1")
+    assert (first.message, first.received_at, first.message_at) == ("primero", NOW, NOW - 5)
+    assert second.message == "segundo"
+    assert await backend.pop_pending("c1") is None
+    assert (await backend.gauges())["pending"] == 1
+
+
+async def test_record_response_increments_aggregates(backend):
+    await backend.register_message("c1", "Ana", "+15550000", inbound(NOW, "hola"))
+    first = await backend.record_response("c1", "v1", "Vendedor", "loc", NOW + 30, 30.0)
+    second = await backend.record_response("c1", "v1", "Vendedor", "loc", NOW + 100, 10.0)
+    other = await backend.record_response("c2", "v2", None, "loc", NOW + 200, 60.0)
+
+    assert first["conversation"]["response_count"] == 1
+    assert (second["conversation"]["total_seconds"], second["conversation"]["response_count"]) == (40.0, 2)
+    assert (second["vendor"]["total_seconds"], second["vendor"]["response_count"]) == (40.0, 2)
+    assert (other["vendor"]["total_seconds"], other["vendor"]["response_count"]) == (60.0, 1)
+    assert (other["global"]["total_seconds"], other["global"]["response_count"]) == (100.0, 3)
+
+    with backend.engine.connect() as conn:
+        row = conn.execute(select(Contact).where(Contact.contact_id == "c1")).one()
+    # register_message no pisa los contadores ni el nombre ya guardado
+    await backend.register_message("c1", None, None, inbound(NOW + 300, "otra vez"))
+    with backend.engine.connect() as conn:
+        again = conn.execute(select(Contact).where(Contact.contact_id == "c1")).one()
+    assert (row.name, row.response_count) == ("Ana", 2)
+    assert (again.name, again.response_count, again.last_seen) == ("Ana", 2, NOW + 300)
+
+
+async def test_expire_pending_removes_only_older_rows(backend):
+    await backend.push_pending("c1", inbound(NOW, "viejo"))
+    await backend.push_pending("c1", inbound(NOW + 100, "vigente"))
+    await backend.push_pending("c2", inbound(NOW + 50, "viejo también"))
+
+    assert await backend.expire_pending(NOW + 60) == 2
+    remaining = await backend.pop_pending("c1")
+    assert remaining.message == "vigente"
+    assert await backend.pop_pending("c2") is None
+
+
+async def test_dedup_keys_are_shared_between_workers(backend, database_url, monkeypatch):
+    monkeypatch.setattr(sql.config, "DEDUP_TTL_SECONDS", 600)
+    other_worker = SqlStateBackend(database_url)
+    other_worker.engine = create_shared_engine(database_url)
+    key = dedup_key({"contact_id": "c1", "message": "hola"})
+
+    assert await backend.seen_message(key) is False
+    # El reintento de GHL cae en otro worker
+    assert await other_worker.seen_message(key) is True
+    await other_worker.stop()
+
+    await backend.forget_message(key)
+    assert await backend.seen_message(key) is False
+    assert (await backend.gauges())["dedup_keys"] == 1
+
+
+async def test_dedup_key_past_the_ttl_is_claimed_again(backend, monkeypatch):
+    clock = iter([NOW, NOW + 100, NOW + 700])
+    monkeypatch.setattr(sql, "time", SimpleNamespace(time=lambda: next(clock), monotonic=time.monotonic))
+    monkeypatch.setattr(sql.config, "DEDUP_TTL_SECONDS", 600)
+    key = ("id", "m-1")
+    assert await backend.seen_message(key) is False
+    assert await backend.seen_message(key) is True
+    assert await backend.seen_message(key) is False
+
+
+async def test_sweep_removes_expired_dedup_keys(backend):
+    await backend.seen_message(("id", "m-1"))
+    sweeper = PendingSweeper(max_age_seconds=60, interval=0)
+    sweeper._backend = backend
+    await sweeper.sweep(now=time.time() + sql.config.DEDUP_TTL_SECONDS + 1)
+    assert (await backend.gauges())["dedup_keys"] == 0
+
+
+def test_alembic_migrates_the_state_database_given_with_x_url(tmp_path):
+    # Lo que hace startup.sh cuando STATE_DATABASE_URL es otra base
+    url = f"sqlite:///{tmp_path / 'estado.db'}"
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'principal.db'}")
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "-c", ALEMBIC_INI, "-x", f"url={url}", "upgrade", "head"],
+        check=True, env=env, capture_output=True,
+    )
+    engine = get_engine(url)
+    assert "pending_messages" in inspect(engine).get_table_names()
+    engine.dispose()
+    assert not (tmp_path / "principal.db").exists()
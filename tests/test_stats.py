@@ -0,0 +1,102 @@
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.endpoints import stats as stats_endpoint
+from app.services.response_stats import StreamingStats
+from app.services.state.memory import MemoryStateBackend
+from app.services.state.sql import SqlStateBackend, create_shared_engine
+
+pytestmark = pytest.mark.anyio
+
+
+def client() -> httpx.AsyncClient:
+    app = FastAPI()
+    app.include_router(stats_endpoint.router)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.fixture
+async def sql_backend(database_url, monkeypatch):
+    backend = SqlStateBackend(database_url)
+    backend.engine = create_shared_engine(database_url)
+    monkeypatch.setattr(stats_endpoint, "state_backend", backend)
+    yield backend
+    await backend.stop()
+
+
+async def test_sql_backend_serves_stats_from_every_worker(sql_backend, monkeypatch):
+    monkeypatch.setattr(stats_endpoint.config, "WEB_CONCURRENCY", 4)
+    now = time.time()
+    # Lo que escribieron dos workers distintos en response_times
+    await sql_backend.record_response("c1", "v1", "Vendedor", "loc", now - 60, 30.0)
+    await sql_backend.record_response("c2", "v2", "Vendedor", "loc", now - 30, 90.0)
+
+    async with client() as http:
+        response = await http.get("/stats", params={"window": "1h"})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["source"] == "shared"
+        assert body["stats"]["count"] == 2
+
+        vendors = (await http.get("/stats", params={"scope": "vendor"})).json()
+        assert sorted(item["key"] for item in vendors["items"]) == ["v1", "v2"]
+
+
+async def test_shared_stats_are_reused_until_the_refresh_interval(sql_backend, monkeypatch):
+    monkeypatch.setattr(stats_endpoint.config, "STATS_SHARED_REFRESH_SECONDS", 3600)
+    await sql_backend.record_response("c1", "v1", "Vendedor", "loc", time.time(), 30.0)
+    first = await sql_backend.shared_stats()
+    await sql_backend.record_response("c2", "v1", "Vendedor", "loc", time.time(), 30.0)
+    assert await sql_backend.shared_stats() is first
+
+    monkeypatch.setattr(stats_endpoint.config, "STATS_SHARED_REFRESH_SECONDS", 0)
+    assert (await sql_backend.shared_stats()).get("global")["count"] == 2
+
+
+async def test_memory_backend_with_several_workers_is_refused(monkeypatch):
+    monkeypatch.setattr(stats_endpoint, "state_backend", MemoryStateBackend(persist=False))
+    monkeypatch.setattr(stats_endpoint.config, "WEB_CONCURRENCY", 2)
+    async with client() as http:
+        response = await http.get("/stats")
+    assert response.status_code == 501
+    assert "STATE_BACKEND=sql" in response.json()["detail"]
+
+
+@pytest.fixture
+def process_stats(monkeypatch):
+    stats = StreamingStats()
+    monkeypatch.setattr(stats_endpoint, "streaming_stats", stats)
+    monkeypatch.setattr(stats_endpoint, "state_backend", MemoryStateBackend(persist=False))
+    monkeypatch.setattr(stats_endpoint.config, "WEB_CONCURRENCY", 1)
+    return stats
+
+
+async def test_single_worker_serves_its_own_stats(process_stats):
+    now = time.time()
+    process_stats.record("c1", "v1", "loc", 30.0, now=now)
+    process_stats.record("c2", "v1", "loc", 90.0, now=now)
+    process_stats.record("c3", "v2", "loc", 10.0, now=now - 2 * 3600)
+
+    async with client() as http:
+        body = (await http.get("/stats")).json()
+        assert (body["source"], body["stats"]["count"], body["stats"]["max"]) == ("process", 3, 90.0)
+        last_hour = (await http.get("/stats", params={"window": "1h"})).json()
+        assert last_hour["stats"]["count"] == 2
+        vendor = (await http.get("/stats", params={"scope": "vendor", "key": "v1"})).json()
+        assert vendor["stats"]["mean"] == 60.0
+        top = (await http.get("/stats", params={"scope": "vendor", "limit": 1})).json()
+        assert (top["keys"], [item["key"] for item in top["items"]]) == (2, ["v1"])
+
+
+@pytest.mark.parametrize("params, status", [
+    ({"scope": "otro"}, 400),
+    ({"window": "2h"}, 400),
+    ({"scope": "conversation", "window": "1h"}, 400),
+    ({"scope": "vendor", "key": "nadie"}, 404),
+])
+async def test_invalid_queries(process_stats, params, status):
+    async with client() as http:
+        assert (await http.get("/stats", params=params)).status_code == status
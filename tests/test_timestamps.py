@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services import timestamps
+from app.services.timestamps import parse_timestamp
+
+MAY_FIRST = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def empty_memo(monkeypatch):
+    monkeypatch.setattr(timestamps, "_format_by_source", {})
+
+
+@pytest.mark.parametrize("value", [1714564800, 1714564800.0, "1714564800", 1714564800000, "1714564800000"])
+def test_epoch_in_seconds_or_milliseconds(value):
+    assert parse_timestamp(value) == MAY_FIRST
+
+
+@pytest.mark.parametrize("value", [
+    "2024-05-01T12:00:00Z",
+    "2024-05-01T12:00:00.000Z",
+    "2024-05-01T12:00:00+00:00",
+    "2024-05-01T09:00:00-03:00",
+])
+def test_iso_with_z_or_offset(value):
+    assert parse_timestamp(value) == MAY_FIRST
+
+
+def test_naive_values_take_the_default_zone(monkeypatch):
+    monkeypatch.setattr(timestamps, "DEFAULT_TZ", timestamps.pytz.timezone("America/Argentina/Buenos_Aires"))
+    assert parse_timestamp("2024-05-01 09:00:00") == MAY_FIRST
+    assert parse_timestamp(datetime(2024, 5, 1, 9, 0)) == MAY_FIRST
+
+
+@pytest.mark.parametrize("value", [None, "", 0, True, "ayer", "31/02/2024 10:00", 10 ** 20])
+def test_unrecognized_values_are_none(value):
+    assert parse_timestamp(value) is None
+
+
+def test_format_that_worked_is_tried_first_for_its_source(monkeypatch):
+    assert parse_timestamp("01/05/2024 12:00", source="loc-1") == MAY_FIRST
+    assert timestamps._format_by_source == {"loc-1": "%d/%m/%Y %H:%M"}
+
+    tried = []
+    parse_with = timestamps._parse_with
+    monkeypatch.setattr(timestamps, "_parse_with", lambda fmt, value: tried.append(fmt) or parse_with(fmt, value))
+    assert parse_timestamp("02/05/2024 12:00", source="loc-1") == MAY_FIRST + timedelta(days=1)
+    assert tried == ["%d/%m/%Y %H:%M"]
+    # Otro origen empieza por ISO
+    tried.clear()
+    parse_timestamp("02/05/2024 12:00", source="loc-2")
+    assert tried[0] == timestamps.ISO
+
+
+def test_memo_is_bounded(monkeypatch):
+    monkeypatch.setattr(timestamps, "MAX_SOURCES", 2)
+    for source in ("a", "b", "c"):
+        parse_timestamp("2024-05-01", source=source)
+    assert list(timestamps._format_by_source) == ["c"]
@@ -0,0 +1,60 @@
+import json
+from functools import partial
+
+import httpx
+import pytest
+
+from app import main
+from app.api.endpoints.webhook import WEBHOOK_DEFAULT
+from app.core import config
+from app.core.logger import setup_logging
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_raw_webhooks_through_the_app_lifespan(tmp_path, monkeypatch):
+    # La app completa con su lifespan; GHL es un MockTransport y la base, un SQLite temporal
+    monkeypatch.setattr(config, "DATABASE_URL", f"sqlite:///{tmp_path / 'webhook_stats.db'}")
+    log_file = tmp_path / "webhook.log"
+    monkeypatch.setattr(main, "setup_logging", partial(setup_logging, log_file=str(log_file), console=False))
+    sent = []
+
+    def ghl(request: httpx.Request) -> httpx.Response:
+        sent.append((str(request.url), json.loads(request.content)))
+        return httpx.Response(200, text="ok")
+
+    ghl_client = httpx.AsyncClient(transport=httpx.MockTransport(ghl))
+
+    async def open_http_client():
+        return ghl_client
+
+    monkeypatch.setattr(main, "open_http_client", open_http_client)
+
+    inbound = {"contact_id": "e2e-1", "message": "hola", "direction": "inbound", "messageId": "m-1"}
+    outbound = {
+        "contact_id": "e2e-1", "message": "¿en qué te ayudo?", "direction": "outbound",
+        "messageId": "m-2", "client_id": "v-e2e", "client_name": "Vendedora",
+    }
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            assert (await http.post("/webhook/raw", content=json.dumps(inbound))).json()["status"] == "received"
+            assert (await http.post("/webhook/raw", content=json.dumps(outbound))).json()["status"] == "received"
+            # Reintento de GHL del mismo mensaje
+            retry = await http.post("/webhook/raw", content=json.dumps(outbound))
+            assert retry.json() == {"status": "ignored", "reason": "duplicate"}
+            assert (await http.get("/healthcheck", params={"ready": "true"})).status_code == 200
+            metrics = (await http.get("/metrics")).text
+            assert 'webhook_outcomes_total{outcome="outbound_matched"}' in metrics
+    # La salida del lifespan vacía la cola de envíos (sin esperar la ventana de agrupado)
+    await ghl_client.aclose()
+
+    ((url, payload),) = sent
+    assert url == WEBHOOK_DEFAULT
+    assert (payload["contact_id"], payload["client_id"], payload["client_name"]) == ("e2e-1", "v-e2e", "Vendedora")
+    assert (payload["conversation_total_responses"], payload["vendor_total_responses"]) == (1, 1)
+    assert payload["outbound_message"] == "¿en qué te ayudo?"
+
+    events = [json.loads(line).get("event") for line in log_file.read_text(encoding="utf-8").splitlines()]
+    assert events.count("webhook_body") == 2
+    assert events.count("ghl_payload") == 1